@@ -0,0 +1,167 @@
+"""Cold start benchmark of `run_monitor.py --once`.
+
+Starts a stub HTTP server (see stub_server.py) in a separate process, writes
+a small configuration and times fresh `run_monitor.py --once` processes, from
+spawn to exit, with each backend. Results are written as one JSON document:
+
+    python benchmarks/bench_cold_start.py --runs 10 --output results.json
+
+Reported per backend:
+    median_seconds, max_seconds: wall time from spawn to exit
+    import_seconds: time spent importing modules, from `-X importtime`
+    exit_code: of the last run, 0 when every endpoint is healthy
+    foreign_client: whether the other backend's HTTP client was imported,
+            which should never be the case
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+from pathlib import Path
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any
+
+from stub_server import StubBehaviour, run_fleet
+
+ROOT = Path(__file__).parents[1]
+
+# The HTTP client each backend uses, and the one it must not import
+BACKENDS = {"async": ([], "requests"), "serial": (["--no-async"], "httpx")}
+
+
+def _command(config_path: Path, options: list[str]) -> list[str]:
+    return [
+        sys.executable,
+        str(ROOT / "run_monitor.py"),
+        "--config",
+        str(config_path),
+        "--once",
+        *options,
+    ]
+
+
+def _environment() -> dict[str, str]:
+    return dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join(
+            [str(ROOT / "src"), os.environ.get("PYTHONPATH", "")]
+        ),
+    )
+
+
+def _imports(command: list[str]) -> tuple[float, set[str]]:
+    """Return the total import time and the top-level packages imported"""
+    stderr = subprocess.run(
+        [command[0], "-X", "importtime", *command[1:]],
+        capture_output=True,
+        text=True,
+        env=_environment(),
+    ).stderr
+    total, packages = 0, set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line[13:]:
+            continue
+        _, cumulative, name = line[12:].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        if not name.startswith("  "):
+            # A module imported by the script itself rather than a dependency
+            total += int(cumulative)
+        packages.add(name.strip().split(".")[0])
+    return total / 1e6, packages
+
+
+def bench_backend(backend: str, config_path: Path, runs: int) -> dict[str, Any]:
+    options, foreign = BACKENDS[backend]
+    command = _command(config_path, options)
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        process = subprocess.run(
+            command, capture_output=True, env=_environment()
+        )
+        times.append(time.perf_counter() - started)
+    import_seconds, packages = _imports(command)
+    return {
+        "backend": backend,
+        "runs": runs,
+        "median_seconds": round(statistics.median(times), 4),
+        "max_seconds": round(max(times), 4),
+        "import_seconds": round(import_seconds, 4),
+        "exit_code": process.returncode,
+        "foreign_client": foreign in packages,
+    }
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--runs", type=int, default=10, help="Processes timed per backend"
+    )
+    parser.add_argument(
+        "--endpoints", type=int, default=5, help="Endpoints in the config"
+    )
+    parser.add_argument(
+        "--backends",
+        default=",".join(BACKENDS),
+        help="Comma-separated backends to run",
+    )
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    return parser
+
+
+def main() -> None:
+    args = _build_parser().parse_args()
+    context = multiprocessing.get_context("spawn")
+
+    receiver, sender = context.Pipe(duplex=False)
+    fleet = context.Process(
+        target=run_fleet,
+        args=(["127.0.0.1"], StubBehaviour(latency=0.005), sender),
+        name="bench-fleet",
+        daemon=True,
+    )
+    fleet.start()
+    host, port = receiver.recv()[0]
+
+    report: dict[str, Any] = {"python": sys.version.split()[0], "results": []}
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            config_path = Path(directory) / "config.json"
+            config_path.write_text(
+                json.dumps(
+                    {
+                        "endpoints": [
+                            f"http://{host}:{port}/endpoint/{i}"
+                            for i in range(args.endpoints)
+                        ],
+                        "check_interval": 60,
+                        "warn_threshold": 5,
+                        "retries": 1,
+                    }
+                )
+            )
+            for backend in args.backends.split(","):
+                print(f"Running {backend}", file=sys.stderr)
+                report["results"].append(
+                    bench_backend(backend, config_path, args.runs)
+                )
+    finally:
+        fleet.terminate()
+        fleet.join()
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
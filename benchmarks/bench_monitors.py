@@ -0,0 +1,368 @@
+"""Load benchmark of the serial and async monitors.
+
+Starts a fleet of stub HTTP servers (see stub_server.py) in a separate
+process, then runs each monitor against 10 / 1k / 10k / 50k endpoints spread
+over the fleet. Every scenario runs in a fresh process so that its CPU time
+and peak RSS are its own. Results are written as one JSON document:
+
+    python benchmarks/bench_monitors.py --duration 20 --output results.json
+
+Reported per scenario:
+    probes_per_second: completed probes over the run
+    dispatch_lag: how late probes started after their deadline, in seconds.
+            A serial cycle is due every `check_interval` seconds; the async
+            monitor schedules every endpoint on its own deadline
+    cpu_seconds: user + system CPU time of the monitor process
+    peak_rss_bytes: peak resident memory of the monitor process
+    peak_open_sockets: most sockets open at once (Linux only, else null)
+
+Logging is raised to CRITICAL and notifications are discarded, so the
+numbers measure probing rather than terminal output.
+"""
+
+import argparse
+import asyncio
+from datetime import datetime, timezone
+import importlib.metadata
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Callable, NamedTuple, Optional
+
+from app_monitor.app_config import AppConfig
+from app_monitor.async_monitor import AsyncAppMonitor
+from app_monitor.logger import set_logging_level
+from app_monitor.monitor import AppMonitor
+from app_monitor.quantiles import LatencySketch
+from stub_server import (
+    add_behaviour_arguments,
+    behaviour_from_args,
+    fleet_hosts,
+    run_fleet,
+)
+
+SIZES = (10, 1_000, 10_000, 50_000)
+MONITORS = ("serial", "async")
+
+
+class Scenario(NamedTuple):
+    """NamedTuple for one benchmark run"""
+
+    monitor: str
+    endpoints: int
+    duration: float
+    check_interval: int
+    workers: int
+    max_concurrency: int
+    max_per_host: int
+    retries: int
+
+
+def _endpoints(addresses: list[tuple[str, int]], count: int) -> list[str]:
+    return [
+        "http://{}:{}/endpoint/{}".format(*addresses[i % len(addresses)], i)
+        for i in range(count)
+    ]
+
+
+def _open_sockets() -> Optional[int]:
+    """Count the sockets this process has open, None if unknown"""
+    try:
+        fds = os.listdir("/proc/self/fd")
+    except OSError:
+        return None
+    count = 0
+    for fd in fds:
+        try:
+            count += os.readlink(f"/proc/self/fd/{fd}").startswith("socket:")
+        except OSError:
+            pass
+    return count
+
+
+class _SocketSampler(threading.Thread):
+    """Samples the number of open sockets until stopped, keeping the peak"""
+
+    def __init__(self, period: float = 0.2) -> None:
+        super().__init__(name="bench-socket-sampler", daemon=True)
+        self._period = period
+        self._stop = threading.Event()
+        self.peak: Optional[int] = None
+
+    def run(self) -> None:
+        while not self._stop.wait(self._period):
+            sockets = _open_sockets()
+            if sockets is not None:
+                self.peak = max(self.peak or 0, sockets)
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.join()
+
+
+def _cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _peak_rss_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _lag_summary(lag: LatencySketch) -> dict[str, float]:
+    return {
+        "p50": lag.quantile(0.5),
+        "p90": lag.quantile(0.9),
+        "p99": lag.quantile(0.99),
+        "mean": lag.mean,
+    }
+
+
+def _bench_async(app_config: AppConfig, scenario: Scenario) -> dict[str, Any]:
+    async def drive() -> dict[str, Any]:
+        monitor = AsyncAppMonitor(app_config)
+        supervisor = asyncio.create_task(monitor.supervisor())
+        await asyncio.sleep(scenario.duration)
+        counters = monitor.counters.copy()
+        supervisor.cancel()
+        for task in list(monitor._in_flight.values()):
+            task.cancel()
+        await monitor.client.aclose()
+        return {
+            "probes": counters["probes"],
+            "failures": counters["errors"] + counters["unreachable"],
+            "dispatch_lag": _lag_summary(monitor.dispatch_lag),
+        }
+
+    return asyncio.run(drive())
+
+
+def _bench_serial(app_config: AppConfig, scenario: Scenario) -> dict[str, Any]:
+    monitor = AppMonitor(app_config, workers=scenario.workers)
+    lock = threading.Lock()
+    lag = LatencySketch()
+    totals = {"probes": 0, "failures": 0}
+    cycle_due = [0.0]
+    probe = monitor.probe_endpoint
+
+    def timed_probe(endpoint: str):
+        started = time.monotonic()
+        try:
+            result = probe(endpoint)
+            failed = result is None or result.status_code != 200
+        except Exception:
+            result = None
+            failed = True
+        with lock:
+            lag.add(started - cycle_due[0])
+            totals["probes"] += 1
+            totals["failures"] += failed
+        return result
+
+    # An instance attribute shadows the method probe_all_endpoints calls
+    monitor.probe_endpoint = timed_probe  # type: ignore[method-assign]
+    stop = threading.Event()
+    first_due = time.monotonic()
+
+    def run() -> None:
+        cycle = 0
+        while not stop.is_set():
+            cycle_due[0] = first_due + cycle * app_config.check_interval
+            monitor.probe_all_endpoints()
+            cycle += 1
+
+    # probe_all_endpoints sleeps for check_interval after each cycle, so the
+    # thread is left behind rather than joined
+    threading.Thread(target=run, name="bench-serial", daemon=True).start()
+    time.sleep(scenario.duration)
+    with lock:
+        stop.set()
+        return {
+            "probes": totals["probes"],
+            "failures": totals["failures"],
+            "dispatch_lag": _lag_summary(lag),
+        }
+
+
+def run_scenario(
+    scenario: Scenario,
+    addresses: list[tuple[str, int]],
+    results: multiprocessing.Queue,
+) -> None:
+    """Entry point of a scenario's process
+
+    Args:
+        scenario (Scenario): What to run
+        addresses (list[tuple[str, int]]): The stub servers
+        results (multiprocessing.Queue): Where to put the result dict
+    """
+    set_logging_level(logging.CRITICAL)
+    sys.stdout = open(os.devnull, "w")
+    app_config = AppConfig(
+        endpoints=_endpoints(addresses, scenario.endpoints),
+        check_interval=scenario.check_interval,
+        warn_threshold=60,
+        retries=scenario.retries,
+        max_concurrency=scenario.max_concurrency,
+        max_per_host=scenario.max_per_host,
+    )
+    bench: Callable[[AppConfig, Scenario], dict[str, Any]] = (
+        _bench_serial if scenario.monitor == "serial" else _bench_async
+    )
+
+    sampler = _SocketSampler()
+    sampler.start()
+    cpu = _cpu_seconds()
+    wall = time.monotonic()
+    result = bench(app_config, scenario)
+    wall = time.monotonic() - wall
+    cpu = _cpu_seconds() - cpu
+    sampler.stop()
+
+    result.update(
+        scenario._asdict(),
+        wall_seconds=wall,
+        probes_per_second=result["probes"] / wall,
+        cpu_seconds=cpu,
+        cpu_ms_per_probe=(
+            1000 * cpu / result["probes"] if result["probes"] else None
+        ),
+        peak_rss_bytes=_peak_rss_bytes(),
+        peak_open_sockets=sampler.peak,
+    )
+    results.put(result)
+    results.close()
+    results.join_thread()
+    # Skip joining the serial monitor's threads, still busy with a cycle
+    os._exit(0)
+
+
+def _metadata(args: argparse.Namespace) -> dict[str, Any]:
+    try:
+        version = importlib.metadata.version("app_monitor")
+    except importlib.metadata.PackageNotFoundError:
+        version = None
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "app_monitor_version": version,
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "fleet_hosts": args.hosts,
+        "behaviour": behaviour_from_args(args)._asdict(),
+    }
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        default=",".join(map(str, SIZES)),
+        help="Comma separated endpoint counts",
+    )
+    parser.add_argument(
+        "--monitors",
+        default=",".join(MONITORS),
+        help="Comma separated monitors to run: serial, async",
+    )
+    parser.add_argument(
+        "--duration", type=float, default=10.0, help="Seconds per scenario"
+    )
+    parser.add_argument(
+        "--check-interval",
+        type=int,
+        default=5,
+        help="Seconds between two probes of an endpoint",
+    )
+    parser.add_argument(
+        "--hosts", type=int, default=16, help="Number of stub servers"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=16,
+        help="Threads of the serial monitor",
+    )
+    parser.add_argument("--max-concurrency", type=int, default=100)
+    parser.add_argument("--max-per-host", type=int, default=10)
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument(
+        "--output", help="Write the JSON results here instead of stdout"
+    )
+    add_behaviour_arguments(parser)
+    return parser
+
+
+def main() -> None:
+    args = _build_parser().parse_args()
+    context = multiprocessing.get_context("spawn")
+
+    receiver, sender = context.Pipe(duplex=False)
+    fleet = context.Process(
+        target=run_fleet,
+        args=(fleet_hosts(args.hosts), behaviour_from_args(args), sender),
+        name="bench-fleet",
+        daemon=True,
+    )
+    fleet.start()
+    addresses = receiver.recv()
+
+    report: dict[str, Any] = {"metadata": _metadata(args), "results": []}
+    results: multiprocessing.Queue = context.Queue()
+    try:
+        for size in map(int, args.sizes.split(",")):
+            for monitor in args.monitors.split(","):
+                scenario = Scenario(
+                    monitor=monitor,
+                    endpoints=size,
+                    duration=args.duration,
+                    check_interval=args.check_interval,
+                    workers=args.workers,
+                    max_concurrency=args.max_concurrency,
+                    max_per_host=args.max_per_host,
+                    retries=args.retries,
+                )
+                print(
+                    f"Running {monitor} with {size} endpoints", file=sys.stderr
+                )
+                process = context.Process(
+                    target=run_scenario,
+                    args=(scenario, addresses, results),
+                    name=f"bench-{monitor}-{size}",
+                )
+                process.start()
+                report["results"].append(results.get())
+                process.join()
+    finally:
+        fleet.terminate()
+        fleet.join()
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""Fleet of stub HTTP servers the monitors are benchmarked against.
+
+Every server is a bare asyncio HTTP/1.1 keep-alive server. Responses are
+delayed by a configurable latency, a share of them fail with a 500 and a
+share of them drip their body in small chunks. A seeded random generator
+drives the behaviour, so two runs with the same options serve the same
+sequence of responses.
+
+The fleet can be run on its own:
+
+    python benchmarks/stub_server.py --hosts 4 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+from typing import NamedTuple, Optional
+
+
+class StubBehaviour(NamedTuple):
+    """NamedTuple for how the stub servers respond"""
+
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    slow_drip_rate: float = 0.0
+    drip_chunks: int = 10
+    drip_delay: float = 0.01
+    body_size: int = 512
+    seed: int = 0
+
+
+def fleet_hosts(count: int) -> list[str]:
+    """Return the loopback addresses the fleet listens on
+
+    Each server gets its own address, so the monitors' per-host limits apply
+    to each server separately as they would to distinct sites. The whole
+    127.0.0.0/8 block is routed to the loopback interface on Linux.
+
+    Args:
+        count (int): The number of servers
+
+    Returns:
+        list[str]: The addresses
+    """
+    if sys.platform != "linux":
+        return ["127.0.0.1"] * count
+    return [f"127.0.{i // 250}.{i % 250 + 1}" for i in range(count)]
+
+
+async def _handle(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    behaviour: StubBehaviour,
+    rng: random.Random,
+) -> None:
+    try:
+        while True:
+            request = await reader.readuntil(b"\r\n\r\n")
+            head_only = request.startswith(b"HEAD ")
+            delay = behaviour.latency
+            if behaviour.jitter:
+                delay = max(0.0, delay + rng.uniform(-1, 1) * behaviour.jitter)
+            if delay:
+                await asyncio.sleep(delay)
+
+            status = (
+                b"500 Internal Server Error"
+                if rng.random() < behaviour.error_rate
+                else b"200 OK"
+            )
+            body = b"x" * behaviour.body_size
+            writer.write(
+                b"HTTP/1.1 " + status + b"\r\n"
+                b"Content-Type: text/plain\r\n"
+                b"Content-Length: " + str(len(body)).encode() + b"\r\n"
+                b"\r\n"
+            )
+            if head_only:
+                pass
+            elif rng.random() < behaviour.slow_drip_rate:
+                chunk_size = max(1, len(body) // behaviour.drip_chunks)
+                for start in range(0, len(body), chunk_size):
+                    await writer.drain()
+                    await asyncio.sleep(behaviour.drip_delay)
+                    writer.write(body[start : start + chunk_size])
+            else:
+                writer.write(body)
+            await writer.drain()
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+        pass
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve_fleet(
+    hosts: list[str],
+    behaviour: StubBehaviour,
+    port: int = 0,
+    started: Optional[asyncio.Future] = None,
+) -> None:
+    """Serve until cancelled
+
+    Args:
+        hosts (list[str]): The addresses to listen on, one server each
+        behaviour (StubBehaviour): How the servers respond
+        port (int): The port of every server, 0 to pick free ones
+        started (Optional[asyncio.Future]): Set to the list of
+                (host, port) the servers listen on once they are ready
+    """
+    rng = random.Random(behaviour.seed)
+
+    async def handle(reader, writer) -> None:
+        await _handle(reader, writer, behaviour, rng)
+
+    servers = [
+        await asyncio.start_server(handle, host, port, backlog=4096)
+        for host in hosts
+    ]
+    addresses = [server.sockets[0].getsockname()[:2] for server in servers]
+    if started is not None:
+        started.set_result(addresses)
+    try:
+        await asyncio.gather(*(server.serve_forever() for server in servers))
+    finally:
+        for server in servers:
+            server.close()
+
+
+def run_fleet(hosts: list[str], behaviour: StubBehaviour, ready) -> None:
+    """Entry point of the fleet's process
+
+    Args:
+        hosts (list[str]): The addresses to listen on, one server each
+        behaviour (StubBehaviour): How the servers respond
+        ready: A multiprocessing connection the (host, port) list is sent on
+    """
+
+    async def main() -> None:
+        started = asyncio.get_running_loop().create_future()
+        server = asyncio.create_task(serve_fleet(hosts, behaviour, 0, started))
+        ready.send(await started)
+        await server
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+
+
+def add_behaviour_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the StubBehaviour options to a command line parser"""
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.01,
+        help="Seconds before a response starts",
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0.005,
+        help="Latency varies uniformly by up to this many seconds",
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.01,
+        help="Share of responses that are a 500",
+    )
+    parser.add_argument(
+        "--slow-drip-rate",
+        type=float,
+        default=0.01,
+        help="Share of responses whose body is sent in delayed chunks",
+    )
+    parser.add_argument(
+        "--body-size", type=int, default=512, help="Response body size"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Seed of the response sequence"
+    )
+
+
+def behaviour_from_args(args: argparse.Namespace) -> StubBehaviour:
+    """Build the StubBehaviour from parsed command line options"""
+    return StubBehaviour(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        slow_drip_rate=args.slow_drip_rate,
+        body_size=args.body_size,
+        seed=args.seed,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--hosts", type=int, default=1, help="Number of servers"
+    )
+    parser.add_argument(
+        "--port", type=int, default=8080, help="Port of every server"
+    )
+    add_behaviour_arguments(parser)
+    args = parser.parse_args()
+
+    async def serve() -> None:
+        started = asyncio.get_running_loop().create_future()
+        server = asyncio.create_task(
+            serve_fleet(
+                fleet_hosts(args.hosts),
+                behaviour_from_args(args),
+                args.port,
+                started,
+            )
+        )
+        for host, port in await started:
+            print(f"Serving on http://{host}:{port}/")
+        await server
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,28 @@
 #!/usr/bin/env python
 import argparse
+from datetime import datetime
+import json
 import logging
+import math
 from pathlib import Path
+import signal
 import sys
-from app_monitor.logger import set_file_handler, set_logging_level
-from app_monitor.monitor import AppMonitor
-from app_monitor.async_monitor import AsyncAppMonitor
-from app_monitor.app_config import load_config
+from typing import TYPE_CHECKING, Optional
+from app_monitor.logger import (
+    LOGGER,
+    enable_queue_logging,
+    set_file_handler,
+    set_logging_level,
+)
+from app_monitor.app_config import ConfigValidationError, load_config
 import asyncio
 
+# The monitors are imported once chosen, so that a run only imports its own
+# HTTP client: requests for the serial monitor, httpx for the others
+if TYPE_CHECKING:
+    from app_monitor.async_monitor import AsyncAppMonitor
+    from app_monitor.cluster import Coordinator
+
 
 def _build_parser():
     parser = argparse.ArgumentParser(description="Web app monitoring tool")
@@ -20,8 +34,47 @@ def _build_parser():
     parser.add_argument(
         "--log",
         type=str.lower,
-        help=("Path of the log file"),
-        default="app_monitor.log",
+        help=(
+            "Path of the log file (default: app_monitor.log, none with "
+            "--once)"
+        ),
+    )
+    parser.add_argument(
+        "--log-max-bytes",
+        type=int,
+        help=("Rotate the log file when it reaches this size (0: never)"),
+        default=0,
+    )
+    parser.add_argument(
+        "--log-backup-count",
+        type=int,
+        help=("Number of rotated log files to keep"),
+        default=5,
+    )
+    parser.add_argument(
+        "--log-buffer",
+        type=int,
+        help=("Write the log file in batches of this many records"),
+        default=0,
+    )
+    parser.add_argument(
+        "--queued-logging",
+        action="store_true",
+        help=(
+            "Format and write log records from a background thread instead "
+            "of the probing thread"
+        ),
+        default=False,
+    )
+    parser.add_argument(
+        "--once",
+        action="store_true",
+        help=(
+            "Check every endpoint once, concurrently, print the results as "
+            "JSON and exit with 0 if all are healthy, 2 otherwise, 1 if the "
+            "check could not run"
+        ),
+        default=False,
     )
     parser.add_argument(
         "--no-async",
@@ -29,32 +82,285 @@ def _build_parser():
         help=("Toggle between serial and async monitoring"),
         default=False,
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help=(
+            "Number of threads probing endpoints concurrently "
+            "(only with --no-async)"
+        ),
+        default=1,
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        help=(
+            "Number of worker processes the endpoints are sharded across, "
+            "each running its own event loop (not with --no-async)"
+        ),
+        default=1,
+    )
+    parser.add_argument(
+        "--coordinate",
+        type=str,
+        metavar="HOST:PORT",
+        help=(
+            "Run as the cluster coordinator listening on this address: "
+            "assign the endpoints to the workers that join it"
+        ),
+    )
+    parser.add_argument(
+        "--join",
+        type=str,
+        metavar="HOST:PORT",
+        help=(
+            "Run as a cluster worker checking the endpoints the coordinator "
+            "at this address assigns"
+        ),
+    )
+    parser.add_argument(
+        "--worker-id",
+        type=str,
+        help=("Name of the worker in the cluster (default: host-pid)"),
+    )
+    parser.add_argument(
+        "--reload-interval",
+        type=float,
+        help=(
+            "Seconds between two checks of the configuration file for "
+            "changes, 0 to only reload on SIGHUP (async monitor only)"
+        ),
+        default=5.0,
+    )
     parser.add_argument(
         "--debug",
         action="store_true",
         help=("Toggle debug mode"),
         default=False,
     )
+    subparsers = parser.add_subparsers(dest="command")
+    query = subparsers.add_parser(
+        "query",
+        help="Query the probe result store",
+        description=(
+            "Query the probe result store. Times are durations before now "
+            "(90s, 30m, 24h, 7d), ISO 8601 dates or UNIX times"
+        ),
+    )
+    query.add_argument(
+        "report",
+        choices=("aggregates", "records", "failures"),
+        nargs="?",
+        help=(
+            "Per-endpoint aggregates, every stored result or the failed "
+            "probes"
+        ),
+        default="aggregates",
+    )
+    query.add_argument(
+        "--store",
+        type=str,
+        help=("Path of the store (default: store_path of --config)"),
+    )
+    query.add_argument(
+        "--since",
+        type=str,
+        help=("Start of the time range"),
+        default="24h",
+    )
+    query.add_argument(
+        "--until",
+        type=str,
+        help=("End of the time range (default: now)"),
+    )
+    query.add_argument(
+        "--endpoint",
+        type=str,
+        help=("Only query this endpoint"),
+    )
+    query.add_argument(
+        "--json",
+        action="store_true",
+        help=("Print one JSON object per line"),
+        default=False,
+    )
     return parser
 
 
-def main(args: argparse.Namespace):
-    app_config = load_config(Path(args.config))
+def _format_time(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).isoformat(timespec="milliseconds")
 
-    # Set up logging
-    log_path = Path(args.log)
-    set_file_handler(log_path)
+
+def query(args: argparse.Namespace) -> int:
+    """Print a report of the probe result store
+
+    Args:
+        args (argparse.Namespace): The query arguments
+
+    Returns:
+        int: The exit code
+    """
+    store_path = args.store
+    if store_path is None and args.config:
+        store_path = load_config(Path(args.config)).store_path
+    if store_path is None:
+        print("No store: pass --store or a --config with a store_path")
+        return 1
+    from app_monitor.store import StoreReader, parse_time
+
+    try:
+        reader = StoreReader(Path(store_path))
+        start = parse_time(args.since)
+        end = math.inf if args.until is None else parse_time(args.until)
+    except (OSError, ValueError) as exc:
+        print(exc)
+        return 1
+
+    if args.report == "aggregates":
+        aggregates = reader.aggregates(start, end, args.endpoint)
+        if not args.json:
+            print("endpoint\tprobes\terrors\tmean\tp50\tp99\tmax")
+        for aggregate in aggregates:
+            if args.json:
+                print(json.dumps(aggregate._asdict()))
+            else:
+                print(
+                    f"{aggregate.endpoint}\t{aggregate.probes}\t"
+                    f"{aggregate.errors}\t{aggregate.mean:.3f}\t"
+                    f"{aggregate.p50:.3f}\t{aggregate.p99:.3f}\t"
+                    f"{aggregate.max:.3f}"
+                )
+        return 0
+
+    if args.report == "records":
+        records = reader.records(start, end, args.endpoint)
+    else:
+        records = reader.failures(start, end, args.endpoint)
+    for record in records:
+        if args.json:
+            print(json.dumps(record._asdict()))
+        else:
+            print(
+                f"{_format_time(record.timestamp)}\t{record.endpoint}\t"
+                f"{record.status_code}\t{record.response_time:.3f}"
+                + ("\tcontent check failed" if record.check_failed else "")
+            )
+    return 0
+
+
+async def _supervise(
+    app_monitor: "AsyncAppMonitor", config_path: Path, reload_interval: float
+):
+    from app_monitor.reload import ConfigWatcher
+
+    watcher = ConfigWatcher(
+        config_path, app_monitor.apply_config, reload_interval
+    )
+    watcher.install_signal_handler()
+    polling = asyncio.create_task(watcher.run())
+    loop = asyncio.get_running_loop()
+    try:
+        # Stop gracefully, saving the checkpoint, when a deploy stops us
+        loop.add_signal_handler(signal.SIGTERM, app_monitor.stop)
+    except NotImplementedError:
+        pass
+    try:
+        await app_monitor.supervisor()
+    finally:
+        polling.cancel()
+        watcher.remove_signal_handler()
+
+
+async def _coordinate(
+    coordinator: "Coordinator", config_path: Path, reload_interval: float
+):
+    from app_monitor.reload import ConfigWatcher
+
+    watcher = ConfigWatcher(
+        config_path, coordinator.apply_config, reload_interval
+    )
+    watcher.install_signal_handler()
+    polling = asyncio.create_task(watcher.run())
+    try:
+        await coordinator.run()
+    finally:
+        polling.cancel()
+        watcher.remove_signal_handler()
+
+
+def main(args: argparse.Namespace) -> Optional[int]:
+    if args.once:
+        try:
+            app_config = load_config(Path(args.config))
+        except (OSError, ConfigValidationError) as exc:
+            print(f"Invalid configuration: {exc}", file=sys.stderr)
+            return 1
+    else:
+        app_config = load_config(Path(args.config))
+
+    # Set up logging, only to stderr for a one-shot check unless asked
+    if args.log is not None or not args.once:
+        log_path = Path(args.log or "app_monitor.log")
+        set_file_handler(
+            log_path,
+            max_bytes=args.log_max_bytes,
+            backup_count=args.log_backup_count,
+            buffer_capacity=args.log_buffer,
+        )
+    if args.queued_logging:
+        enable_queue_logging()
     if args.debug:
         set_logging_level(logging.DEBUG)
 
     # Start monitor
-    if args.no_async:
-        app_monitor = AppMonitor(app_config)
+    if args.once:
+        from app_monitor.oneshot import run_once
+
+        return run_once(app_config, serial=args.no_async)
+    elif args.coordinate:
+        from app_monitor.cluster import Coordinator, parse_address
+
+        host, port = parse_address(args.coordinate)
+        coordinator = Coordinator(app_config, host, port)
+        coro = _coordinate(coordinator, Path(args.config), args.reload_interval)
+        asyncio.run(coro)
+    elif args.join:
+        from app_monitor.cluster import ClusterWorker, parse_address
+
+        host, port = parse_address(args.join)
+        worker = ClusterWorker(app_config, host, port, args.worker_id)
+        asyncio.run(worker.run())
+    elif args.no_async:
+        from app_monitor.monitor import AppMonitor
+
+        app_monitor = AppMonitor(app_config, workers=args.workers)
         app_monitor.run()
+    elif args.processes > 1:
+        from app_monitor.sharding import ShardedMonitor
+
+        sharded_monitor = ShardedMonitor(
+            app_config,
+            processes=args.processes,
+            log_path=log_path,
+            log_level=LOGGER.level,
+        )
+
+        def stop_sharded_monitor(signum, frame):
+            sharded_monitor.RUN = False
+
+        # Stop gracefully, letting the workers save their checkpoint, when a
+        # deploy stops us
+        signal.signal(signal.SIGTERM, stop_sharded_monitor)
+        sharded_monitor.run()
     else:
-        app_monitor = AsyncAppMonitor(app_config)
-        coro = app_monitor.supervisor()
+        from app_monitor.async_monitor import AsyncAppMonitor
+
+        async_monitor = AsyncAppMonitor(app_config)
+        coro = _supervise(
+            async_monitor, Path(args.config), args.reload_interval
+        )
         asyncio.run(coro)
+    return None
 
 
 if __name__ == "__main__":
@@ -62,10 +368,22 @@ if __name__ == "__main__":
         parser = _build_parser()
         args = parser.parse_args()
 
+        if args.command == "query":
+            sys.exit(query(args))
+
         if not args.config:
             parser.print_help()
             sys.exit(1)
 
-        main(args)
+        for address in (args.coordinate, args.join):
+            if address is not None:
+                from app_monitor.cluster import parse_address
+
+                try:
+                    parse_address(address)
+                except ValueError as exc:
+                    parser.error(str(exc))
+
+        sys.exit(main(args))
     except KeyboardInterrupt:
         raise SystemExit("Aborted by user via keyboard interrupt!")
@@ -23,6 +23,12 @@ BUILD_REQUIREMENTS = [
 ]
 
 
+# Optional features
+HTTP2_REQUIREMENTS = [
+    "httpx[http2]",
+]
+
+
 DEV_REQUIREMENTS = [
     *BUILD_REQUIREMENTS,
     "ipython",
@@ -41,6 +47,7 @@ setup(
     extras_require={
         "testing": BUILD_REQUIREMENTS,
         "dev": DEV_REQUIREMENTS,
+        "http2": HTTP2_REQUIREMENTS,
     },
     setup_requires=["wheel", "setuptools_scm"],
     scripts=[
@@ -3,9 +3,19 @@
 import json
 from pathlib import Path
 import validators
-from typing import NamedTuple
+from typing import NamedTuple, Optional
 from json.decoder import JSONDecodeError
 
+from app_monitor.catalog import (
+    dedupe_endpoints,
+    is_valid_url,
+    key_probes_by_endpoint,
+    load_endpoints,
+    origin,
+)
+from app_monitor.probing import PROBE_METHODS, ProbeOptions, parse_probe_options
+from app_monitor.quantiles import WARN_RULES
+
 
 class AppConfig(NamedTuple):
     """NamedTuple for the application configuration."""
@@ -14,6 +24,48 @@ class AppConfig(NamedTuple):
     check_interval: int = 300
     warn_threshold: float | int = 3.0
     retries: int = 3
+    max_concurrency: int = 100
+    max_per_host: int = 10
+    adaptive_concurrency: bool = False
+    notification_webhook: Optional[str] = None
+    notification_batch_window: float | int = 1.0
+    notification_rate_limit: float | int = 1.0
+    notification_dedupe_window: float | int = 300.0
+    history_size: int = 64
+    warn_rule: str = "fixed"
+    warn_baseline_factor: float | int = 3.0
+    latency_window: int = 300
+    metrics_port: Optional[int] = None
+    metrics_host: str = "127.0.0.1"
+    endpoints_file: Optional[str] = None
+    retry_backoff: float | int = 0.1
+    retry_backoff_max: float | int = 5.0
+    retry_budget_ratio: float | int = 0.2
+    breaker_failure_threshold: int = 5
+    breaker_reset_timeout: float | int = 30.0
+    dns_ttl: float | int = 60.0
+    dns_negative_ttl: float | int = 5.0
+    dns_cache_size: int = 10000
+    probe_method: str = "GET"
+    probe_max_bytes: int = 0
+    # Endpoints probed differently from probe_method and probe_max_bytes
+    endpoint_probes: Optional[dict[str, ProbeOptions]] = None
+    http2: bool = False
+    store_path: Optional[str] = None
+    store_segment_seconds: int = 3600
+    store_retention: float | int = 7 * 86400
+    # Probes per second, globally and per origin; None for no limit
+    probe_rate: Optional[float | int] = None
+    origin_probe_rate: Optional[float | int] = None
+    origin_probe_rates: Optional[dict[str, float | int]] = None
+    spread_checks: bool = False
+    checkpoint_path: Optional[str] = None
+    checkpoint_interval: float | int = 60.0
+    cluster_report_interval: float | int = 1.0
+    cluster_heartbeat_timeout: float | int = 10.0
+    # Warn when the certificate of a tls:// or STATUS https:// endpoint
+    # expires within this many days
+    cert_expiry_warn_days: float | int = 14.0
 
 
 class ConfigValidationError(Exception):
@@ -27,17 +79,23 @@ def validate_config(raw_config: dict) -> None:
     Args:
         raw_config (dict): The raw configuration dictionary.
     """
-    if "endpoints" not in raw_config:
+    # Endpoints may all come from the catalog, validated while it is loaded
+    has_catalog = "endpoints_file" in raw_config
+    if has_catalog and not isinstance(raw_config["endpoints_file"], str):
+        raise ConfigValidationError("'endpoints_file' must be a path")
+
+    if "endpoints" not in raw_config and not has_catalog:
         raise ConfigValidationError("Missing 'endpoints' key in configuration")
 
-    if not isinstance(raw_config["endpoints"], list):
+    endpoints = raw_config.get("endpoints", [])
+    if not isinstance(endpoints, list):
         raise ConfigValidationError("'endpoints' must be a list of URLs")
 
-    if not raw_config["endpoints"]:
+    if not endpoints and not has_catalog:
         raise ConfigValidationError("'endpoints' list must not be empty")
 
-    for endpoint in raw_config["endpoints"]:
-        if not validators.url(endpoint):
+    for endpoint in endpoints:
+        if not is_valid_url(endpoint):
             raise ConfigValidationError(f"Invalid URL: {endpoint}")
 
     if "check_interval" not in raw_config:
@@ -59,8 +117,144 @@ def validate_config(raw_config: dict) -> None:
     if "retries" not in raw_config:
         raise ConfigValidationError("Missing 'retries' key in configuration")
 
-    if not isinstance(raw_config["retries"], int):
-        raise ConfigValidationError("'retries' must be an integer")
+    # Every probe makes at least one attempt
+    if not _is_positive_int(raw_config["retries"]):
+        raise ConfigValidationError("'retries' must be a positive integer")
+
+    for key in (
+        "max_concurrency",
+        "max_per_host",
+        "history_size",
+        "latency_window",
+        "breaker_failure_threshold",
+        "dns_cache_size",
+        "store_segment_seconds",
+    ):
+        if key in raw_config and not _is_positive_int(raw_config[key]):
+            raise ConfigValidationError(f"'{key}' must be a positive integer")
+
+    if "adaptive_concurrency" in raw_config and not isinstance(
+        raw_config["adaptive_concurrency"], bool
+    ):
+        raise ConfigValidationError("'adaptive_concurrency' must be a boolean")
+
+    if "http2" in raw_config and not isinstance(raw_config["http2"], bool):
+        raise ConfigValidationError("'http2' must be a boolean")
+
+    if "spread_checks" in raw_config and not isinstance(
+        raw_config["spread_checks"], bool
+    ):
+        raise ConfigValidationError("'spread_checks' must be a boolean")
+
+    origin_probe_rates = raw_config.get("origin_probe_rates", {})
+    if not isinstance(origin_probe_rates, dict) or not all(
+        is_valid_url(url) and _is_positive_number(rate)
+        for url, rate in origin_probe_rates.items()
+    ):
+        raise ConfigValidationError(
+            "'origin_probe_rates' must map URLs to positive numbers"
+        )
+
+    if "warn_rule" in raw_config and raw_config["warn_rule"] not in WARN_RULES:
+        raise ConfigValidationError(
+            f"'warn_rule' must be one of {', '.join(WARN_RULES)}"
+        )
+
+    if "probe_method" in raw_config and not (
+        isinstance(raw_config["probe_method"], str)
+        and raw_config["probe_method"].upper() in PROBE_METHODS
+    ):
+        raise ConfigValidationError(
+            f"'probe_method' must be one of {', '.join(PROBE_METHODS)}"
+        )
+
+    if "probe_max_bytes" in raw_config and not (
+        _is_positive_int(raw_config["probe_max_bytes"])
+        or raw_config["probe_max_bytes"] == 0
+    ):
+        raise ConfigValidationError(
+            "'probe_max_bytes' must be a non-negative integer"
+        )
+
+    endpoint_probes = raw_config.get("endpoint_probes", {})
+    if not isinstance(endpoint_probes, dict):
+        raise ConfigValidationError(
+            "'endpoint_probes' must map URLs to probe options"
+        )
+    for endpoint, options in endpoint_probes.items():
+        if not is_valid_url(endpoint) or not isinstance(options, dict):
+            raise ConfigValidationError(
+                "'endpoint_probes' must map URLs to probe options"
+            )
+        try:
+            parse_probe_options(options)
+        except ValueError as exc:
+            raise ConfigValidationError(
+                f"Invalid probe options of {endpoint}: {exc}"
+            ) from exc
+
+    if "metrics_port" in raw_config and not (
+        _is_positive_int(raw_config["metrics_port"])
+        and raw_config["metrics_port"] <= 65535
+    ):
+        raise ConfigValidationError("'metrics_port' must be a TCP port")
+
+    if "store_path" in raw_config and not isinstance(
+        raw_config["store_path"], str
+    ):
+        raise ConfigValidationError("'store_path' must be a path")
+
+    if "checkpoint_path" in raw_config and not isinstance(
+        raw_config["checkpoint_path"], str
+    ):
+        raise ConfigValidationError("'checkpoint_path' must be a path")
+
+    if "metrics_host" in raw_config and not isinstance(
+        raw_config["metrics_host"], str
+    ):
+        raise ConfigValidationError("'metrics_host' must be a string")
+
+    if "notification_webhook" in raw_config and not (
+        isinstance(raw_config["notification_webhook"], str)
+        and validators.url(raw_config["notification_webhook"])
+    ):
+        raise ConfigValidationError("'notification_webhook' must be a URL")
+
+    for key in (
+        "notification_batch_window",
+        "notification_rate_limit",
+        "notification_dedupe_window",
+        "warn_baseline_factor",
+        "retry_backoff",
+        "retry_backoff_max",
+        "retry_budget_ratio",
+        "breaker_reset_timeout",
+        "dns_ttl",
+        "dns_negative_ttl",
+        "store_retention",
+        "checkpoint_interval",
+        "probe_rate",
+        "origin_probe_rate",
+        "cluster_report_interval",
+        "cluster_heartbeat_timeout",
+        "cert_expiry_warn_days",
+    ):
+        if key in raw_config and not _is_positive_number(raw_config[key]):
+            raise ConfigValidationError(f"'{key}' must be a positive number")
+
+
+def _is_positive_int(value: object) -> bool:
+    """Check that a value is a strictly positive integer, excluding booleans"""
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+
+def _is_positive_number(value: object) -> bool:
+    """Check that a value is a strictly positive number, excluding booleans"""
+    return (
+        isinstance(value, (int, float))
+        and not isinstance(value, bool)
+        and value > 0
+    )
 
 
 def load_config(config_path: Path) -> AppConfig:
@@ -81,5 +275,49 @@ def load_config(config_path: Path) -> AppConfig:
                 "Invalid JSON in configuration file"
             ) from exc
         validate_config(raw_config)
-        res = AppConfig(**raw_config)
-        return res
+
+    probes = dict(raw_config.get("endpoint_probes", {}))
+    if "endpoints_file" in raw_config:
+        # Relative to the configuration file
+        endpoints_path = config_path.parent / raw_config["endpoints_file"]
+        try:
+            raw_config["endpoints"] = load_endpoints(
+                endpoints_path, raw_config.get("endpoints", []), probes
+            )
+        except (OSError, ValueError) as exc:
+            raise ConfigValidationError(
+                f"Invalid endpoints file: {exc}"
+            ) from exc
+        if not raw_config["endpoints"]:
+            raise ConfigValidationError(f"No endpoints in {endpoints_path}")
+    else:
+        raw_config["endpoints"] = dedupe_endpoints(raw_config["endpoints"])
+    try:
+        probes = key_probes_by_endpoint(probes, raw_config["endpoints"])
+    except ValueError as exc:
+        raise ConfigValidationError(
+            f"Invalid 'endpoint_probes': {exc}"
+        ) from exc
+
+    for key in ("store_path", "checkpoint_path"):
+        if key in raw_config:
+            # Relative to the configuration file
+            raw_config[key] = str(config_path.parent / raw_config[key])
+
+    if "origin_probe_rates" in raw_config:
+        raw_config["origin_probe_rates"] = {
+            origin(url): rate
+            for url, rate in raw_config["origin_probe_rates"].items()
+        }
+
+    default = ProbeOptions(
+        raw_config.get("probe_method", "GET").upper(),
+        raw_config.get("probe_max_bytes", 0),
+    )
+    raw_config["probe_method"] = default.method
+    raw_config["endpoint_probes"] = {
+        endpoint: parse_probe_options(options, default)
+        for endpoint, options in probes.items()
+    } or None
+    res = AppConfig(**raw_config)
+    return res
@@ -1,19 +1,89 @@
 """Asynchronous application monitor."""
 
 import asyncio
-from typing import NamedTuple, Optional
+from collections import Counter
+import math
+from pathlib import Path
+import ssl
+import time
+from typing import Optional
 
 from app_monitor.app_config import AppConfig
-from app_monitor.logger import LOGGER, send_slack_notification
+from app_monitor.async_transport import build_transport, trace_phases
+from app_monitor.checkpoint import Checkpointer
+from app_monitor.concurrency import ProbeLimiter
+from app_monitor.dns import DNSCache
+from app_monitor.endpoints import EndpointState, EndpointTable
+from app_monitor.history import HistoryStore
+from app_monitor.logger import LOGGER
+from app_monitor.metrics import (
+    MetricFamily,
+    MetricsRegistry,
+    MetricsServer,
+    escape_label,
+    sample,
+)
+from app_monitor.multiplexing import OriginStreams, http2_available
+from app_monitor.notifier import NotificationDispatcher
+from app_monitor.probing import (
+    CONDITIONAL,
+    PROBE_TIMEOUT,
+    ValidatorCache,
+    aread_body,
+)
+from app_monitor.quantiles import LatencySketch, SlowResponseDetector
+from app_monitor.resilience import (
+    CLOSED,
+    CircuitBreakers,
+    CircuitOpenError,
+    RetryBudget,
+    backoff_delay,
+)
+from app_monitor.results import ProbeResult, ResultListener
+from app_monitor.scheduler import DeadlineScheduler
+from app_monitor.shaping import RateShaper, next_phase
+from app_monitor.socket_probes import (
+    UnhealthyError,
+    UnreachableError,
+    default_ssl_context,
+    probe_socket,
+    socket_target,
+)
+from app_monitor.store import ResultStore
+from app_monitor.timing import record_phases
 import httpx
 
-
-class ProbeResult(NamedTuple):
-    """NamedTuple for the probe result"""
-
-    endpoint: str
-    status_code: int
-    response_time: float
+# Settings baked into long-lived components; a reload cannot change them
+_RESTART_KEYS = (
+    "max_concurrency",
+    "max_per_host",
+    "adaptive_concurrency",
+    "notification_webhook",
+    "notification_batch_window",
+    "notification_rate_limit",
+    "notification_dedupe_window",
+    "history_size",
+    "warn_rule",
+    "warn_baseline_factor",
+    "latency_window",
+    "metrics_port",
+    "metrics_host",
+    "retry_budget_ratio",
+    "breaker_failure_threshold",
+    "breaker_reset_timeout",
+    "dns_ttl",
+    "dns_negative_ttl",
+    "dns_cache_size",
+    "http2",
+    "store_path",
+    "store_segment_seconds",
+    "store_retention",
+    "checkpoint_path",
+    "checkpoint_interval",
+    "probe_rate",
+    "origin_probe_rate",
+    "origin_probe_rates",
+)
 
 
 class AsyncAppMonitor:
@@ -24,13 +94,107 @@ class AsyncAppMonitor:
     def __init__(self, app_config: AppConfig) -> None:
         self._app_config: AppConfig = app_config
         self._client: Optional[httpx.AsyncClient] = None
+        self._scheduler = DeadlineScheduler()
+        self._limiter = ProbeLimiter(
+            max_concurrency=app_config.max_concurrency,
+            max_per_host=app_config.max_per_host,
+            adaptive=app_config.adaptive_concurrency,
+        )
+        self.endpoints = EndpointTable()
+        self.endpoints.update(app_config)
+        self._in_flight: set[asyncio.Task] = set()
+        self._supervising = False
+        self._wakeup = asyncio.Event()
+        self._result_listeners: list[ResultListener] = []
+        self._notifier = NotificationDispatcher.from_config(app_config)
+        self._retry_budget = RetryBudget(ratio=app_config.retry_budget_ratio)
+        self.breakers = CircuitBreakers(
+            failure_threshold=app_config.breaker_failure_threshold,
+            reset_timeout=app_config.breaker_reset_timeout,
+        )
+        self.dns_cache = DNSCache(
+            ttl=app_config.dns_ttl,
+            negative_ttl=app_config.dns_negative_ttl,
+            max_entries=app_config.dns_cache_size,
+        )
+        self.validators = ValidatorCache()
+        self._ssl_context: Optional[ssl.SSLContext] = None
+        # UNIX time the certificate of each TLS socket probe expires
+        self.cert_expiry: dict[str, float] = {}
+        self.counters: Counter[str] = Counter()
+        self.history = HistoryStore(app_config.history_size)
+        self.slow_responses = SlowResponseDetector(
+            rule=app_config.warn_rule,
+            baseline_factor=app_config.warn_baseline_factor,
+            window=app_config.latency_window,
+        )
+        # How late checks are dispatched after their deadline, in seconds
+        self.dispatch_lag = LatencySketch()
+        self.metrics = MetricsRegistry()
+        self.metrics.add_collector(self._scheduler_metrics)
+        self.metrics.add_collector(self._certificate_metrics)
+        self.streams = OriginStreams()
+        self.metrics.add_collector(self.streams.collect)
+        self.shaper = RateShaper(
+            rate=app_config.probe_rate,
+            origin_rate=app_config.origin_probe_rate,
+            origin_rates=app_config.origin_probe_rates,
+        )
+        if self.shaper.enabled:
+            self.metrics.add_collector(self.shaper.collect)
+        self._metrics_server: Optional[MetricsServer] = None
+        self.add_result_listener(self._record_history)
+        self.add_result_listener(self.metrics.observe)
+        self.store: Optional[ResultStore] = None
+        if app_config.store_path is not None:
+            self.store = ResultStore(
+                Path(app_config.store_path),
+                segment_seconds=app_config.store_segment_seconds,
+                retention=app_config.store_retention,
+            )
+            self.add_result_listener(self.store.append)
+        self.checkpoint: Optional[Checkpointer] = None
+        if app_config.checkpoint_path is not None:
+            self.checkpoint = Checkpointer(
+                Path(app_config.checkpoint_path),
+                interval=app_config.checkpoint_interval,
+            )
+        # Next deadline of every endpoint restored from a checkpoint
+        self._restored_deadlines: dict[str, float] = {}
 
     @property
     def client(self) -> httpx.AsyncClient:
         if self._client is None:
-            self._client = httpx.AsyncClient()
+            http2 = self._app_config.http2
+            if http2 and not http2_available():
+                LOGGER.warning(
+                    "HTTP/2 needs the h2 package, install app_monitor[http2]."
+                    " Using HTTP/1.1"
+                )
+                http2 = False
+            # Size the pool to the concurrency cap so that every probe allowed
+            # in flight gets a connection and idle ones can be kept alive
+            self._client = httpx.AsyncClient(
+                transport=build_transport(
+                    httpx.Limits(
+                        max_connections=self._app_config.max_concurrency,
+                        max_keepalive_connections=(
+                            self._app_config.max_concurrency
+                        ),
+                    ),
+                    self.dns_cache,
+                    http2,
+                )
+            )
         return self._client
 
+    @property
+    def ssl_context(self) -> ssl.SSLContext:
+        """The TLS context of the socket probes, loaded once"""
+        if self._ssl_context is None:
+            self._ssl_context = default_ssl_context()
+        return self._ssl_context
+
     async def probe_endpoint(self, endpoint: str) -> Optional[ProbeResult]:
         """
         Probe an endpoint and return the result.
@@ -41,22 +205,152 @@ class AsyncAppMonitor:
         Returns:
             Optional[ProbeResult]: The probe result.
         """
+        state = self.endpoints.state(endpoint)
+        host = state.host
+        if not self.breakers.allow(host):
+            raise CircuitOpenError(host)
+        self._retry_budget.record_probe()
+        options = state.options
         attempt = 0
         while attempt < self._app_config.retries:
+            if self.shaper.enabled:
+                # Outside of the limiter slot, so waiting holds no capacity
+                await self.shaper.acquire(state.origin)
             try:
-                resp = await self.client.get(
-                    endpoint, timeout=5, follow_redirects=True
-                )
-                resp.raise_for_status()
+                with record_phases() as phases:
+                    async with self._limiter.slot(host):
+                        if state.socket_probe:
+                            status_code = await self._probe_socket(state)
+                            elapsed, failure = None, None
+                        else:
+                            with self.streams.track(state.origin):
+                                resp, failure = await self._send(state)
+                            if options.method == CONDITIONAL:
+                                self.validators.update(
+                                    endpoint, resp.status_code, resp.headers
+                                )
+                            if not options.is_healthy(resp.status_code):
+                                raise UnhealthyError(
+                                    resp.status_code,
+                                    "returned status code "
+                                    f"{resp.status_code}",
+                                )
+                            status_code = resp.status_code
+                            elapsed = resp.elapsed.total_seconds()
+                timings = phases.timings()
                 return ProbeResult(
                     endpoint=endpoint,
-                    status_code=resp.status_code,
-                    response_time=resp.elapsed.total_seconds(),
+                    status_code=status_code,
+                    response_time=timings.total if elapsed is None else elapsed,
+                    timings=timings,
+                    failure=failure,
                 )
-            except (httpx.ConnectError, httpx.ConnectTimeout):
+            except (httpx.ConnectError, httpx.ConnectTimeout, UnreachableError):
                 attempt += 1
-                if attempt == self._app_config.retries:
+                self._record_unreachable(host)
+                if (
+                    attempt == self._app_config.retries
+                    or self.breakers.state(host) != CLOSED
+                    or not self._retry_budget.try_spend()
+                ):
                     raise
+                self.counters["retries"] += 1
+                self.metrics.record_retry(endpoint)
+                # Outside of the limiter slot, so waiting holds no capacity
+                await asyncio.sleep(
+                    backoff_delay(
+                        attempt - 1,
+                        self._app_config.retry_backoff,
+                        self._app_config.retry_backoff_max,
+                    )
+                )
+
+    async def _send(
+        self, state: EndpointState
+    ) -> tuple[httpx.Response, Optional[str]]:
+        """Send a probe and read its body as the probe method asks
+
+        Args:
+            state (EndpointState): The endpoint
+
+        Returns:
+            tuple[httpx.Response, Optional[str]]: The closed response, and
+                    why its body failed the content assertions, if it did
+        """
+        endpoint, options = state.url, state.options
+        check = options.content_check()
+        async with self.client.stream(
+            options.http_method,
+            endpoint,
+            headers=(
+                self.validators.headers(endpoint)
+                if options.method == CONDITIONAL
+                else None
+            ),
+            timeout=PROBE_TIMEOUT,
+            follow_redirects=True,
+            extensions={"trace": trace_phases},
+        ) as resp:
+            self._record_reachable(state.host)
+            # Discarded chunk by chunk, never buffered
+            self.counters["body_bytes"] += await aread_body(
+                resp, options.body_limit, check
+            )
+        self.streams.record_version(state.origin, resp.http_version)
+        return resp, None if check is None else check.failure
+
+    async def _probe_socket(self, state: EndpointState) -> int:
+        """Probe an endpoint over a raw socket, without the HTTP client
+
+        Args:
+            state (EndpointState): The endpoint
+
+        Raises:
+            UnreachableError: When no connection could be established
+            UnhealthyError: When the peer did not answer as expected
+
+        Returns:
+            int: The status code
+        """
+        try:
+            result = await probe_socket(
+                socket_target(state.url), self.dns_cache, self.ssl_context
+            )
+        except UnhealthyError:
+            self._record_reachable(state.host)
+            raise
+        self._record_reachable(state.host)
+        if result.cert_expires is not None:
+            self._check_certificate(state.url, result.cert_expires)
+        if not state.options.is_healthy(result.status_code):
+            raise UnhealthyError(
+                result.status_code,
+                f"returned status code {result.status_code}",
+            )
+        return result.status_code
+
+    def _check_certificate(self, endpoint: str, expires: float) -> None:
+        self.cert_expiry[endpoint] = expires
+        days = (expires - time.time()) / 86400
+        if days < self._app_config.cert_expiry_warn_days:
+            expiry = time.strftime("%Y-%m-%d", time.gmtime(expires))
+            msg = f"Certificate of endpoint {endpoint} expires on {expiry}"
+            LOGGER.warning(msg)
+            self._notifier.notify(msg)
+            self.counters["cert_expiring"] += 1
+
+    def _record_reachable(self, host: str) -> None:
+        if self.breakers.record_success(host):
+            LOGGER.info(f"Host {host} is reachable again, resuming its probes")
+
+    def _record_unreachable(self, host: str) -> None:
+        if self.breakers.record_failure(host):
+            msg = (
+                f"Host {host} is down, pausing its probes for "
+                f"{self._app_config.breaker_reset_timeout:g} seconds"
+            )
+            LOGGER.error(msg)
+            self._notifier.notify(msg)
 
     async def check_endpoint_health(
         self,
@@ -71,37 +365,517 @@ class AsyncAppMonitor:
             warn_threshold (float | int): The warning threshold.
 
         """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
         try:
             probe_result = await self.probe_endpoint(endpoint)
-        except httpx.HTTPStatusError as exc:
-            msg = (
-                f"Endpoint {endpoint} returned status "
-                f"code {exc.response.status_code}"
+        except CircuitOpenError as exc:
+            LOGGER.debug(
+                f"Skipping endpoint {endpoint}: circuit open for host {exc}"
             )
+            self.counters["short_circuited"] += 1
+            return
+        except UnhealthyError as exc:
+            msg = f"Endpoint {endpoint} {exc}"
             LOGGER.error(msg)
-            send_slack_notification(msg)
-        except (httpx.ConnectError, httpx.ConnectTimeout) as exc:
+            self._notifier.notify(msg)
+            self.counters["errors"] += 1
+            probe_result = ProbeResult(
+                endpoint=endpoint,
+                status_code=exc.status_code,
+                response_time=loop.time() - started,
+            )
+        except (
+            httpx.ConnectError,
+            httpx.ConnectTimeout,
+            UnreachableError,
+        ) as exc:
             msg = f"Endpoint {endpoint} is unreachable: {exc}"
             LOGGER.error(msg)
-            send_slack_notification(msg)
+            self._notifier.notify(msg)
+            self.counters["unreachable"] += 1
+            probe_result = ProbeResult(
+                endpoint=endpoint,
+                status_code=0,
+                response_time=loop.time() - started,
+            )
+        except (httpx.TimeoutException, httpx.TransportError) as exc:
+            # Connected, but the response did not come, e.g. a stalled server
+            msg = (
+                f"Endpoint {endpoint} did not respond: "
+                f"{exc or type(exc).__name__}"
+            )
+            LOGGER.error(msg)
+            self._notifier.notify(msg)
+            self.counters["errors"] += 1
+            probe_result = ProbeResult(
+                endpoint=endpoint,
+                status_code=0,
+                response_time=loop.time() - started,
+            )
         else:
-            if (
-                probe_result is not None
-                and probe_result.response_time > warn_threshold
-            ):
-                LOGGER.warning(
-                    f"Endpoint {endpoint} took too long to respond: "
-                    f"{probe_result.response_time:.2f} seconds"
+            failure = probe_result and probe_result.failure
+            if failure is not None:
+                msg = f"Endpoint {endpoint} failed its content check: {failure}"
+                LOGGER.error(msg)
+                self._notifier.notify(msg)
+                self.counters["errors"] += 1
+            elif probe_result is not None:
+                slow = self.slow_responses.check(
+                    endpoint, probe_result.response_time, warn_threshold
+                )
+                if slow:
+                    LOGGER.warning(f"Endpoint {endpoint} {slow}")
+                    self.counters["slow"] += 1
+                    probe_result = probe_result._replace(slow=True)
+
+        self.counters["probes"] += 1
+        if probe_result is not None:
+            state = self.endpoints.state(endpoint)
+            state.probes += 1
+            state.last_status = probe_result.status_code
+            for listener in self._result_listeners:
+                listener(probe_result)
+
+    async def check_once(self) -> list[Optional[ProbeResult]]:
+        """Check every endpoint once, concurrently, then close the client
+
+        Returns:
+            list[Optional[ProbeResult]]: The result of every endpoint, in
+                    order, None when its probe was short-circuited
+        """
+        results: dict[str, ProbeResult] = {}
+
+        def collect(result: ProbeResult) -> None:
+            results[result.endpoint] = result
+
+        self.add_result_listener(collect)
+        # Alone, e.g. with --once, the check delivers its own notifications;
+        # without a webhook they are printed inline
+        alone = (
+            self._app_config.notification_webhook is not None
+            and not self._notifier.running
+        )
+        if alone:
+            await self._notifier.start()
+        try:
+            await asyncio.gather(
+                *(
+                    self.check_endpoint_health(
+                        endpoint, self._app_config.warn_threshold
+                    )
+                    for endpoint in self._app_config.endpoints
+                )
+            )
+        finally:
+            self._result_listeners.remove(collect)
+            if self._client is not None:
+                await self._client.aclose()
+                self._client = None
+            if alone:
+                await self._notifier.stop()
+        return [
+            results.get(endpoint) for endpoint in self._app_config.endpoints
+        ]
+
+    def _record_history(self, result: ProbeResult) -> None:
+        self.history.record(
+            result.endpoint,
+            result.status_code,
+            result.response_time,
+            check_failed=result.failure is not None,
+        )
+
+    def _certificate_metrics(self) -> list[MetricFamily]:
+        if not self.cert_expiry:
+            return []
+        name = "app_monitor_cert_expiry_timestamp_seconds"
+        return [
+            MetricFamily(
+                name,
+                "gauge",
+                "UNIX time the certificate of a TLS socket probe expires",
+                [
+                    sample(
+                        name, expires, f'endpoint="{escape_label(endpoint)}"'
+                    )
+                    for endpoint, expires in self.cert_expiry.items()
+                ],
+            )
+        ]
+
+    def _scheduler_metrics(self) -> list[MetricFamily]:
+        lag = self.dispatch_lag
+        name = "app_monitor_dispatch_lag_seconds"
+        dns = self.dns_cache.stats()
+        return [
+            MetricFamily(
+                name,
+                "summary",
+                "How late health checks start after their deadline",
+                [
+                    sample(name, lag.quantile(q), f'quantile="{q}"')
+                    for q in (0.5, 0.9, 0.99)
+                ]
+                + [sample(f"{name}_sum", lag.total)]
+                + [sample(f"{name}_count", lag.count)],
+            ),
+            MetricFamily(
+                "app_monitor_checks_in_flight",
+                "gauge",
+                "Health checks running",
+                [sample("app_monitor_checks_in_flight", len(self._in_flight))],
+            ),
+            MetricFamily(
+                "app_monitor_open_circuits",
+                "gauge",
+                "Hosts whose probes are paused by their circuit breaker",
+                [
+                    sample(
+                        "app_monitor_open_circuits",
+                        len(self.breakers.open_hosts()),
+                    )
+                ],
+            ),
+            MetricFamily(
+                "app_monitor_scheduled_endpoints",
+                "gauge",
+                "Endpoints being monitored",
+                [
+                    sample(
+                        "app_monitor_scheduled_endpoints", len(self._scheduler)
+                    )
+                ],
+            ),
+            MetricFamily(
+                "app_monitor_body_bytes",
+                "counter",
+                "Response body bytes read by the probes",
+                [
+                    sample(
+                        "app_monitor_body_bytes_total",
+                        self.counters["body_bytes"],
+                    )
+                ],
+            ),
+            MetricFamily(
+                "app_monitor_dns_lookups",
+                "counter",
+                "Host name lookups by cache outcome",
+                [
+                    sample(
+                        "app_monitor_dns_lookups_total",
+                        dns[result],
+                        f'result="{result}"',
+                    )
+                    for result in (
+                        "hits",
+                        "negative_hits",
+                        "misses",
+                        "coalesced",
+                    )
+                ],
+            ),
+            MetricFamily(
+                "app_monitor_dns_saved_seconds",
+                "counter",
+                "Resolver time saved by the DNS cache",
+                [
+                    sample(
+                        "app_monitor_dns_saved_seconds_total",
+                        dns["saved_seconds"],
+                    )
+                ],
+            ),
+            MetricFamily(
+                "app_monitor_dns_cache_entries",
+                "gauge",
+                "Host names in the DNS cache",
+                [sample("app_monitor_dns_cache_entries", dns["entries"])],
+            ),
+        ]
+
+    def add_result_listener(self, listener: ResultListener) -> None:
+        """Register a callable invoked with the result of every check
+
+        Args:
+            listener (ResultListener): Called on the event loop with each
+                    ProbeResult, including failed ones
+        """
+        self._result_listeners.append(listener)
+
+    def _dispatch(self, state: EndpointState) -> None:
+        """Start a health check for an endpoint unless one is still running
+
+        Args:
+            state (EndpointState): The endpoint to check
+        """
+        if state.task is not None:
+            LOGGER.debug(
+                f"Skipping endpoint {state.url}: previous probe still running"
+            )
+            return
+        # Named after the endpoint, so that the callback needs no closure
+        task = state.task = asyncio.create_task(
+            self.check_endpoint_health(
+                state.url, self._app_config.warn_threshold
+            ),
+            name=state.url,
+        )
+        self._in_flight.add(task)
+        task.add_done_callback(self._on_check_done)
+
+    def _on_check_done(self, task: asyncio.Task) -> None:
+        """Forget a finished health check and log unexpected failures"""
+        self._in_flight.discard(task)
+        endpoint = task.get_name()
+        if endpoint in self.endpoints:
+            state = self.endpoints[endpoint]
+            if state.task is task:
+                state.task = None
+        if not task.cancelled() and task.exception() is not None:
+            LOGGER.error(
+                f"Health check for endpoint {endpoint} failed: "
+                f"{task.exception()!r}"
+            )
+
+    def apply_config(self, app_config: AppConfig) -> None:
+        """Apply a reloaded configuration in place
+
+        Only the difference is applied: new endpoints are checked at once,
+        removed ones are cancelled and forgotten, and the endpoints kept keep
+        their connections, history and schedule. A new `check_interval`
+        applies from each endpoint's next deadline, `warn_threshold` and
+        `retries` from the next checks. Other settings need a restart and
+        keep their current value.
+
+        Args:
+            app_config (AppConfig): The reloaded configuration
+        """
+        current = self._app_config
+        ignored = [
+            key
+            for key in _RESTART_KEYS
+            if getattr(app_config, key) != getattr(current, key)
+        ]
+        if ignored:
+            LOGGER.warning(
+                f"Restart the monitor to apply the new {', '.join(ignored)}"
+            )
+            app_config = app_config._replace(
+                **{key: getattr(current, key) for key in ignored}
+            )
+
+        added, removed = self.endpoints.update(app_config)
+        self._app_config = app_config
+        for state in removed:
+            self._forget(state)
+
+        if self._supervising:
+            interval = app_config.check_interval
+            if interval != current.check_interval:
+                for endpoint in self.endpoints:
+                    if endpoint in self._scheduler:
+                        self._scheduler.set_interval(endpoint, interval)
+            now = asyncio.get_running_loop().time()
+            for state in added:
+                self._scheduler.add(
+                    state.url, interval, self._first_deadline(state.url, now)
                 )
+            self._wakeup.set()
+        LOGGER.info(
+            f"Configuration reloaded: {len(added)} endpoints added, "
+            f"{len(removed)} removed"
+        )
+
+    def _forget(self, state: EndpointState) -> None:
+        """Stop checking a removed endpoint and drop its state"""
+        endpoint = state.url
+        if endpoint in self._scheduler:
+            self._scheduler.remove(endpoint)
+        if state.task is not None:
+            self._in_flight.discard(state.task)
+            state.task.cancel()
+        self.history.remove_endpoint(endpoint)
+        self.slow_responses.remove_endpoint(endpoint)
+        self.metrics.remove_endpoint(endpoint)
+        self.validators.forget(endpoint)
+        self.cert_expiry.pop(endpoint, None)
+
+    def export_state(self, now: float) -> dict:
+        """Return the state worth keeping across restarts
+
+        Args:
+            now (float): The current monotonic time, which is also the event
+                    loop's time
+        """
+        return {
+            "deadlines": {
+                endpoint: [due - now, interval]
+                for endpoint, due, interval in self._scheduler.deadlines()
+            },
+            "breakers": self.breakers.export_state(now),
+            "slow_responses": self.slow_responses.export_state(now),
+            "notifications": self._notifier.export_state(now),
+            "history": self.history.export_state(),
+        }
+
+    def import_state(self, state: dict, now: float) -> None:
+        """Restore the state exported before a restart
+
+        The state of endpoints and hosts no longer configured is dropped.
+        Deadlines apply once the supervisor starts.
+
+        Args:
+            state (dict): Returned by `export_state`
+            now (float): The monotonic time matching the export's `now`
+        """
+        endpoints = self.endpoints
+        hosts = {state.host for state in endpoints.states()}
+        self.history.import_state(state["history"])
+        for endpoint in list(self.history):
+            if endpoint not in endpoints:
+                self.history.remove_endpoint(endpoint)
+        self.breakers.import_state(
+            {
+                host: breaker
+                for host, breaker in state["breakers"].items()
+                if host in hosts
+            },
+            now,
+        )
+        self.slow_responses.import_state(
+            {
+                endpoint: sketch
+                for endpoint, sketch in state["slow_responses"].items()
+                if endpoint in endpoints
+            },
+            now,
+        )
+        self._notifier.import_state(state["notifications"], now)
+        self._restored_deadlines = {
+            endpoint: now + offset
+            for endpoint, (offset, _) in state["deadlines"].items()
+            if endpoint in endpoints
+        }
+
+    def _first_deadline(self, endpoint: str, start: float) -> float:
+        """Return when to check an endpoint first
+
+        Restored endpoints keep their phase: deadlines missed while the
+        monitor was down are skipped rather than all fired at start. With
+        `spread_checks` the others start at their phase offset.
+        """
+        interval = self._app_config.check_interval
+        due = self._restored_deadlines.pop(endpoint, None)
+        if due is None:
+            if self._app_config.spread_checks:
+                return next_phase(endpoint, interval, start)
+            return start
+        if due < start:
+            due += math.ceil((start - due) / interval) * interval
+        return due
+
+    def _schedule(self, start: float) -> None:
+        """Schedule every endpoint at its first deadline
+
+        Args:
+            start (float): The current time, on the event loop's clock
+        """
+        interval = self._app_config.check_interval
+        for endpoint in self.endpoints:
+            self._scheduler.add(
+                endpoint, interval, self._first_deadline(endpoint, start)
+            )
+        self._restored_deadlines.clear()
+
+    def _dispatch_due(self, now: float) -> None:
+        """Dispatch the health check of every endpoint due by now
+
+        Nothing but the checks' tasks is allocated: the deadlines are
+        re-armed in place and the endpoints' state is looked up.
+
+        Args:
+            now (float): The current time, on the event loop's clock
+        """
+        states = self.endpoints
+        for endpoint, due in self._scheduler.pop_due(now):
+            self.dispatch_lag.add(now - due)
+            self._dispatch(states[endpoint])
+
+    def stop(self) -> None:
+        """Make the supervisor return once the checks in flight finish"""
+        self.RUN = False
+        self._wakeup.set()
 
     async def supervisor(self) -> None:
-        """Sets up asyncio coroutines"""
-        while self.RUN:
-            tasks = [
-                self.check_endpoint_health(
-                    endpoint, self._app_config.warn_threshold
+        """Dispatches each endpoint's health check when it becomes due
+
+        What the supervisor started is stopped when it returns, and also
+        when it is cancelled, e.g. on Ctrl-C.
+        """
+        loop = asyncio.get_running_loop()
+        await self._notifier.start()
+        checkpoint = self.checkpoint
+        checkpointing: Optional[asyncio.Task] = None
+        try:
+            if self._app_config.metrics_port is not None:
+                self._metrics_server = MetricsServer(
+                    self.metrics,
+                    self._app_config.metrics_host,
+                    self._app_config.metrics_port,
                 )
-                for endpoint in self._app_config.endpoints
-            ]
-            await asyncio.gather(*tasks)
-            await asyncio.sleep(self._app_config.check_interval)
+                await self._metrics_server.start()
+            if self.store is not None:
+                self.store.start()
+            if checkpoint is not None:
+                checkpoint.restore(self)
+                checkpointing = asyncio.create_task(checkpoint.run(self))
+            self._schedule(loop.time())
+            self._supervising = True
+            await self._supervise(loop)
+        finally:
+            self._supervising = False
+            if checkpoint is not None and checkpointing is not None:
+                checkpointing.cancel()
+                # Also when cancelled, so written inline
+                checkpoint.save(self)
+            await self._shut_down()
+
+    async def _supervise(self, loop: asyncio.AbstractEventLoop) -> None:
+        while self.RUN:
+            due = self._scheduler.next_due()
+            delay = (
+                self._app_config.check_interval
+                if due is None
+                else due - loop.time()
+            )
+            if delay > 0:
+                # Woken early by a reload or stop()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except TimeoutError:
+                    pass
+            self._wakeup.clear()
+            self._dispatch_due(loop.time())
+
+        # Let the checks already in flight finish before returning
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    async def _shut_down(self) -> None:
+        """Stop the checks still in flight and what the supervisor started"""
+        if self._in_flight:
+            for task in self._in_flight:
+                task.cancel()
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+        try:
+            if self.store is not None:
+                # Joins the writer thread, which at most finishes one batch
+                self.store.close()
+            if self._metrics_server is not None:
+                await self._metrics_server.stop()
+                self._metrics_server = None
+        finally:
+            # Sends what is still queued
+            await self._notifier.stop()
@@ -0,0 +1,151 @@
+"""httpx transport plumbing used by the async monitor."""
+
+import asyncio
+import socket
+from time import perf_counter
+import typing
+from typing import Any, Optional
+
+import httpcore
+import httpx
+
+from app_monitor.dns import DNSCache
+from app_monitor.timing import current_recorder, is_ip_address
+
+
+class TimingNetworkBackend(httpcore.AsyncNetworkBackend):
+    """Network backend resolving host names itself, to time DNS separately
+
+    Each address the name resolves to is tried in turn. The time spent
+    resolving is added to the current PhaseRecorder, if any. Names are
+    resolved through the DNSCache when one is given.
+    """
+
+    def __init__(
+        self,
+        backend: httpcore.AsyncNetworkBackend,
+        dns_cache: Optional[DNSCache] = None,
+    ) -> None:
+        self._backend = backend
+        self._dns_cache = dns_cache
+
+    async def resolve(
+        self, host: str, port: int, timeout: Optional[float]
+    ) -> list[str]:
+        """Resolve a host name into the addresses to connect to
+
+        Args:
+            host (str): The host name
+            port (int): The port
+            timeout (Optional[float]): The resolution timeout, in seconds
+
+        Returns:
+            list[str]: The addresses, in the resolver's order
+        """
+        if self._dns_cache is not None:
+            lookup = self._dns_cache.resolve(host)
+        else:
+            lookup = self._getaddrinfo(host, port)
+        try:
+            return await asyncio.wait_for(lookup, timeout)
+        except TimeoutError as exc:
+            raise httpcore.ConnectTimeout(
+                f"Resolving {host} timed out"
+            ) from exc
+        except OSError as exc:
+            raise httpcore.ConnectError(
+                f"Failed to resolve {host}: {exc}"
+            ) from exc
+
+    @staticmethod
+    async def _getaddrinfo(host: str, port: int) -> list[str]:
+        loop = asyncio.get_running_loop()
+        infos = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        return list(dict.fromkeys(str(info[4][0]) for info in infos))
+
+    async def connect_tcp(
+        self,
+        host: str,
+        port: int,
+        timeout: Optional[float] = None,
+        local_address: Optional[str] = None,
+        socket_options: Optional[typing.Iterable[Any]] = None,
+    ) -> httpcore.AsyncNetworkStream:
+        if is_ip_address(host):
+            addresses = [host]
+        else:
+            started = perf_counter()
+            try:
+                addresses = await self.resolve(host, port, timeout)
+            finally:
+                recorder = current_recorder()
+                if recorder is not None:
+                    recorder.dns += perf_counter() - started
+
+        error: Optional[Exception] = None
+        for address in addresses:
+            try:
+                return await self._backend.connect_tcp(
+                    address,
+                    port,
+                    timeout=timeout,
+                    local_address=local_address,
+                    socket_options=socket_options,
+                )
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as exc:
+                error = exc
+        assert error is not None
+        raise error
+
+    async def connect_unix_socket(
+        self,
+        path: str,
+        timeout: Optional[float] = None,
+        socket_options: Optional[typing.Iterable[Any]] = None,
+    ) -> httpcore.AsyncNetworkStream:  # pragma: no cover
+        return await self._backend.connect_unix_socket(
+            path, timeout=timeout, socket_options=socket_options
+        )
+
+    async def sleep(self, seconds: float) -> None:  # pragma: no cover
+        await self._backend.sleep(seconds)
+
+
+async def trace_phases(event: str, info: dict[str, Any]) -> None:
+    """httpx `trace` extension feeding the current PhaseRecorder
+
+    Args:
+        event (str): The httpcore event name
+        info (dict[str, Any]): The event details, unused
+    """
+    recorder = current_recorder()
+    if recorder is not None:
+        recorder.on_trace_event(event)
+
+
+def build_transport(
+    limits: httpx.Limits,
+    dns_cache: Optional[DNSCache] = None,
+    http2: bool = False,
+) -> httpx.AsyncHTTPTransport:
+    """Build the transport used by the async monitor's client
+
+    Args:
+        limits (httpx.Limits): The connection pool limits
+        dns_cache (Optional[DNSCache]): The cache resolving host names
+        http2 (bool): Offer HTTP/2 to https origins, which then multiplex
+                their requests over a shared connection. Origins that do not
+                negotiate it in the TLS handshake keep using HTTP/1.1. Needs
+                the h2 package
+
+    Returns:
+        httpx.AsyncHTTPTransport: The transport
+    """
+    transport = httpx.AsyncHTTPTransport(limits=limits, http2=http2)
+    # httpx does not expose the network backend of its connection pool, so
+    # wrap the one the pool was built with
+    pool = transport._pool
+    pool._network_backend = TimingNetworkBackend(
+        pool._network_backend, dns_cache
+    )
+    return transport
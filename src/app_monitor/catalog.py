@@ -0,0 +1,268 @@
+"""Endpoint catalogs: streaming load, cached validation and deduplication."""
+
+from collections import defaultdict
+from functools import lru_cache
+import json
+from json.decoder import JSONDecodeError
+from pathlib import Path
+import re
+from typing import Iterable, Iterator, Mapping, Optional
+from urllib.parse import urlsplit
+
+import validators
+
+from app_monitor.logger import LOGGER
+from app_monitor.probing import parse_probe_options
+
+DEFAULT_PORTS = {"http": 80, "https": 443, "tls": 443}
+# tcp:// endpoints have no default port
+SCHEMES = ("http", "https", "tcp", "tls")
+
+# Whitespace and control characters are never valid in a URL
+_INVALID_CHARACTERS = re.compile(r"[\s\x00-\x1f\x7f]")
+# scheme, netloc, path, query; cheaper than urlsplit on every endpoint
+_URL_PARTS = re.compile(
+    r"([A-Za-z][A-Za-z0-9+.-]*)://([^/?#]*)([^?#]*)(\?[^#]*)?"
+)
+
+
+@lru_cache(maxsize=65536)
+def _is_valid_origin(scheme: str, netloc: str) -> bool:
+    scheme = scheme.lower()
+    if scheme not in SCHEMES or not netloc:
+        return False
+    try:
+        port = urlsplit(f"{scheme}://{netloc}").port
+    except ValueError:
+        return False
+    if port is None and scheme not in DEFAULT_PORTS:
+        return False
+    # validators only knows the schemes of web URLs
+    return bool(validators.url(f"http://{netloc}/".lower()))
+
+
+@lru_cache(maxsize=65536)
+def _canonical_origin(scheme: str, netloc: str) -> str:
+    parts = urlsplit(f"{scheme}://{netloc}")
+    scheme = scheme.lower()
+    host = parts.hostname or ""
+    if ":" in host:
+        host = f"[{host}]"
+    port = parts.port
+    if port is not None and port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{port}"
+    if parts.username is not None:
+        userinfo = netloc.rpartition("@")[0]
+        host = f"{userinfo}@{host}"
+    return f"{scheme}://{host}"
+
+
+def is_valid_url(url: object) -> bool:
+    """Check that a value is an http(s), tcp or tls URL
+
+    tcp:// URLs must have a port, tls:// ones default to 443.
+
+    The scheme, host and port are checked with `validators.url` once per
+    origin; the rest of the URL only needs to be free of whitespace and
+    control characters. Catalogs usually have far fewer origins than
+    endpoints, so most URLs skip the expensive check.
+
+    Args:
+        url (object): The value to check
+
+    Returns:
+        bool: Whether it is a valid URL
+    """
+    if not isinstance(url, str) or _INVALID_CHARACTERS.search(url):
+        return False
+    match = _URL_PARTS.match(url)
+    return match is not None and _is_valid_origin(match[1], match[2])
+
+
+def canonical_url(url: str) -> str:
+    """Return the form of a URL used to detect duplicates
+
+    The scheme and host are lowercased, the default port is dropped, an empty
+    path becomes "/" and the fragment, never sent to the server, is removed.
+
+    Args:
+        url (str): A valid URL
+
+    Returns:
+        str: The canonical URL
+    """
+    match = _URL_PARTS.match(url)
+    if match is None:
+        raise ValueError(f"Invalid URL: {url}")
+    scheme, netloc, path, query = match.groups()
+    return f"{_canonical_origin(scheme, netloc)}{path or '/'}{query or ''}"
+
+
+def origin(url: str) -> str:
+    """Return the canonical scheme://host[:port] of a URL
+
+    Args:
+        url (str): A valid URL
+
+    Returns:
+        str: The origin
+    """
+    match = _URL_PARTS.match(url)
+    if match is None:
+        raise ValueError(f"Invalid URL: {url}")
+    return _canonical_origin(match[1], match[2])
+
+
+def iter_endpoints_file(path: Path) -> Iterator[tuple[int, str, dict]]:
+    """Stream the entries of an endpoint catalog file
+
+    Each line holds a URL, a JSON string or a JSON object with a "url" key
+    (NDJSON). The other keys of an object are the endpoint's probe options,
+    "method" and "max_bytes". Blank lines and lines starting with "#" are
+    skipped.
+
+    Args:
+        path (Path): The catalog file
+
+    Raises:
+        ValueError: When a line is not valid JSON or has invalid options
+
+    Yields:
+        tuple[int, str, dict]: The line number, the URL, not validated yet,
+                and the probe options, empty for most entries
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        for number, line in enumerate(file, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            options: dict = {}
+            if line[0] in '{"':
+                try:
+                    entry = json.loads(line)
+                except JSONDecodeError as exc:
+                    raise ValueError(f"{path}:{number}: invalid JSON") from exc
+                if isinstance(entry, dict):
+                    options = entry
+                    entry = options.pop("url", None)
+                if not isinstance(entry, str):
+                    raise ValueError(f"{path}:{number}: expected a URL")
+                if options:
+                    try:
+                        parse_probe_options(options)
+                    except ValueError as exc:
+                        raise ValueError(f"{path}:{number}: {exc}") from exc
+                line = entry
+            yield number, line, options
+
+
+def dedupe_endpoints(endpoints: Iterable[str]) -> list[str]:
+    """Drop endpoints whose canonical URL was already seen
+
+    The first spelling of each endpoint is kept, in its original position.
+
+    Args:
+        endpoints (Iterable[str]): Valid URLs
+
+    Returns:
+        list[str]: The unique endpoints
+    """
+    seen: set[str] = set()
+    unique = []
+    for endpoint in endpoints:
+        key = canonical_url(endpoint)
+        if key not in seen:
+            seen.add(key)
+            unique.append(endpoint)
+    return unique
+
+
+def load_endpoints(
+    path: Path,
+    endpoints: Iterable[str] = (),
+    probes: Optional[dict[str, dict]] = None,
+) -> list[str]:
+    """Load, validate and deduplicate an endpoint catalog in one pass
+
+    Args:
+        path (Path): The catalog file
+        endpoints (Iterable[str]): Already validated endpoints that come
+                first, e.g. from the configuration file
+        probes (Optional[dict[str, dict]]): Filled with the probe options of
+                the entries that have some, keyed by the spelling kept for
+                their endpoint, unless already set for an equivalent URL
+
+    Raises:
+        ValueError: When an entry is not a valid URL, or has other probe
+                options than an equivalent spelling before it
+
+    Returns:
+        list[str]: The unique endpoints
+    """
+    # The spelling kept for each canonical URL, the first one
+    kept: dict[str, str] = {}
+    for url in endpoints:
+        kept.setdefault(canonical_url(url), url)
+    configured = {canonical_url(url) for url in probes or ()}
+    loaded: dict[str, dict] = {}
+    for number, url, options in iter_endpoints_file(path):
+        if not is_valid_url(url):
+            raise ValueError(f"{path}:{number}: Invalid URL: {url}")
+        key = canonical_url(url)
+        endpoint = kept.setdefault(key, url)
+        if not options or probes is None or key in configured:
+            continue
+        if loaded.setdefault(key, options) != options:
+            raise ValueError(
+                f"{path}:{number}: {url} has other probe options than "
+                f"{endpoint}"
+            )
+        probes[endpoint] = options
+
+    unique = list(kept.values())
+    LOGGER.debug(f"Loaded {len(unique)} unique endpoints from {path}")
+    return unique
+
+
+def key_probes_by_endpoint(
+    probes: Mapping[str, dict], endpoints: Iterable[str]
+) -> dict[str, dict]:
+    """Key probe options by the spelling of the endpoint they apply to
+
+    Monitors look options up by endpoint, so options given for an equivalent
+    spelling, e.g. with an uppercase host, would otherwise be ignored.
+
+    Args:
+        probes (Mapping[str, dict]): Probe options by valid URL
+        endpoints (Iterable[str]): The unique endpoints
+
+    Raises:
+        ValueError: When equivalent spellings have different options
+
+    Returns:
+        dict[str, dict]: The probe options by endpoint
+    """
+    spellings = {canonical_url(endpoint): endpoint for endpoint in endpoints}
+    keyed: dict[str, dict] = {}
+    for url, options in probes.items():
+        endpoint = spellings.get(canonical_url(url), url)
+        if keyed.setdefault(endpoint, options) != options:
+            raise ValueError(
+                f"{url} has other probe options than an equivalent URL"
+            )
+    return keyed
+
+
+def group_by_origin(endpoints: Iterable[str]) -> dict[str, list[str]]:
+    """Group endpoints by origin, keeping their order within each group
+
+    Args:
+        endpoints (Iterable[str]): Valid URLs
+
+    Returns:
+        dict[str, list[str]]: The endpoints of each origin
+    """
+    groups: dict[str, list[str]] = defaultdict(list)
+    for endpoint in endpoints:
+        groups[origin(endpoint)].append(endpoint)
+    return dict(groups)
@@ -0,0 +1,163 @@
+"""Saves the monitor's state to a local snapshot and restores it on start."""
+
+import asyncio
+import gzip
+import json
+import os
+from pathlib import Path
+import time
+from typing import Optional, Protocol
+
+from app_monitor.logger import LOGGER
+
+VERSION = 1
+
+
+class Checkpointable(Protocol):
+    def export_state(self, now: float) -> dict: ...
+
+    def import_state(self, state: dict, now: float) -> None: ...
+
+
+def write_snapshot(path: Path, snapshot: dict) -> None:
+    """Write a snapshot atomically
+
+    The snapshot is written to a temporary file next to `path` and renamed
+    over it, so a crash leaves either the previous snapshot or the new one.
+
+    Args:
+        path (Path): The snapshot file
+        snapshot (dict): JSON-serializable data
+    """
+    temporary = path.with_name(f"{path.name}.tmp")
+    data = gzip.compress(
+        json.dumps(snapshot, separators=(",", ":")).encode(), compresslevel=6
+    )
+    with open(temporary, "wb") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+    if hasattr(os, "O_DIRECTORY"):
+        # Make the rename itself durable
+        directory = os.open(path.parent, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+
+
+def read_snapshot(path: Path) -> Optional[dict]:
+    """Read a snapshot
+
+    Args:
+        path (Path): The snapshot file
+
+    Returns:
+        Optional[dict]: The snapshot, None if there is none
+    """
+    try:
+        with gzip.open(path, "rb") as file:
+            snapshot = json.load(file)
+    except FileNotFoundError:
+        return None
+    if not isinstance(snapshot, dict):
+        raise ValueError("Invalid snapshot")
+    return snapshot
+
+
+class Checkpointer:
+    """Checkpoints the state of a monitor
+
+    Times on the monotonic clock, such as deadlines and breaker openings, are
+    saved relative to the time of the snapshot. On restore they are shifted
+    by the wall-clock time elapsed since, so a deadline or a breaker timeout
+    that passed while the monitor was down has passed after the restart too.
+    """
+
+    def __init__(self, path: Path, interval: float = 60.0) -> None:
+        """Set up the checkpointer
+
+        Args:
+            path (Path): The snapshot file
+            interval (float): Seconds between two periodic snapshots
+        """
+        self._path = path
+        self._interval = interval
+        self._saved_at = time.monotonic()
+
+    def _snapshot(self, monitor: Checkpointable) -> dict:
+        self._saved_at = time.monotonic()
+        return {
+            "version": VERSION,
+            "saved_at": time.time(),
+            "state": monitor.export_state(self._saved_at),
+        }
+
+    def due(self) -> bool:
+        """Whether a periodic snapshot is due"""
+        return time.monotonic() - self._saved_at >= self._interval
+
+    def save(self, monitor: Checkpointable) -> None:
+        """Snapshot the state of a monitor
+
+        Args:
+            monitor (Checkpointable): The monitor
+        """
+        started = time.perf_counter()
+        write_snapshot(self._path, self._snapshot(monitor))
+        LOGGER.debug(
+            f"Saved a checkpoint in {time.perf_counter() - started:.3f}s"
+        )
+
+    async def save_async(self, monitor: Checkpointable) -> None:
+        """Snapshot the state of a monitor, writing from a worker thread
+
+        The state is exported on the event loop, compressed and written from
+        a thread, so the loop does not wait on the disk.
+
+        Args:
+            monitor (Checkpointable): The monitor
+        """
+        await asyncio.to_thread(
+            write_snapshot, self._path, self._snapshot(monitor)
+        )
+
+    async def run(self, monitor: Checkpointable) -> None:
+        """Snapshot a monitor every interval until cancelled"""
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                await self.save_async(monitor)
+            except OSError as exc:
+                LOGGER.error(f"Failed to save a checkpoint: {exc}")
+
+    def restore(self, monitor: Checkpointable) -> bool:
+        """Restore the state of a monitor from the last snapshot
+
+        A missing snapshot is ignored, and an unreadable one is logged and
+        ignored: the monitor starts from scratch.
+
+        Args:
+            monitor (Checkpointable): The monitor
+
+        Returns:
+            bool: Whether a snapshot was restored
+        """
+        try:
+            snapshot = read_snapshot(self._path)
+            if snapshot is None:
+                return False
+            if snapshot.get("version") != VERSION:
+                raise ValueError(f"Unknown version {snapshot.get('version')}")
+            elapsed = max(0.0, time.time() - snapshot["saved_at"])
+            # The monotonic time the snapshot was taken at, were the monitor
+            # still running
+            monitor.import_state(snapshot["state"], time.monotonic() - elapsed)
+        except (OSError, EOFError, ValueError, KeyError, TypeError) as exc:
+            LOGGER.warning(f"Ignoring the checkpoint {self._path}: {exc!r}")
+            return False
+        LOGGER.info(
+            f"Restored the checkpoint {self._path} saved {elapsed:.0f}s ago"
+        )
+        return True
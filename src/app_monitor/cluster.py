@@ -0,0 +1,581 @@
+"""Spreads the endpoints over worker hosts run by a coordinator."""
+
+import asyncio
+from bisect import bisect
+from collections import Counter, deque
+import hashlib
+import json
+import os
+from pathlib import Path
+import socket
+from typing import Any, Optional
+
+from app_monitor.app_config import AppConfig
+from app_monitor.async_monitor import AsyncAppMonitor
+from app_monitor.logger import LOGGER
+from app_monitor.metrics import (
+    MetricFamily,
+    MetricsRegistry,
+    MetricsServer,
+    sample,
+)
+from app_monitor.quantiles import LatencySketch
+from app_monitor.results import ProbeResult, ResultListener
+from app_monitor.store import ResultStore
+
+# Longest message line, an assignment can list a whole catalog
+MAX_MESSAGE = 64 * 1024 * 1024
+# Results a disconnected worker keeps until the coordinator is back
+MAX_PENDING_RESULTS = 100000
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(key.encode(), digest_size=8).digest(), "big"
+    )
+
+
+class HashRing:
+    """Consistent hashing of endpoints onto nodes
+
+    Every node is placed at `replicas` points of the ring and an endpoint
+    belongs to the node of the first point after its own hash. Adding or
+    removing a node only moves the endpoints of the points it gains or loses,
+    about 1/n of them.
+    """
+
+    def __init__(self, replicas: int = 128) -> None:
+        """Set up an empty ring
+
+        Args:
+            replicas (int): Points of each node, more balance the load better
+        """
+        self._replicas = replicas
+        self._points: list[int] = []
+        self._owners: list[str] = []
+        self._nodes: set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def __contains__(self, node: str) -> bool:
+        return node in self._nodes
+
+    def add(self, node: str) -> None:
+        """Place a node on the ring, if not already there"""
+        if node in self._nodes:
+            return
+        self._nodes.add(node)
+        for replica in range(self._replicas):
+            point = _hash(f"{node}#{replica}")
+            index = bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove(self, node: str) -> None:
+        """Take a node off the ring, if there"""
+        if node not in self._nodes:
+            return
+        self._nodes.remove(node)
+        kept = [
+            (point, owner)
+            for point, owner in zip(self._points, self._owners)
+            if owner != node
+        ]
+        self._points = [point for point, _ in kept]
+        self._owners = [owner for _, owner in kept]
+
+    def node_for(self, key: str) -> Optional[str]:
+        """Return the node a key belongs to, None on an empty ring"""
+        if not self._points:
+            return None
+        index = bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[index]
+
+    def assign(self, keys: list[str]) -> dict[str, list[str]]:
+        """Group keys by node
+
+        Args:
+            keys (list[str]): The keys, endpoints here
+
+        Returns:
+            dict[str, list[str]]: The keys of every node, in their order.
+                    Nodes without keys are left out.
+        """
+        assignment: dict[str, list[str]] = {}
+        for key in keys:
+            node = self.node_for(key)
+            if node is not None:
+                assignment.setdefault(node, []).append(key)
+        return assignment
+
+
+def _encode(message: dict[str, Any]) -> bytes:
+    return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+
+async def _read(reader: asyncio.StreamReader) -> Optional[dict[str, Any]]:
+    """Read one message, None once the peer closed the connection"""
+    line = await reader.readline()
+    if not line:
+        return None
+    message = json.loads(line)
+    if not isinstance(message, dict):
+        raise ValueError(f"Invalid message: {line[:100]!r}")
+    return message
+
+
+def parse_address(address: str) -> tuple[str, int]:
+    """Split a HOST:PORT address
+
+    The protocol has no authentication, so an address without a host, e.g.
+    ":7070", is the loopback interface, as for `metrics_host`. Binding wider
+    takes an explicit host such as "0.0.0.0".
+
+    Args:
+        address (str): e.g. "127.0.0.1:7070" or "[::1]:7070"
+
+    Returns:
+        tuple[str, int]: The host and port
+    """
+    host, separator, port = address.rpartition(":")
+    if not separator or not port.isdigit():
+        raise ValueError(f"Invalid address {address}, expected HOST:PORT")
+    return host.strip("[]") or "127.0.0.1", int(port)
+
+
+class _Peer:
+    """A registered worker and its connection"""
+
+    def __init__(
+        self, worker_id: str, writer: asyncio.StreamWriter, now: float
+    ) -> None:
+        self.worker_id = worker_id
+        self.writer = writer
+        self.last_seen = now
+        self.endpoints: list[str] = []
+
+
+class Coordinator:
+    """Assigns the catalog to the workers connected and merges their results
+
+    Workers connect over TCP and exchange JSON messages, one per line:
+
+    - worker: `{"type": "register", "worker": id}` first, then
+      `{"type": "report", "results": [[endpoint, status, time, failure],
+      ...],
+      "counters": {...}}` at least every report interval
+    - coordinator: `{"type": "assign", "endpoints": [...]}` with every
+      endpoint of the worker, whenever they change
+
+    A worker that closes its connection, or sends nothing for
+    `cluster_heartbeat_timeout` seconds, is dropped and its endpoints are
+    spread over the others.
+    """
+
+    RUN = True
+
+    def __init__(
+        self, app_config: AppConfig, host: str = "127.0.0.1", port: int = 0
+    ) -> None:
+        """Set up the coordinator
+
+        Args:
+            app_config (AppConfig): The configuration, its endpoints are the
+                    catalog assigned to the workers
+            host (str): The address to listen on
+            port (int): The port to listen on, 0 for any free one
+        """
+        self._app_config = app_config
+        self._host = host
+        self._port = port
+        self._ring = HashRing()
+        self._peers: dict[str, _Peer] = {}
+        self._catalog = set(app_config.endpoints)
+        self._server: Optional[asyncio.Server] = None
+        self._stopping = asyncio.Event()
+        self._result_listeners: list[ResultListener] = []
+        self.counters: Counter[str] = Counter()
+        self.results: dict[str, ProbeResult] = {}
+        self.latency = LatencySketch()
+        self.metrics = MetricsRegistry()
+        self.metrics.add_collector(self._cluster_metrics)
+        self.add_result_listener(self.metrics.observe)
+        self._metrics_server: Optional[MetricsServer] = None
+        self.store: Optional[ResultStore] = None
+        if app_config.store_path is not None:
+            self.store = ResultStore(
+                Path(app_config.store_path),
+                segment_seconds=app_config.store_segment_seconds,
+                retention=app_config.store_retention,
+            )
+            self.add_result_listener(self.store.append)
+
+    @property
+    def address(self) -> tuple[str, int]:
+        """The host and port listened on, once started"""
+        if self._server is None:
+            return self._host, self._port
+        return self._server.sockets[0].getsockname()[:2]
+
+    def assignments(self) -> dict[str, list[str]]:
+        """Return the endpoints assigned to every worker"""
+        return {
+            worker_id: list(peer.endpoints)
+            for worker_id, peer in self._peers.items()
+        }
+
+    def add_result_listener(self, listener: ResultListener) -> None:
+        """Register a callable invoked with every result a worker reports
+
+        Args:
+            listener (ResultListener): Called on the event loop with each
+                    ProbeResult
+        """
+        self._result_listeners.append(listener)
+
+    async def start(self) -> None:
+        """Start accepting workers"""
+        self._server = await asyncio.start_server(
+            self._handle, self._host, self._port, limit=MAX_MESSAGE
+        )
+        if self._app_config.metrics_port is not None:
+            self._metrics_server = MetricsServer(
+                self.metrics,
+                self._app_config.metrics_host,
+                self._app_config.metrics_port,
+            )
+            await self._metrics_server.start()
+        if self.store is not None:
+            self.store.start()
+        LOGGER.info("Coordinator listening on {}:{}".format(*self.address))
+
+    async def close(self) -> None:
+        """Disconnect the workers and stop listening"""
+        if self._server is not None:
+            self._server.close()
+        for peer in list(self._peers.values()):
+            peer.writer.close()
+        self._peers.clear()
+        if self._server is not None:
+            await self._server.wait_closed()
+            self._server = None
+        if self._metrics_server is not None:
+            await self._metrics_server.stop()
+            self._metrics_server = None
+        if self.store is not None:
+            self.store.close()
+
+    def stop(self) -> None:
+        """Make `run` return"""
+        self.RUN = False
+        self._stopping.set()
+
+    async def run(self) -> None:
+        """Serve the workers and drop the silent ones until stopped"""
+        await self.start()
+        timeout = self._app_config.cluster_heartbeat_timeout
+        loop = asyncio.get_running_loop()
+        reported = 0
+        try:
+            while self.RUN:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout / 4)
+                except TimeoutError:
+                    pass
+                now = loop.time()
+                for peer in list(self._peers.values()):
+                    if now - peer.last_seen > timeout:
+                        LOGGER.error(
+                            f"Worker {peer.worker_id} missed its heartbeats "
+                            f"for {now - peer.last_seen:.1f}s, reassigning "
+                            f"its endpoints"
+                        )
+                        self._unregister(peer)
+                if self.counters["probes"] != reported:
+                    reported = self.counters["probes"]
+                    LOGGER.info(
+                        f"Probed {self.counters['probes']} endpoints "
+                        f"({self.counters['errors']} errors, "
+                        f"{self.counters['unreachable']} unreachable) across "
+                        f"{len(self._peers)} workers"
+                    )
+        finally:
+            await self.close()
+
+    def apply_config(self, app_config: AppConfig) -> None:
+        """Apply a reloaded catalog
+
+        Only the endpoints added or removed move, the workers keep the rest.
+        Other settings are the workers' own.
+
+        Args:
+            app_config (AppConfig): The reloaded configuration
+        """
+        self._app_config = app_config
+        removed = self._catalog.difference(app_config.endpoints)
+        self._catalog = set(app_config.endpoints)
+        for endpoint in removed:
+            self.results.pop(endpoint, None)
+            self.metrics.remove_endpoint(endpoint)
+        self._rebalance()
+
+    def _register(self, worker_id: str, writer: asyncio.StreamWriter) -> _Peer:
+        previous = self._peers.get(worker_id)
+        if previous is not None:
+            # The worker reconnected before its old connection timed out
+            previous.writer.close()
+        peer = _Peer(worker_id, writer, asyncio.get_running_loop().time())
+        self._peers[worker_id] = peer
+        self._ring.add(worker_id)
+        self.counters["joins"] += 1
+        LOGGER.info(f"Worker {worker_id} joined")
+        self._rebalance()
+        return peer
+
+    def _unregister(self, peer: _Peer) -> None:
+        if self._peers.get(peer.worker_id) is not peer:
+            return
+        del self._peers[peer.worker_id]
+        self._ring.remove(peer.worker_id)
+        peer.writer.close()
+        self.counters["leaves"] += 1
+        LOGGER.warning(f"Worker {peer.worker_id} left")
+        self._rebalance()
+
+    def _rebalance(self) -> None:
+        """Send every worker whose endpoints changed its new endpoints"""
+        endpoints = self._app_config.endpoints
+        assignment = self._ring.assign(endpoints)
+        for worker_id, peer in self._peers.items():
+            assigned = assignment.get(worker_id, [])
+            if assigned == peer.endpoints:
+                continue
+            self.counters["reassigned"] += len(
+                set(assigned).difference(peer.endpoints)
+            )
+            peer.endpoints = assigned
+            peer.writer.write(
+                _encode({"type": "assign", "endpoints": assigned})
+            )
+        if endpoints and not self._peers:
+            LOGGER.warning(
+                f"No worker connected, {len(endpoints)} endpoints unchecked"
+            )
+
+    def _receive(self, peer: _Peer, message: dict[str, Any]) -> None:
+        """Merge a worker report"""
+        self.counters.update(
+            {
+                key: value
+                for key, value in message.get("counters", {}).items()
+                if isinstance(value, int)
+            }
+        )
+        for endpoint, status_code, response_time, failure in message.get(
+            "results", []
+        ):
+            if endpoint not in self._catalog:
+                # Checked before the endpoint was removed
+                continue
+            result = ProbeResult(
+                endpoint, status_code, response_time, failure=failure
+            )
+            self.results[endpoint] = result
+            if not result.is_error:
+                self.latency.add(response_time)
+            for listener in self._result_listeners:
+                listener(result)
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Serve one worker connection"""
+        peer: Optional[_Peer] = None
+        address = writer.get_extra_info("peername")
+        try:
+            message = await asyncio.wait_for(
+                _read(reader), self._app_config.cluster_heartbeat_timeout
+            )
+            if message is None or message.get("type") != "register":
+                raise ValueError("Expected a register message")
+            peer = self._register(str(message["worker"]), writer)
+            while True:
+                message = await _read(reader)
+                if message is None:
+                    break
+                peer.last_seen = asyncio.get_running_loop().time()
+                if message.get("type") == "report":
+                    self._receive(peer, message)
+        except (OSError, TimeoutError, ValueError, KeyError, TypeError) as exc:
+            LOGGER.warning(f"Dropping worker connection {address}: {exc!r}")
+        finally:
+            if peer is not None:
+                self._unregister(peer)
+            writer.close()
+
+    def _cluster_metrics(self) -> list[MetricFamily]:
+        """Metrics collector of the workers and their assignments"""
+        return [
+            MetricFamily(
+                "app_monitor_cluster_workers",
+                "gauge",
+                "Workers connected to the coordinator",
+                [sample("app_monitor_cluster_workers", len(self._peers))],
+            ),
+            MetricFamily(
+                "app_monitor_cluster_reassigned_endpoints",
+                "counter",
+                "Endpoints moved to another worker",
+                [
+                    sample(
+                        "app_monitor_cluster_reassigned_endpoints_total",
+                        self.counters["reassigned"],
+                    )
+                ],
+            ),
+        ]
+
+
+class ClusterWorker:
+    """Checks the endpoints a coordinator assigns and reports the results
+
+    The worker keeps checking its endpoints while the coordinator is away,
+    keeps their results, and reconnects.
+    """
+
+    def __init__(
+        self,
+        app_config: AppConfig,
+        host: str,
+        port: int,
+        worker_id: Optional[str] = None,
+    ) -> None:
+        """Set up the worker
+
+        Args:
+            app_config (AppConfig): The configuration of the checks. Its
+                    endpoints are ignored, the coordinator stores the
+                    results and serves their metrics, and assignments
+                    change too often to be checkpointed.
+            host (str): The coordinator host
+            port (int): The coordinator port
+            worker_id (Optional[str]): A name unique in the cluster, by
+                    default the host name and process ID
+        """
+        self._app_config = app_config._replace(
+            endpoints=[],
+            store_path=None,
+            metrics_port=None,
+            checkpoint_path=None,
+        )
+        self._host = host
+        self._port = port
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.monitor = AsyncAppMonitor(self._app_config)
+        self._pending: deque[list] = deque(maxlen=MAX_PENDING_RESULTS)
+        self.monitor.add_result_listener(self._collect)
+        self._reported: Counter[str] = Counter()
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self.connected = asyncio.Event()
+
+    def _collect(self, result: ProbeResult) -> None:
+        self._pending.append(
+            [
+                result.endpoint,
+                result.status_code,
+                result.response_time,
+                result.failure,
+            ]
+        )
+
+    def _apply(self, endpoints: list[str]) -> None:
+        self._app_config = self._app_config._replace(endpoints=endpoints)
+        self.monitor.apply_config(self._app_config)
+
+    async def _report(self, writer: asyncio.StreamWriter) -> None:
+        """Send the results and counters collected since the last report"""
+        interval = self._app_config.cluster_report_interval
+        while True:
+            counters = self.monitor.counters.copy()
+            results = list(self._pending)
+            writer.write(
+                _encode(
+                    {
+                        "type": "report",
+                        "results": results,
+                        "counters": dict(counters - self._reported),
+                    }
+                )
+            )
+            await writer.drain()
+            # Only forget what the coordinator was sent
+            for _ in results:
+                self._pending.popleft()
+            self._reported = counters
+            await asyncio.sleep(interval)
+
+    async def _session(self) -> None:
+        """Register with the coordinator and serve it until disconnected"""
+        reader, writer = await asyncio.open_connection(
+            self._host, self._port, limit=MAX_MESSAGE
+        )
+        self._writer = writer
+        reporter: Optional[asyncio.Task] = None
+        read: Optional[asyncio.Future] = None
+        try:
+            writer.write(
+                _encode({"type": "register", "worker": self.worker_id})
+            )
+            reporter = asyncio.create_task(self._report(writer))
+            self.connected.set()
+            LOGGER.info(
+                f"Worker {self.worker_id} connected to "
+                f"{self._host}:{self._port}"
+            )
+            while True:
+                read = asyncio.ensure_future(_read(reader))
+                done, _ = await asyncio.wait(
+                    (read, reporter), return_when=asyncio.FIRST_COMPLETED
+                )
+                if reporter in done:
+                    read.cancel()
+                    reporter.result()
+                message = read.result()
+                if message is None:
+                    break
+                if message.get("type") == "assign":
+                    self._apply(list(message["endpoints"]))
+        finally:
+            self.connected.clear()
+            self._writer = None
+            for task in (read, reporter):
+                if task is not None:
+                    task.cancel()
+            writer.close()
+
+    async def _connect_forever(self) -> None:
+        delay = self._app_config.cluster_report_interval
+        while True:
+            try:
+                await self._session()
+                LOGGER.warning("The coordinator closed the connection")
+            except (OSError, ValueError, KeyError, TypeError) as exc:
+                LOGGER.warning(
+                    f"Lost the coordinator {self._host}:{self._port}: {exc!r}"
+                )
+            await asyncio.sleep(delay)
+
+    def stop(self) -> None:
+        """Make `run` return once the checks in flight finish"""
+        self.monitor.stop()
+
+    async def run(self) -> None:
+        """Check the assigned endpoints until stopped"""
+        connection = asyncio.create_task(self._connect_forever())
+        try:
+            await self.monitor.supervisor()
+        finally:
+            connection.cancel()
+            if self._writer is not None:
+                self._writer.close()
@@ -0,0 +1,169 @@
+"""Limits on the number of probes in flight, globally and per host."""
+
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+
+class AdaptiveLimit:
+    """AIMD concurrency limit driven by observed latency and error rate
+
+    Samples are aggregated over windows. When a window's mean latency rises
+    well above the best mean seen so far, or its error rate is too high, the
+    limit shrinks multiplicatively. When a healthy window kept every slot
+    busy, the limit grows additively. Queueing in front of the limit is not
+    part of the samples, so the limit only reacts to time spent on the wire.
+    """
+
+    def __init__(
+        self,
+        max_limit: int,
+        min_limit: int = 1,
+        initial_limit: Optional[int] = None,
+        latency_tolerance: float = 2.0,
+        max_error_rate: float = 0.1,
+        backoff_ratio: float = 0.75,
+        baseline_drift: float = 0.05,
+    ) -> None:
+        self.max_limit = max_limit
+        self.min_limit = min(min_limit, max_limit)
+        self.limit = min(initial_limit or max(min_limit, 10), max_limit)
+        self._latency_tolerance = latency_tolerance
+        self._max_error_rate = max_error_rate
+        self._backoff_ratio = backoff_ratio
+        self._baseline_drift = baseline_drift
+        self._baseline: Optional[float] = None
+        self._reset_window()
+
+    def _reset_window(self) -> None:
+        self._samples = 0
+        self._errors = 0
+        self._latency_sum = 0.0
+        self._saturated = False
+
+    def record(self, latency: float, failed: bool, in_flight: int) -> None:
+        """Record a finished probe
+
+        Args:
+            latency (float): Time spent on the request, in seconds
+            failed (bool): Whether the request failed
+            in_flight (int): Probes in flight when the request was started
+        """
+        self._samples += 1
+        self._errors += failed
+        self._latency_sum += latency
+        self._saturated |= in_flight >= self.limit
+        if self._samples >= max(self.limit, 10):
+            self._update()
+
+    def _update(self) -> None:
+        mean = self._latency_sum / self._samples
+        error_rate = self._errors / self._samples
+        if self._baseline is None:
+            self._baseline = mean
+        else:
+            # Let the baseline creep up so that a lasting change in network
+            # conditions does not pin the limit to its minimum forever
+            self._baseline = min(
+                mean, self._baseline * (1 + self._baseline_drift)
+            )
+
+        if (
+            error_rate > self._max_error_rate
+            or mean > self._baseline * self._latency_tolerance
+        ):
+            self.limit = max(
+                self.min_limit, int(self.limit * self._backoff_ratio)
+            )
+        elif self._saturated:
+            self.limit = min(
+                self.max_limit, self.limit + max(1, self.limit // 10)
+            )
+        self._reset_window()
+
+
+class ProbeLimiter:
+    """Caps the probes in flight globally and per host"""
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_per_host: int,
+        adaptive: bool = False,
+    ) -> None:
+        self._max_concurrency = max_concurrency
+        self._max_per_host = max_per_host
+        self._adaptive = AdaptiveLimit(max_concurrency) if adaptive else None
+        self._hosts: dict[str, asyncio.Semaphore] = {}
+        self._waiters: deque[asyncio.Future] = deque()
+        self._in_flight = 0
+
+    @property
+    def limit(self) -> int:
+        """The current global limit"""
+        if self._adaptive is not None:
+            return self._adaptive.limit
+        return self._max_concurrency
+
+    @property
+    def in_flight(self) -> int:
+        """The number of probes currently holding a slot"""
+        return self._in_flight
+
+    @asynccontextmanager
+    async def slot(self, host: str) -> AsyncIterator[None]:
+        """Hold a global and a per-host slot for the duration of a request
+
+        The per-host slot is taken first so that probes queued on a busy host
+        do not hold global slots other hosts could use. An exception raised
+        inside the block counts as a failed request for the adaptive limit.
+
+        Args:
+            host (str): The host the request is sent to
+        """
+        semaphore = self._hosts.get(host)
+        if semaphore is None:
+            semaphore = self._hosts[host] = asyncio.Semaphore(
+                self._max_per_host
+            )
+
+        async with semaphore:
+            await self._acquire()
+            in_flight = self._in_flight
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            failed = True
+            try:
+                yield
+                failed = False
+            finally:
+                self._in_flight -= 1
+                if self._adaptive is not None:
+                    self._adaptive.record(
+                        loop.time() - started, failed, in_flight
+                    )
+                self._wake_waiters()
+
+    async def _acquire(self) -> None:
+        """Wait until a global slot is free and take it"""
+        while self._in_flight >= self.limit:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # Hand the wake-up we were given to someone else
+                    self._wake_waiters()
+                raise
+        self._in_flight += 1
+
+    def _wake_waiters(self) -> None:
+        """Wake as many waiters as there are free global slots"""
+        free = self.limit - self._in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
@@ -0,0 +1,351 @@
+"""Content assertions evaluated incrementally over response body chunks."""
+
+import json
+import re
+from typing import Mapping, NamedTuple, Optional
+
+DEFAULT_MAX_BYTES = 65536
+
+# Bytes kept from the previous chunks, so that a pattern matching across a
+# chunk boundary is found
+REGEX_WINDOW = 4096
+
+ASSERTION_KEYS = ("contains", "matches", "json", "content_max_bytes")
+
+_SCALARS = (str, int, float, bool, type(None))
+
+# One JSON token after optional whitespace: punctuation, a complete string,
+# or a number or literal
+_JSON_TOKEN = re.compile(
+    rb'[ \t\r\n]*(?:([{}\[\]:,])|("(?:[^"\\]|\\.)*")|([^ \t\r\n{}\[\]:,"]+))',
+    re.DOTALL,
+)
+_WHITESPACE = re.compile(rb"[ \t\r\n]*")
+# What matters to skip a container: strings, which may hold brackets, with
+# their closing quote when complete, and brackets
+_SKIPPED_TOKEN = re.compile(rb'"(?:[^"\\]|\\.)*(")?|([{}\[\]])', re.DOTALL)
+
+
+class ContentAssertions(NamedTuple):
+    """NamedTuple for what the body of an endpoint must hold
+
+    Every assertion must pass: each substring must appear, each pattern must
+    be found and each JSON field, a dotted path such as "checks.db.status",
+    must equal its value. At most `max_bytes` bytes of body are read.
+    """
+
+    contains: tuple[bytes, ...] = ()
+    patterns: tuple[re.Pattern[bytes], ...] = ()
+    json_fields: tuple[tuple[tuple[str, ...], object], ...] = ()
+    max_bytes: int = DEFAULT_MAX_BYTES
+
+
+def parse_assertions(raw: Mapping) -> Optional[ContentAssertions]:
+    """Build the content assertions of an endpoint from its probe options
+
+    Args:
+        raw (Mapping): The probe options; "contains" and "matches" take a
+                string or a list of them, "json" maps dotted paths to the
+                expected values and "content_max_bytes" caps the body read
+
+    Raises:
+        ValueError: When a value is invalid
+
+    Returns:
+        Optional[ContentAssertions]: The assertions, None when there are none
+    """
+
+    def strings(key: str) -> list[str]:
+        values = raw.get(key, [])
+        if isinstance(values, str):
+            values = [values]
+        if not isinstance(values, list) or not all(
+            isinstance(value, str) and value for value in values
+        ):
+            raise ValueError(f"'{key}' must be a string or a list of them")
+        return values
+
+    contains = tuple(value.encode() for value in strings("contains"))
+    patterns = []
+    for pattern in strings("matches"):
+        try:
+            patterns.append(re.compile(pattern.encode()))
+        except re.error as exc:
+            raise ValueError(f"invalid pattern {pattern!r}: {exc}") from exc
+    fields = raw.get("json", {})
+    if not isinstance(fields, dict) or not all(
+        path and isinstance(value, _SCALARS) for path, value in fields.items()
+    ):
+        raise ValueError("'json' must map field paths to JSON scalars")
+    max_bytes = raw.get("content_max_bytes", DEFAULT_MAX_BYTES)
+    if not isinstance(max_bytes, int) or isinstance(max_bytes, bool):
+        raise ValueError("'content_max_bytes' must be a positive integer")
+    if max_bytes <= 0:
+        raise ValueError("'content_max_bytes' must be a positive integer")
+    if not (contains or patterns or fields):
+        return None
+    return ContentAssertions(
+        contains=contains,
+        patterns=tuple(patterns),
+        json_fields=tuple(
+            (tuple(path.split(".")), value) for path, value in fields.items()
+        ),
+        max_bytes=max_bytes,
+    )
+
+
+def _same(value: object, expected: object) -> bool:
+    # True == 1 in Python, not in JSON
+    return value == expected and isinstance(value, bool) == isinstance(
+        expected, bool
+    )
+
+
+class _JSONFields:
+    """Incremental scanner checking fields of a JSON document
+
+    Tokens are matched with a regular expression, but only in the containers
+    on the fields' paths: any other object or array is skipped by counting
+    brackets outside strings, and values are only decoded at the fields. The
+    scan is decided as soon as every field was seen or one differs.
+    """
+
+    def __init__(self, fields: tuple[tuple[tuple[str, ...], object], ...]):
+        self._expected = dict(fields)
+        # The paths of the containers holding a field
+        self._prefixes = {
+            path[:depth]
+            for path in self._expected
+            for depth in range(len(path))
+        }
+        self._buffer = b""
+        # Per open container: whether it is an object, the key or index of
+        # the current value, whether an object expects a key, and its path
+        self._stack: list[list] = []
+        # Open brackets of the container being skipped
+        self._skipping = 0
+        self._started = False
+        self.failure: Optional[str] = None
+
+    @property
+    def decided(self) -> bool:
+        return self.failure is not None or not self._expected
+
+    def _path(self) -> tuple[str, ...]:
+        """Return the path of the current value"""
+        if not self._stack:
+            return ()
+        frame = self._stack[-1]
+        return frame[3] + (str(frame[1]),)
+
+    def _scalar(self, token: bytes) -> None:
+        path = self._path()
+        if path not in self._expected:
+            return
+        expected = self._expected.pop(path)
+        try:
+            value = json.loads(token)
+        except ValueError:
+            self.failure = "is not valid JSON"
+            return
+        if not _same(value, expected):
+            self.failure = (
+                f"has {'.'.join(path)}={json.dumps(value)}, expected "
+                f"{json.dumps(expected)}"
+            )
+
+    def _open(self, is_object: bool) -> None:
+        path = self._path()
+        if path in self._expected:
+            self.failure = f"has an object or array at {'.'.join(path)}"
+        elif path in self._prefixes:
+            self._stack.append([is_object, 0, is_object, path])
+        else:
+            self._skipping = 1
+
+    def _close(self) -> None:
+        path = self._stack.pop()[3]
+        # Fields inside the closed container are missing
+        for expected in self._expected:
+            if expected[: len(path)] == path:
+                self.failure = f"has no field {'.'.join(expected)}"
+                return
+
+    def _skip(self, buffer: bytes, position: int) -> int:
+        """Skip through the container being skipped
+
+        Returns:
+            int: Where the scan resumes: after the container, or where the
+                    buffer must be kept from when it does not end in it
+        """
+        depth = self._skipping
+        for match in _SKIPPED_TOKEN.finditer(buffer, position):
+            bracket = match[2]
+            if bracket is None:
+                if match[1] is None:
+                    # A string continuing in the next chunk
+                    self._skipping = depth
+                    return match.start()
+            elif bracket in b"{[":
+                depth += 1
+            else:
+                depth -= 1
+                if not depth:
+                    self._skipping = 0
+                    return match.end()
+        self._skipping = depth
+        return len(buffer)
+
+    def missing(self) -> str:
+        """Return the path of a field not seen yet"""
+        return ".".join(next(iter(self._expected)))
+
+    def feed(self, data: bytes, final: bool = False) -> None:
+        """Scan more of the document
+
+        Args:
+            data (bytes): The next bytes
+            final (bool): Whether the document ends after them
+        """
+        buffer = self._buffer + data
+        position = 0
+        while not self.decided:
+            if self._skipping:
+                position = self._skip(buffer, position)
+                if self._skipping:
+                    break
+                continue
+            match = _JSON_TOKEN.match(buffer, position)
+            if match is None or (match[3] and match.end() == len(buffer)):
+                # Incomplete, unless the document ends here
+                if match is None or not final:
+                    break
+            if self._started and not self._stack:
+                self.failure = "has data after the JSON document"
+                break
+            position = match.end()
+            punctuation, string, literal = match.groups()
+            stack = self._stack
+            if punctuation in (b"{", b"["):
+                self._open(punctuation == b"{")
+                self._started = True
+            elif punctuation in (b"}", b"]"):
+                if not stack or stack[-1][0] != (punctuation == b"}"):
+                    self.failure = "is not valid JSON"
+                else:
+                    self._close()
+            elif punctuation == b",":
+                if stack and stack[-1][0]:
+                    stack[-1][2] = True
+                elif stack:
+                    stack[-1][1] += 1
+            elif punctuation == b":":
+                pass
+            elif string is not None and stack and stack[-1][2]:
+                stack[-1][1] = json.loads(string)
+                stack[-1][2] = False
+            else:
+                self._scalar(string or literal)
+                self._started = True
+        self._buffer = buffer[position:]
+        if final and not self.decided:
+            if (
+                self._stack
+                or self._skipping
+                or _WHITESPACE.fullmatch(self._buffer) is None
+            ):
+                self.failure = "is not valid JSON"
+            else:
+                self.failure = f"has no field {self.missing()}"
+
+
+class ContentCheck:
+    """Evaluates the assertions of one probe over the body chunks
+
+    Feed the chunks as they arrive until `feed` returns True, then call
+    `finish` if the body ended first. `failure` tells why the body failed,
+    and is None when it passed.
+    """
+
+    def __init__(self, assertions: ContentAssertions) -> None:
+        self._assertions = assertions
+        self._contains = list(assertions.contains)
+        self._patterns = list(assertions.patterns)
+        self._json = (
+            _JSONFields(assertions.json_fields)
+            if assertions.json_fields
+            else None
+        )
+        self._tail = b""
+        self._tail_size = max(
+            [REGEX_WINDOW if self._patterns else 0]
+            + [len(needle) - 1 for needle in self._contains]
+        )
+        self.read = 0
+        self.failure: Optional[str] = None
+        self._finished = False
+
+    @property
+    def decided(self) -> bool:
+        return self._finished or (
+            not self._contains
+            and not self._patterns
+            and (self._json is None or self._json.decided)
+        )
+
+    def feed(self, chunk: bytes) -> bool:
+        """Evaluate the assertions over the next chunk
+
+        Args:
+            chunk (bytes): The next decoded bytes of the body
+
+        Returns:
+            bool: Whether the check is decided and the rest of the body can
+                    be skipped
+        """
+        budget = self._assertions.max_bytes - self.read
+        truncated = len(chunk) >= budget
+        chunk = chunk[:budget]
+        self.read += len(chunk)
+        window = self._tail + chunk
+        self._contains = [n for n in self._contains if n not in window]
+        self._patterns = [p for p in self._patterns if not p.search(window)]
+        if self._json is not None and not self._json.decided:
+            self._json.feed(chunk)
+            if self._json.failure is not None:
+                self.failure = f"body {self._json.failure}"
+                self._finished = True
+        if self._tail_size:
+            self._tail = window[-self._tail_size :]
+        if truncated and not self.decided:
+            self.finish(truncated=True)
+        return self.decided
+
+    def finish(self, truncated: bool = False) -> Optional[str]:
+        """Decide the assertions still pending at the end of the body
+
+        Args:
+            truncated (bool): Whether the body was cut at `max_bytes`
+
+        Returns:
+            Optional[str]: Why the body failed, None if it passed
+        """
+        if self._finished:
+            return self.failure
+        self._finished = True
+        where = f" in its first {self.read} bytes" if truncated else ""
+        if self._contains:
+            self.failure = f"body lacks {self._contains[0].decode()!r}{where}"
+        elif self._patterns:
+            pattern = self._patterns[0].pattern.decode()
+            self.failure = f"body does not match {pattern!r}{where}"
+        elif self._json is not None and not self._json.decided:
+            if truncated:
+                self.failure = (
+                    f"body has no field {self._json.missing()}{where}"
+                )
+            else:
+                self._json.feed(b"", final=True)
+                if self._json.failure is not None:
+                    self.failure = f"body {self._json.failure}"
+        return self.failure
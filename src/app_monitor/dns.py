@@ -0,0 +1,203 @@
+"""DNS resolution cache shared by the probes of a monitor."""
+
+import asyncio
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+import socket
+import threading
+import time
+from typing import NamedTuple, Optional
+
+
+class _Entry(NamedTuple):
+    """NamedTuple for a cached resolution"""
+
+    addresses: tuple[str, ...]
+    error: Optional[OSError]
+    expires: float
+    duration: float
+
+
+class DNSCache:
+    """LRU cache of host name resolutions
+
+    Successful resolutions are kept for `ttl` seconds and failed ones for
+    `negative_ttl` seconds. The system resolver does not report record TTLs,
+    so they are configured rather than taken from the records. Concurrent
+    lookups of the same name, from coroutines or from threads, share a single
+    `getaddrinfo` call. At most `max_entries` names are kept, the least
+    recently used being evicted first.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 60.0,
+        negative_ttl: float = 5.0,
+        max_entries: int = 10000,
+    ) -> None:
+        """Set up the cache
+
+        Args:
+            ttl (float): Seconds a resolution is reused
+            negative_ttl (float): Seconds a failed resolution is reused
+            max_entries (int): The maximum number of names cached
+        """
+        self._ttl = ttl
+        self._negative_ttl = negative_ttl
+        self._max_entries = max_entries
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+        self._pending: dict[str, asyncio.Task] = {}
+        self._sync_pending: dict[str, Future] = {}
+        self.counters: Counter[str] = Counter()
+        # Resolver time the hits did not have to spend, in seconds
+        self.saved = 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _cached(self, host: str) -> Optional[_Entry]:
+        """Return the live entry of a host, counting the hit"""
+        with self._lock:
+            entry = self._entries.get(host)
+            if entry is None:
+                return None
+            if entry.expires <= time.monotonic():
+                del self._entries[host]
+                return None
+            self._entries.move_to_end(host)
+            self.counters["negative_hits" if entry.error else "hits"] += 1
+            self.saved += entry.duration
+            return entry
+
+    def _store(
+        self,
+        host: str,
+        addresses: tuple[str, ...],
+        error: Optional[OSError],
+        duration: float,
+    ) -> None:
+        ttl = self._negative_ttl if error is not None else self._ttl
+        with self._lock:
+            self._entries[host] = _Entry(
+                addresses, error, time.monotonic() + ttl, duration
+            )
+            self._entries.move_to_end(host)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    @staticmethod
+    def _result(entry: _Entry) -> list[str]:
+        if entry.error is not None:
+            raise socket.gaierror(*entry.error.args)
+        return list(entry.addresses)
+
+    def _stored(self, host: str, started: float, infos: list) -> list[str]:
+        addresses = tuple(dict.fromkeys(str(info[4][0]) for info in infos))
+        self._store(host, addresses, None, time.monotonic() - started)
+        return list(addresses)
+
+    async def _lookup(self, host: str) -> list[str]:
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        try:
+            infos = await loop.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        except OSError as exc:
+            self._store(host, (), exc, time.monotonic() - started)
+            raise
+        finally:
+            self._pending.pop(host, None)
+        return self._stored(host, started, infos)
+
+    async def resolve(self, host: str) -> list[str]:
+        """Resolve a host name from the running event loop
+
+        Args:
+            host (str): The host name
+
+        Raises:
+            OSError: When the name does not resolve
+
+        Returns:
+            list[str]: The addresses, in the resolver's order
+        """
+        host = host.lower()
+        entry = self._cached(host)
+        if entry is not None:
+            return self._result(entry)
+        task = self._pending.get(host)
+        if task is None:
+            self.counters["misses"] += 1
+            task = self._pending[host] = asyncio.create_task(self._lookup(host))
+            # Retrieve the error even if every caller gave up waiting
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        else:
+            self.counters["coalesced"] += 1
+        # Shielded so that a caller timing out does not cancel the lookup
+        # the other callers wait for
+        return list(await asyncio.shield(task))
+
+    def resolve_sync(self, host: str) -> list[str]:
+        """Resolve a host name, blocking; safe to call from any thread
+
+        Args:
+            host (str): The host name
+
+        Raises:
+            OSError: When the name does not resolve
+
+        Returns:
+            list[str]: The addresses, in the resolver's order
+        """
+        host = host.lower()
+        entry = self._cached(host)
+        if entry is not None:
+            return self._result(entry)
+        with self._lock:
+            pending = self._sync_pending.get(host)
+            if pending is None:
+                self.counters["misses"] += 1
+                future: Future = Future()
+                self._sync_pending[host] = future
+            else:
+                self.counters["coalesced"] += 1
+        if pending is not None:
+            return list(pending.result())
+
+        started = time.monotonic()
+        try:
+            infos = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        except BaseException as exc:
+            if isinstance(exc, OSError):
+                self._store(host, (), exc, time.monotonic() - started)
+            future.set_exception(exc)
+            raise
+        else:
+            addresses = self._stored(host, started, infos)
+            future.set_result(addresses)
+            return addresses
+        finally:
+            with self._lock:
+                self._sync_pending.pop(host, None)
+
+    def stats(self) -> dict[str, float]:
+        """Return the counters, the number of names cached and the time saved
+
+        Returns:
+            dict[str, float]: hits, negative_hits, misses, coalesced,
+                    evictions, entries and saved_seconds
+        """
+        stats: dict[str, float] = {
+            key: self.counters[key]
+            for key in (
+                "hits",
+                "negative_hits",
+                "misses",
+                "coalesced",
+                "evictions",
+            )
+        }
+        stats["entries"] = len(self._entries)
+        stats["saved_seconds"] = self.saved
+        return stats
@@ -0,0 +1,134 @@
+"""Compact runtime state of the monitored endpoints."""
+
+import asyncio
+from functools import lru_cache
+import sys
+from typing import Iterator, Mapping, Optional
+
+from app_monitor.app_config import AppConfig
+from app_monitor.catalog import origin
+from app_monitor.probing import ProbeOptions
+from app_monitor.socket_probes import is_socket_probe
+import httpx
+
+# Last status of an endpoint not probed yet
+NOT_PROBED = -1
+
+
+@lru_cache(maxsize=65536)
+def _host(origin: str) -> str:
+    # Parsed once per origin: fleets have far fewer origins than endpoints
+    return sys.intern(httpx.URL(origin).host)
+
+
+class EndpointState:
+    """Runtime state of one endpoint, parsed once when it is added
+
+    Host and origin are interned, so the endpoints of a host share them, and
+    endpoints without their own probe options share the default ones.
+    """
+
+    __slots__ = (
+        "url",
+        "host",
+        "origin",
+        "options",
+        "socket_probe",
+        "task",
+        "probes",
+        "last_status",
+    )
+
+    def __init__(self, url: str, options: ProbeOptions) -> None:
+        self.url = url
+        self.origin = sys.intern(origin(url))
+        self.host = _host(self.origin)
+        self.options = options
+        self.socket_probe = is_socket_probe(url, options.method)
+        # The health check running, if any
+        self.task: Optional[asyncio.Task] = None
+        self.probes = 0
+        self.last_status = NOT_PROBED
+
+    def set_options(self, options: ProbeOptions) -> None:
+        """Change how the endpoint is probed"""
+        self.options = options
+        self.socket_probe = is_socket_probe(self.url, options.method)
+
+
+class EndpointTable:
+    """The state of every configured endpoint, by URL
+
+    Probes read the state instead of parsing the URL and building their
+    options again, so dispatching a check allocates nothing but its task.
+    """
+
+    def __init__(self) -> None:
+        self._states: dict[str, EndpointState] = {}
+        self._default = ProbeOptions()
+        self._probes: Mapping[str, ProbeOptions] = {}
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def __contains__(self, url: object) -> bool:
+        return url in self._states
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._states)
+
+    def __getitem__(self, url: str) -> EndpointState:
+        return self._states[url]
+
+    def states(self) -> Iterator[EndpointState]:
+        """Yield the state of every endpoint"""
+        return iter(self._states.values())
+
+    def state(self, url: str) -> EndpointState:
+        """Return the state of an endpoint
+
+        Args:
+            url (str): The endpoint
+
+        Returns:
+            EndpointState: Its state, a new one not kept in the table when
+                    the endpoint is not configured
+        """
+        state = self._states.get(url)
+        if state is None:
+            state = EndpointState(url, self._probes.get(url, self._default))
+        return state
+
+    def update(
+        self, app_config: AppConfig
+    ) -> tuple[list[EndpointState], list[EndpointState]]:
+        """Match the table to a configuration
+
+        Kept endpoints keep their state, with the new probe options.
+
+        Args:
+            app_config (AppConfig): The configuration
+
+        Returns:
+            tuple[list[EndpointState], list[EndpointState]]: The states
+                    added and removed
+        """
+        self._default = ProbeOptions(
+            app_config.probe_method, app_config.probe_max_bytes
+        )
+        self._probes = app_config.endpoint_probes or {}
+        states = self._states
+        wanted = dict.fromkeys(app_config.endpoints)
+        removed = [state for url, state in states.items() if url not in wanted]
+        for state in removed:
+            del states[state.url]
+        added: list[EndpointState] = []
+        for url in wanted:
+            options = self._probes.get(url, self._default)
+            current = states.get(url)
+            if current is None:
+                states[url] = EndpointState(url, options)
+                added.append(states[url])
+            elif current.options != options:
+                current.set_options(options)
+        return added, removed
@@ -0,0 +1,382 @@
+"""In-memory probe history with incrementally maintained time rollups."""
+
+from array import array
+import base64
+import math
+import time
+from typing import Iterator, NamedTuple, Optional
+
+RESOLUTIONS: dict[str, int] = {"1m": 60, "5m": 300, "1h": 3600}
+
+# Set on a kept status code when the response failed its content check;
+# status codes stay far below it
+CHECK_FAILED = 0x8000
+
+
+class Sample(NamedTuple):
+    """NamedTuple for one recorded probe"""
+
+    timestamp: float
+    status_code: int
+    response_time: float
+    check_failed: bool = False
+
+
+class RollupStats(NamedTuple):
+    """NamedTuple for the aggregate of the probes in one time window"""
+
+    start: float
+    probes: int = 0
+    errors: int = 0
+    min: float = math.nan
+    max: float = math.nan
+    mean: float = math.nan
+
+
+def is_error(status_code: int) -> bool:
+    """Whether a probe status code counts as an error
+
+    Args:
+        status_code (int): The status code, 0 when no response was received
+    """
+    return status_code == 0 or status_code >= 400
+
+
+class _RollupColumns:
+    """Current and previous tumbling window of one resolution, per slot"""
+
+    __slots__ = ("resolution", "current", "previous")
+
+    def __init__(self, resolution: int) -> None:
+        self.resolution = resolution
+        # start, probes, errors, min, max, total per window
+        self.current = _window_columns()
+        self.previous = _window_columns()
+
+    def extend(self) -> None:
+        for columns in (self.current, self.previous):
+            for column in columns:
+                column.append(0)
+            columns[0][-1] = -1.0
+
+    def reset(self, slot: int) -> None:
+        for columns in (self.current, self.previous):
+            for column in columns:
+                column[slot] = 0
+            columns[0][slot] = -1.0
+
+    def add(
+        self, slot: int, timestamp: float, error: bool, latency: float
+    ) -> None:
+        start = timestamp - timestamp % self.resolution
+        current = self.current
+        if start < current[0][slot]:
+            # Late sample for a window that is already closed
+            return
+        if current[0][slot] != start:
+            if current[0][slot] >= 0:
+                for column, previous in zip(current, self.previous):
+                    previous[slot] = column[slot]
+            current[0][slot] = start
+            current[1][slot] = 0
+            current[2][slot] = 0
+            current[5][slot] = 0
+        count = current[1][slot]
+        if count == 0 or latency < current[3][slot]:
+            current[3][slot] = latency
+        if count == 0 or latency > current[4][slot]:
+            current[4][slot] = latency
+        current[1][slot] = count + 1
+        current[2][slot] += error
+        current[5][slot] += latency
+
+    def stats(self, slot: int, now: float) -> tuple[RollupStats, RollupStats]:
+        window = now - now % self.resolution
+        current = _window_stats(self.current, slot)
+        previous = _window_stats(self.previous, slot)
+        if current.start == window:
+            if previous.start != window - self.resolution:
+                previous = RollupStats(start=window - self.resolution)
+            return current, previous
+        if current.start == window - self.resolution:
+            return RollupStats(start=window), current
+        return RollupStats(start=window), RollupStats(
+            start=window - self.resolution
+        )
+
+
+def _window_columns() -> tuple[array, ...]:
+    return (
+        array("d"),
+        array("I"),
+        array("I"),
+        array("f"),
+        array("f"),
+        array("d"),
+    )
+
+
+def _window_stats(columns: tuple[array, ...], slot: int) -> RollupStats:
+    start, count, errors, low, high, total = (
+        column[slot] for column in columns
+    )
+    if count == 0:
+        return RollupStats(start=start)
+    return RollupStats(
+        start=start,
+        probes=count,
+        errors=errors,
+        min=low,
+        max=high,
+        mean=total / count,
+    )
+
+
+class HistoryStore:
+    """Fixed-size ring buffer of recent probes per endpoint
+
+    All endpoints share columnar typed arrays (timestamps, status codes and
+    latencies), so memory is `capacity * 14` bytes plus about 200 bytes of
+    rollups per endpoint, independent of how long the monitor runs. Slots of
+    removed endpoints are reused.
+    """
+
+    def __init__(self, capacity: int = 64) -> None:
+        """Set up the store
+
+        Args:
+            capacity (int): The number of probes kept per endpoint
+        """
+        self._capacity = capacity
+        self._slots: dict[str, int] = {}
+        self._free: list[int] = []
+        self._timestamps = array("d")
+        self._status_codes = array("H")
+        self._latencies = array("f")
+        self._heads = array("I")
+        self._sizes = array("I")
+        self._rollups = {
+            name: _RollupColumns(resolution)
+            for name, resolution in RESOLUTIONS.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, endpoint: object) -> bool:
+        return endpoint in self._slots
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._slots)
+
+    def add_endpoint(self, endpoint: str) -> None:
+        """Start keeping history for an endpoint
+
+        Args:
+            endpoint (str): The endpoint
+        """
+        if endpoint in self._slots:
+            return
+        if self._free:
+            slot = self._free.pop()
+            self._heads[slot] = 0
+            self._sizes[slot] = 0
+            for rollup in self._rollups.values():
+                rollup.reset(slot)
+        else:
+            slot = len(self._heads)
+            self._timestamps.extend([0.0] * self._capacity)
+            self._status_codes.extend([0] * self._capacity)
+            self._latencies.extend([0.0] * self._capacity)
+            self._heads.append(0)
+            self._sizes.append(0)
+            for rollup in self._rollups.values():
+                rollup.extend()
+        self._slots[endpoint] = slot
+
+    def _columns(self) -> list[array]:
+        columns: list[array] = [
+            self._timestamps,
+            self._status_codes,
+            self._latencies,
+            self._heads,
+            self._sizes,
+        ]
+        for rollup in self._rollups.values():
+            columns.extend(rollup.current)
+            columns.extend(rollup.previous)
+        return columns
+
+    def export_state(self) -> dict:
+        """Return the history as JSON-serializable data
+
+        The typed arrays are exported as they are in memory, so the state can
+        only be imported on a machine of the same byte order.
+        """
+        return {
+            "capacity": self._capacity,
+            "slots": self._slots,
+            "free": self._free,
+            "columns": [
+                [column.typecode, base64.b64encode(column).decode()]
+                for column in self._columns()
+            ],
+        }
+
+    def import_state(self, state: dict) -> None:
+        """Replace the history with an exported one
+
+        Args:
+            state (dict): Returned by `export_state` of a store of the same
+                    capacity
+        """
+        if state["capacity"] != self._capacity:
+            raise ValueError(
+                f"Cannot import a history of {state['capacity']} probes per "
+                f"endpoint into one of {self._capacity}"
+            )
+        columns = self._columns()
+        if len(state["columns"]) != len(columns):
+            raise ValueError("Invalid history columns")
+        imported = []
+        slots = len(state["slots"]) + len(state["free"])
+        for column, (typecode, data) in zip(columns, state["columns"]):
+            if typecode != column.typecode:
+                raise ValueError("Invalid history columns")
+            values = array(typecode, base64.b64decode(data))
+            imported.append(values)
+        # The ring buffers hold `capacity` values per slot, the rest one
+        for index, values in enumerate(imported):
+            expected = slots * self._capacity if index < 3 else slots
+            if len(values) != expected:
+                raise ValueError("Invalid history columns")
+
+        for column, values in zip(columns, imported):
+            column[:] = values
+        self._slots = {
+            str(endpoint): int(slot)
+            for endpoint, slot in state["slots"].items()
+        }
+        self._free = [int(slot) for slot in state["free"]]
+
+    def remove_endpoint(self, endpoint: str) -> None:
+        """Forget an endpoint's history
+
+        Args:
+            endpoint (str): The endpoint
+        """
+        slot = self._slots.pop(endpoint, None)
+        if slot is not None:
+            self._free.append(slot)
+
+    def record(
+        self,
+        endpoint: str,
+        status_code: int,
+        response_time: float,
+        timestamp: Optional[float] = None,
+        check_failed: bool = False,
+    ) -> None:
+        """Record a probe
+
+        Args:
+            endpoint (str): The probed endpoint
+            status_code (int): The status code, 0 when no response was received
+            response_time (float): The response time, in seconds
+            timestamp (Optional[float]): When the probe ran, as a UNIX time.
+                    Defaults to now
+            check_failed (bool): Whether the response failed its content
+                    check, an error whatever its status code
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        slot = self._slots.get(endpoint)
+        if slot is None:
+            self.add_endpoint(endpoint)
+            slot = self._slots[endpoint]
+
+        head = self._heads[slot]
+        index = slot * self._capacity + head
+        self._timestamps[index] = timestamp
+        status_code = min(status_code, CHECK_FAILED - 1)
+        self._status_codes[index] = (
+            status_code | CHECK_FAILED if check_failed else status_code
+        )
+        self._latencies[index] = response_time
+        self._heads[slot] = (head + 1) % self._capacity
+        if self._sizes[slot] < self._capacity:
+            self._sizes[slot] += 1
+
+        error = check_failed or is_error(status_code)
+        for rollup in self._rollups.values():
+            rollup.add(slot, timestamp, error, response_time)
+
+    def recent(
+        self,
+        endpoint: str,
+        since: Optional[float] = None,
+        limit: Optional[int] = None,
+    ) -> list[Sample]:
+        """Return the most recent probes of an endpoint, newest first
+
+        Only the returned probes are visited, so the cost is O(window).
+
+        Args:
+            endpoint (str): The endpoint
+            since (Optional[float]): Only return probes at or after this UNIX
+                    time
+            limit (Optional[int]): Return at most this many probes
+
+        Returns:
+            list[Sample]: The probes
+        """
+        slot = self._slots.get(endpoint)
+        if slot is None:
+            return []
+        size = self._sizes[slot]
+        if limit is not None:
+            size = min(size, limit)
+        base = slot * self._capacity
+        index = self._heads[slot]
+        samples = []
+        for _ in range(size):
+            index = (index - 1) % self._capacity
+            timestamp = self._timestamps[base + index]
+            if since is not None and timestamp < since:
+                break
+            status_code = self._status_codes[base + index]
+            samples.append(
+                Sample(
+                    timestamp=timestamp,
+                    status_code=status_code & ~CHECK_FAILED,
+                    response_time=self._latencies[base + index],
+                    check_failed=bool(status_code & CHECK_FAILED),
+                )
+            )
+        return samples
+
+    def rollup(
+        self, endpoint: str, resolution: str, now: Optional[float] = None
+    ) -> tuple[RollupStats, RollupStats]:
+        """Return the aggregates of the current and previous time window
+
+        Args:
+            endpoint (str): The endpoint
+            resolution (str): One of "1m", "5m" or "1h"
+            now (Optional[float]): The UNIX time the current window contains.
+                    Defaults to now
+
+        Returns:
+            tuple[RollupStats, RollupStats]: The current, still filling
+                    window and the last complete one
+        """
+        if now is None:
+            now = time.time()
+        rollup = self._rollups[resolution]
+        slot = self._slots.get(endpoint)
+        if slot is None:
+            window = now - now % rollup.resolution
+            return RollupStats(start=window), RollupStats(
+                start=window - rollup.resolution
+            )
+        return rollup.stats(slot, now)
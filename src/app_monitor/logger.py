@@ -1,8 +1,13 @@
 """Contains code for setting up the logger and sending slack notifications"""
 
+import atexit
 import logging
+import logging.handlers
 from pathlib import Path
+import queue
 import sys
+import threading
+import time
 from typing import Optional
 
 
@@ -35,13 +40,114 @@ class LevelFormatter(logging.Formatter):
             logging.INFO: self._DEFAULT_FORMATTER,
             logging.DEBUG: self._DEBUG_FORMATTER,
         }
+        self._level: Optional[int] = None
+        self._formatter = self._DEFAULT_FORMATTER
         super().__init__()
 
     def format(self, record: logging.LogRecord) -> str:
+        # Only look the formatter up again when the logger's level changed
+        level = self._logger.level
+        if level != self._level:
+            self._formatter = self._formatters.get(
+                level, self._DEFAULT_FORMATTER
+            )
+            self._level = level
+        return self._formatter.format(record)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that never blocks the logging thread
+
+    Records are enqueued as they are and formatted by the listener thread.
+    When the queue is full the record is dropped and counted, and a warning
+    with the number of dropped records is enqueued once there is room again.
+    """
+
+    def __init__(self, queue: queue.Queue) -> None:
+        super().__init__(queue)
+        self.dropped = 0
+        self._unreported = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The listener runs in this process, so the record does not need to be
+        # made picklable. Formatting is left to the listener thread.
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            if self._unreported:
+                self.queue.put_nowait(
+                    logging.makeLogRecord(
+                        {
+                            "name": record.name,
+                            "levelno": logging.WARNING,
+                            "levelname": "WARNING",
+                            "msg": (
+                                f"Dropped {self._unreported} log records: "
+                                f"logging queue full"
+                            ),
+                        }
+                    )
+                )
+                self._unreported = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            self._unreported += 1
+
+
+class BufferedHandler(logging.handlers.MemoryHandler):
+    """Memory handler that also flushes when its buffer gets old
+
+    Records are written at most `flush_interval` seconds after they were
+    logged, by a timer when no other record arrives. Unlike
+    `logging.handlers.MemoryHandler` it does not flush on every error, so an
+    incident storm is written in batches as well.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        target: logging.Handler,
+        flush_interval: float = 1.0,
+    ) -> None:
+        super().__init__(
+            capacity, flushLevel=logging.CRITICAL + 1, target=target
+        )
+        self._flush_interval = flush_interval
+        self._flushed_at = time.monotonic()
+        self._timer: Optional[threading.Timer] = None
+
+    def shouldFlush(self, record: logging.LogRecord) -> bool:
+        return (
+            super().shouldFlush(record)
+            or time.monotonic() - self._flushed_at >= self._flush_interval
+        )
+
+    def emit(self, record: logging.LogRecord) -> None:
+        super().emit(record)
+        if self.buffer and self._timer is None:
+            # Writes the buffer if the logging goes quiet
+            self._timer = threading.Timer(self._flush_interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self) -> None:
+        self.acquire()
         try:
-            return self._formatters[self._logger.level].format(record)
-        except KeyError:
-            return self._DEFAULT_FORMATTER.format(record)
+            super().flush()
+            self._flushed_at = time.monotonic()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        finally:
+            self.release()
+
+    def close(self) -> None:
+        target = self.target
+        super().close()
+        if target is not None:
+            target.close()
 
 
 def setup_logger(logger_name: Optional[str] = None) -> logging.Logger:
@@ -72,18 +178,101 @@ def setup_logger(logger_name: Optional[str] = None) -> logging.Logger:
     return logger
 
 
-def set_file_handler(log_path: Path = Path("monitor.log")) -> None:
+def _is_file_handler(handler: logging.Handler) -> bool:
+    if isinstance(handler, BufferedHandler):
+        handler = handler.target  # type: ignore[assignment]
+    return isinstance(handler, logging.FileHandler)
+
+
+def set_file_handler(
+    log_path: Path = Path("monitor.log"),
+    max_bytes: int = 0,
+    backup_count: int = 0,
+    buffer_capacity: int = 0,
+) -> None:
     """Set up a file handler for the logger
 
     Args:
         log_path (Path): The path to the log file
+        max_bytes (int): Rotate the file when it reaches this size. 0 disables
+                    rotation
+        backup_count (int): The number of rotated files to keep
+        buffer_capacity (int): Write records in batches of this many, or
+                    within a second of being logged. 0 writes every record
+                    immediately
     """
-    for handler in LOGGER.handlers:
-        if isinstance(handler, logging.FileHandler):
-            LOGGER.removeHandler(handler)
-    file_handler = logging.FileHandler(log_path)
+    handlers = list(_LISTENER.handlers if _LISTENER else LOGGER.handlers)
+    for handler in list(handlers):
+        if _is_file_handler(handler):
+            handlers.remove(handler)
+            if _LISTENER is None:
+                LOGGER.removeHandler(handler)
+            handler.close()
+
+    file_handler: logging.Handler
+    if max_bytes:
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_path, maxBytes=max_bytes, backupCount=backup_count
+        )
+    else:
+        file_handler = logging.FileHandler(log_path)
     file_handler.setFormatter(LevelFormatter(logger=LOGGER))
-    LOGGER.addHandler(file_handler)
+    if buffer_capacity:
+        file_handler = BufferedHandler(buffer_capacity, target=file_handler)
+
+    if _LISTENER is None:
+        LOGGER.addHandler(file_handler)
+    else:
+        _LISTENER.handlers = (*handlers, file_handler)
+
+
+def enable_queue_logging(queue_size: int = 10000) -> None:
+    """Move the logger's handlers behind a queue served by a background thread
+
+    Logging calls then only enqueue the record; formatting and I/O happen on
+    the listener thread. Records logged while the queue is full are dropped
+    and reported once there is room again.
+
+    Args:
+        queue_size (int): The maximum number of records waiting to be written
+    """
+    global _LISTENER
+    if _LISTENER is not None:
+        return
+    handlers = list(LOGGER.handlers)
+    for handler in handlers:
+        LOGGER.removeHandler(handler)
+    record_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    LOGGER.addHandler(DroppingQueueHandler(record_queue))
+    _LISTENER = logging.handlers.QueueListener(
+        record_queue, *handlers, respect_handler_level=True
+    )
+    _LISTENER.start()
+    atexit.register(disable_queue_logging)
+
+
+def disable_queue_logging() -> None:
+    """Write out the queued records and attach the handlers directly again"""
+    global _LISTENER
+    if _LISTENER is None:
+        return
+    listener, _LISTENER = _LISTENER, None
+    listener.stop()
+    for handler in list(LOGGER.handlers):
+        if isinstance(handler, DroppingQueueHandler):
+            LOGGER.removeHandler(handler)
+    for handler in listener.handlers:
+        handler.flush()
+        LOGGER.addHandler(handler)
+
+
+def dropped_log_records() -> int:
+    """Return the number of records dropped because the queue was full"""
+    return sum(
+        handler.dropped
+        for handler in LOGGER.handlers
+        if isinstance(handler, DroppingQueueHandler)
+    )
 
 
 def set_logging_level(level: int) -> None:
@@ -98,6 +287,7 @@ def set_logging_level(level: int) -> None:
 
 
 LOGGER: logging.Logger = setup_logger()
+_LISTENER: Optional[logging.handlers.QueueListener] = None
 
 
 def send_slack_notification(message: str) -> None:
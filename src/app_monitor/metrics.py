@@ -0,0 +1,342 @@
+"""Prometheus/OpenMetrics exposition of the probe results."""
+
+import asyncio
+from bisect import bisect_left
+import math
+from typing import Callable, Iterable, NamedTuple, Optional
+
+from app_monitor.logger import LOGGER
+from app_monitor.results import ProbeResult
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+OPENMETRICS_CONTENT_TYPE = (
+    "application/openmetrics-text; version=1.0.0; charset=utf-8"
+)
+
+
+class MetricFamily(NamedTuple):
+    """NamedTuple for a metric and its rendered samples"""
+
+    name: str
+    type: str
+    help: str
+    samples: list[str]
+
+
+# Per-endpoint families, in the order their samples are cached
+_ENDPOINT_FAMILIES = (
+    (
+        "app_monitor_probe_duration_seconds",
+        "histogram",
+        "Response time of the probes",
+    ),
+    ("app_monitor_probe_status", "counter", "Probes by status code"),
+    ("app_monitor_probe_retries", "counter", "Probe attempts retried"),
+    ("app_monitor_endpoint_up", "gauge", "Whether the last probe succeeded"),
+)
+
+Collector = Callable[[], Iterable[MetricFamily]]
+
+
+def escape_label(value: str) -> str:
+    """Escape a label value for the text exposition formats"""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def sample(name: str, value: float, labels: str = "") -> str:
+    """Render one sample line
+
+    Args:
+        name (str): The sample name
+        value (float): The value
+        labels (str): The rendered labels, without braces
+
+    Returns:
+        str: The line, with its newline
+    """
+    if math.isnan(value):
+        text = "NaN"
+    elif math.isinf(value):
+        text = "+Inf" if value > 0 else "-Inf"
+    else:
+        text = str(value)
+    if labels:
+        return f"{name}{{{labels}}} {text}\n"
+    return f"{name} {text}\n"
+
+
+def _header(name: str, metric_type: str, help: str, openmetrics: bool) -> str:
+    if metric_type == "counter" and not openmetrics:
+        name += "_total"
+    return f"# HELP {name} {help}\n# TYPE {name} {metric_type}\n"
+
+
+class _EndpointMetrics:
+    """Aggregates of one endpoint and their rendered samples"""
+
+    __slots__ = (
+        "label",
+        "buckets",
+        "total",
+        "count",
+        "statuses",
+        "retries",
+        "up",
+        "rendered",
+    )
+
+    def __init__(self, endpoint: str) -> None:
+        self.label = f'endpoint="{escape_label(endpoint)}"'
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.statuses: dict[int, int] = {}
+        self.retries = 0
+        self.up = 0
+        # Samples per family, rendered on the first scrape after a change
+        self.rendered: Optional[tuple[bytes, ...]] = None
+
+    def render(self) -> tuple[bytes, ...]:
+        if self.rendered is not None:
+            return self.rendered
+        label = self.label
+        name = _ENDPOINT_FAMILIES[0][0]
+        histogram = []
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.buckets):
+            cumulative += count
+            histogram.append(
+                sample(f"{name}_bucket", cumulative, f'{label},le="{bound}"')
+            )
+        histogram.append(
+            sample(f"{name}_bucket", self.count, f'{label},le="+Inf"')
+        )
+        histogram.append(sample(f"{name}_sum", self.total, label))
+        histogram.append(sample(f"{name}_count", self.count, label))
+        statuses = [
+            sample(
+                "app_monitor_probe_status_total",
+                count,
+                f'{label},code="{code}"',
+            )
+            for code, count in sorted(self.statuses.items())
+        ]
+        self.rendered = (
+            "".join(histogram).encode(),
+            "".join(statuses).encode(),
+            sample(
+                "app_monitor_probe_retries_total", self.retries, label
+            ).encode(),
+            sample("app_monitor_endpoint_up", self.up, label).encode(),
+        )
+        return self.rendered
+
+
+class MetricsRegistry:
+    """Pre-aggregated per-endpoint metrics with cached rendering
+
+    Results are folded into fixed histograms and counters as they arrive. The
+    samples of an endpoint are only re-rendered on the first scrape after it
+    changed, so a scrape mostly concatenates cached bytes. Global metrics come
+    from collectors called on every scrape.
+    """
+
+    def __init__(self) -> None:
+        self._endpoints: dict[str, _EndpointMetrics] = {}
+        self._collectors: list[Collector] = []
+
+    def __len__(self) -> int:
+        return len(self._endpoints)
+
+    def _metrics(self, endpoint: str) -> _EndpointMetrics:
+        metrics = self._endpoints.get(endpoint)
+        if metrics is None:
+            metrics = self._endpoints[endpoint] = _EndpointMetrics(endpoint)
+        return metrics
+
+    def observe(self, result: ProbeResult) -> None:
+        """Fold a probe result in; usable as a result listener
+
+        Args:
+            result (ProbeResult): The result
+        """
+        metrics = self._metrics(result.endpoint)
+        metrics.buckets[bisect_left(LATENCY_BUCKETS, result.response_time)] += 1
+        metrics.total += result.response_time
+        metrics.count += 1
+        status = result.status_code
+        metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+        metrics.up = 0 if result.is_error else 1
+        metrics.rendered = None
+
+    def record_retry(self, endpoint: str) -> None:
+        """Count a retried probe attempt
+
+        Args:
+            endpoint (str): The endpoint
+        """
+        metrics = self._metrics(endpoint)
+        metrics.retries += 1
+        metrics.rendered = None
+
+    def remove_endpoint(self, endpoint: str) -> None:
+        """Stop exposing an endpoint"""
+        self._endpoints.pop(endpoint, None)
+
+    def add_collector(self, collector: Collector) -> None:
+        """Register a callable returning global metric families
+
+        Args:
+            collector (Collector): Called on every scrape
+        """
+        self._collectors.append(collector)
+
+    async def write(
+        self,
+        writer: asyncio.StreamWriter,
+        openmetrics: bool = False,
+        chunk_size: int = 1000,
+    ) -> None:
+        """Write the exposition, yielding to the event loop between chunks
+
+        Args:
+            writer (asyncio.StreamWriter): Where to write
+            openmetrics (bool): Use the OpenMetrics format rather than the
+                    Prometheus text format
+            chunk_size (int): Endpoints rendered between two yields
+        """
+        for collector in self._collectors:
+            for family in collector():
+                writer.write(
+                    (
+                        _header(
+                            family.name, family.type, family.help, openmetrics
+                        )
+                        + "".join(family.samples)
+                    ).encode()
+                )
+        endpoints = list(self._endpoints.values())
+        for index, (name, metric_type, help) in enumerate(_ENDPOINT_FAMILIES):
+            writer.write(_header(name, metric_type, help, openmetrics).encode())
+            for start in range(0, len(endpoints), chunk_size):
+                writer.write(
+                    b"".join(
+                        metrics.render()[index]
+                        for metrics in endpoints[start : start + chunk_size]
+                    )
+                )
+                await writer.drain()
+                # drain only yields when the buffer is full
+                await asyncio.sleep(0)
+        if openmetrics:
+            writer.write(b"# EOF\n")
+        await writer.drain()
+
+
+class MetricsServer:
+    """Minimal HTTP server exposing a MetricsRegistry on /metrics
+
+    It runs on the monitor's event loop. Clients asking for
+    `application/openmetrics-text` get the OpenMetrics format, others the
+    Prometheus text format.
+    """
+
+    def __init__(
+        self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 0
+    ) -> None:
+        """Set up the server
+
+        Args:
+            registry (MetricsRegistry): The metrics to expose
+            host (str): The address to listen on
+            port (int): The port to listen on, 0 to pick a free one
+        """
+        self._registry = registry
+        self._host = host
+        self.port = port
+        self._server: Optional[asyncio.Server] = None
+
+    async def start(self) -> None:
+        """Start listening"""
+        self._server = await asyncio.start_server(
+            self._handle, self._host, self.port
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        LOGGER.info(f"Serving metrics on http://{self._host}:{self.port}/")
+
+    async def stop(self) -> None:
+        """Stop listening"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 10)
+            request_line, *header_lines = head.decode("latin-1").split("\r\n")
+            method, path, _ = request_line.split(" ", 2)
+            headers = {
+                name.strip().lower(): value.strip()
+                for name, _, value in (
+                    line.partition(":") for line in header_lines if line
+                )
+            }
+            if method != "GET":
+                writer.write(_response_head("405 Method Not Allowed"))
+            elif path.split("?", 1)[0] not in ("/", "/metrics"):
+                writer.write(_response_head("404 Not Found"))
+            else:
+                openmetrics = "application/openmetrics-text" in headers.get(
+                    "accept", ""
+                )
+                writer.write(
+                    _response_head(
+                        "200 OK",
+                        (
+                            OPENMETRICS_CONTENT_TYPE
+                            if openmetrics
+                            else PROMETHEUS_CONTENT_TYPE
+                        ),
+                    )
+                )
+                await self._registry.write(writer, openmetrics)
+            await writer.drain()
+        except (
+            TimeoutError,
+            ValueError,
+            asyncio.IncompleteReadError,
+            asyncio.LimitOverrunError,
+        ):
+            pass
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+def _response_head(status: str, content_type: str = "text/plain") -> bytes:
+    # The body ends when the connection closes
+    return (
+        f"HTTP/1.1 {status}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        "Connection: close\r\n"
+        "\r\n"
+    ).encode()
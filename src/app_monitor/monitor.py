@@ -1,10 +1,41 @@
 """Module contains the logic for the serial application monitor."""
 
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import ssl
+import threading
+from typing import Optional
 import requests
 import time
+from urllib.parse import urlsplit
 from requests.adapters import Retry
+import urllib3
 from app_monitor.app_config import AppConfig
-from app_monitor.logger import LOGGER, send_slack_notification
+from app_monitor.checkpoint import Checkpointer
+from app_monitor.dns import DNSCache
+from app_monitor.logger import LOGGER
+from app_monitor.notifier import NotificationDispatcher
+from app_monitor.probing import (
+    CONDITIONAL,
+    PROBE_TIMEOUT,
+    ProbeOptions,
+    ValidatorCache,
+    read_body,
+)
+from app_monitor.quantiles import SlowResponseDetector
+from app_monitor.resilience import CircuitBreakers, backoff_delay
+from app_monitor.results import ProbeResult
+from app_monitor.socket_probes import (
+    UnhealthyError,
+    UnreachableError,
+    default_ssl_context,
+    is_socket_probe,
+    probe_socket_sync,
+    socket_target,
+)
+from app_monitor.store import ResultStore
+from app_monitor.sync_transport import TimingHTTPAdapter
+from app_monitor.timing import PhaseRecorder, record_phases
 
 
 class AppMonitor:
@@ -12,8 +43,79 @@ class AppMonitor:
 
     RUN = True
 
-    def __init__(self, app_config: AppConfig) -> None:
+    def __init__(self, app_config: AppConfig, workers: int = 1) -> None:
+        """Set up the monitor
+
+        Args:
+            app_config (AppConfig): The application configuration
+            workers (int): The number of threads probing endpoints
+                    concurrently. With a single worker the endpoints are
+                    probed one after the other
+        """
         self._app_config: AppConfig = app_config
+        self._workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._local = threading.local()
+        self._sessions: list[requests.Session] = []
+        self._sessions_lock = threading.Lock()
+        self._notifier = NotificationDispatcher.from_config(app_config)
+        # Shared by the sessions of all the workers
+        self.dns_cache = DNSCache(
+            ttl=app_config.dns_ttl,
+            negative_ttl=app_config.dns_negative_ttl,
+            max_entries=app_config.dns_cache_size,
+        )
+        self.validators = ValidatorCache()
+        self._ssl_context: Optional[ssl.SSLContext] = None
+        # UNIX time the certificate of each TLS socket probe expires
+        self.cert_expiry: dict[str, float] = {}
+        self.breakers = CircuitBreakers(
+            failure_threshold=app_config.breaker_failure_threshold,
+            reset_timeout=app_config.breaker_reset_timeout,
+        )
+        self.slow_responses = SlowResponseDetector(
+            rule=app_config.warn_rule,
+            baseline_factor=app_config.warn_baseline_factor,
+            window=app_config.latency_window,
+        )
+        self.store: Optional[ResultStore] = None
+        if app_config.store_path is not None:
+            self.store = ResultStore(
+                Path(app_config.store_path),
+                segment_seconds=app_config.store_segment_seconds,
+                retention=app_config.store_retention,
+            )
+        self.checkpoint: Optional[Checkpointer] = None
+        if app_config.checkpoint_path is not None:
+            self.checkpoint = Checkpointer(
+                Path(app_config.checkpoint_path),
+                interval=app_config.checkpoint_interval,
+            )
+        # Monotonic start of the last cycle and of the first one after a
+        # restore
+        self._cycle_started: Optional[float] = None
+        self._resume_at = 0.0
+
+    @property
+    def session(self) -> requests.Session:
+        """The calling thread's long-lived session
+
+        Sessions are kept per thread because `requests.Session` is not
+        guaranteed to be thread-safe. Each one pools its own connections.
+        """
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = self._setup_session()
+            with self._sessions_lock:
+                self._sessions.append(session)
+        return session
+
+    @property
+    def ssl_context(self) -> ssl.SSLContext:
+        """The TLS context of the socket probes, loaded once"""
+        if self._ssl_context is None:
+            self._ssl_context = default_ssl_context()
+        return self._ssl_context
 
     def _setup_session(self) -> requests.Session:
         """Set up a session with retries
@@ -22,49 +124,376 @@ class AppMonitor:
             requests.Session: The session object
         """
         session = requests.Session()
-        adapter = requests.adapters.HTTPAdapter(
+        adapter = TimingHTTPAdapter(
             max_retries=Retry(
-                total=self._app_config.retries, status_forcelist=[500, 502]
-            )
+                total=self._app_config.retries,
+                # A response that stalls is reported, not sent again, as
+                # the async monitor does
+                read=False,
+                status_forcelist=[500, 502],
+                backoff_factor=self._app_config.retry_backoff,
+                backoff_max=self._app_config.retry_backoff_max,
+                backoff_jitter=self._app_config.retry_backoff,
+            ),
+            pool_connections=self._app_config.max_concurrency,
+            pool_maxsize=self._app_config.max_per_host,
+            dns_cache=self.dns_cache,
         )
         session.mount("http://", adapter)
+        session.mount("https://", adapter)
         return session
 
-    def probe_endpoint(self, endpoint: str) -> None:
+    def probe_endpoint(self, endpoint: str) -> Optional[ProbeResult]:
         """Probe an endpoints and log the result
 
         Args:
             endpoint (str): The endpoint to probe
+
+        Returns:
+            Optional[ProbeResult]: The probe result, None if the probe was
+                    skipped or all retries failed
         """
-        session = self._setup_session()
+        host = urlsplit(endpoint).hostname or ""
+        if not self.breakers.allow(host):
+            LOGGER.debug(
+                f"Skipping endpoint {endpoint}: circuit open for host {host}"
+            )
+            return None
 
-        t = time.time()
-        try:
-            response = session.get(endpoint)
-        except requests.exceptions.RetryError:
-            LOGGER.error(f"All retries failed when probing endpoint {endpoint}")
-            return
+        options = self._probe_options(endpoint)
+        if is_socket_probe(endpoint, options.method):
+            return self._probe_socket(endpoint, host, options)
+        with record_phases() as phases:
+            try:
+                response = self.session.request(
+                    options.http_method,
+                    endpoint,
+                    headers=(
+                        self.validators.headers(endpoint)
+                        if options.method == CONDITIONAL
+                        else None
+                    ),
+                    stream=True,
+                    allow_redirects=True,
+                    timeout=PROBE_TIMEOUT,
+                )
+            except requests.exceptions.RetryError:
+                self._record_reachable(host)
+                LOGGER.error(
+                    f"All retries failed when probing endpoint {endpoint}"
+                )
+                return None
+            except requests.exceptions.ConnectionError as exc:
+                msg = f"Endpoint {endpoint} is unreachable: {exc}"
+                LOGGER.error(msg)
+                self._notifier.notify(msg)
+                self._record_unreachable(host)
+                return self._failed(endpoint, phases)
+            except requests.exceptions.Timeout as exc:
+                # Connected, but the response did not come
+                msg = f"Endpoint {endpoint} did not respond: {exc}"
+                LOGGER.error(msg)
+                self._notifier.notify(msg)
+                return self._failed(endpoint, phases)
+            self._record_reachable(host)
+            phases.mark("body")
+            # Read as the method asks, without buffering
+            check = options.content_check()
+            body_error: Optional[Exception] = None
+            # Closed, returning the connection to the pool, even on errors
+            with response:
+                try:
+                    read_body(response, options.body_limit, check)
+                except (
+                    requests.exceptions.RequestException,
+                    urllib3.exceptions.HTTPError,
+                ) as exc:
+                    body_error = exc
+            phases.body += phases.since("body")
+            timings = phases.timings()
 
-        response_time = time.time() - t
+        response_time = timings.total
+        if body_error is not None:
+            msg = f"Endpoint {endpoint} failed sending its body: {body_error}"
+            LOGGER.error(msg)
+            self._notifier.notify(msg)
+            return ProbeResult(
+                endpoint=endpoint,
+                status_code=0,
+                response_time=response_time,
+                timings=timings,
+            )
 
         status_code = response.status_code
-        if status_code != 200:
+        if options.method == CONDITIONAL:
+            self.validators.update(endpoint, status_code, response.headers)
+        if not options.is_healthy(status_code):
             msg = f"Endpoint {endpoint} returned status code {status_code}"
             LOGGER.error(msg)
-            send_slack_notification(msg)
-        if response_time > self._app_config.warn_threshold:
-            LOGGER.warning(
-                f"Endpoint {endpoint} took too long to respond: "
-                f"{response_time:.2f} seconds"
+            self._notifier.notify(msg)
+        elif check is not None and check.failure is not None:
+            msg = (
+                f"Endpoint {endpoint} failed its content check: {check.failure}"
             )
+            LOGGER.error(msg)
+            self._notifier.notify(msg)
+        slow = self._check_slow(endpoint, response_time)
+        return ProbeResult(
+            endpoint=endpoint,
+            status_code=status_code,
+            response_time=response_time,
+            timings=timings,
+            slow=slow is not None,
+            failure=None if check is None else check.failure,
+        )
 
-    def probe_all_endpoints(self) -> None:
-        """Probe all endpoints"""
-        for endpoint in self._app_config.endpoints:
+    @staticmethod
+    def _failed(endpoint: str, phases: PhaseRecorder) -> ProbeResult:
+        """The result of a probe that received no response"""
+        timings = phases.timings()
+        return ProbeResult(
+            endpoint=endpoint,
+            status_code=0,
+            response_time=timings.total,
+            timings=timings,
+        )
+
+    def _probe_socket(
+        self, endpoint: str, host: str, options: ProbeOptions
+    ) -> Optional[ProbeResult]:
+        """Probe an endpoint over a raw socket, without the HTTP client
+
+        Args:
+            endpoint (str): The endpoint
+            host (str): Its host
+            options (ProbeOptions): How to probe it
+
+        Returns:
+            Optional[ProbeResult]: The probe result, None if all retries failed
+        """
+        target = socket_target(endpoint)
+        with record_phases() as phases:
+            for attempt in range(self._app_config.retries):
+                try:
+                    result = probe_socket_sync(
+                        target, self.dns_cache, self.ssl_context
+                    )
+                    break
+                except UnreachableError as exc:
+                    if attempt + 1 == self._app_config.retries:
+                        msg = f"Endpoint {endpoint} is unreachable: {exc}"
+                        LOGGER.error(msg)
+                        self._notifier.notify(msg)
+                        self._record_unreachable(host)
+                        return None
+                    time.sleep(
+                        backoff_delay(
+                            attempt,
+                            self._app_config.retry_backoff,
+                            self._app_config.retry_backoff_max,
+                        )
+                    )
+                except UnhealthyError as exc:
+                    self._record_reachable(host)
+                    msg = f"Endpoint {endpoint} {exc}"
+                    LOGGER.error(msg)
+                    self._notifier.notify(msg)
+                    timings = phases.timings()
+                    return ProbeResult(
+                        endpoint=endpoint,
+                        status_code=exc.status_code,
+                        response_time=timings.total,
+                        timings=timings,
+                    )
+            timings = phases.timings()
+
+        self._record_reachable(host)
+        if result.cert_expires is not None:
+            self._check_certificate(endpoint, result.cert_expires)
+        status_code = result.status_code
+        if not options.is_healthy(status_code):
+            msg = f"Endpoint {endpoint} returned status code {status_code}"
+            LOGGER.error(msg)
+            self._notifier.notify(msg)
+        slow = self._check_slow(endpoint, timings.total)
+        return ProbeResult(
+            endpoint=endpoint,
+            status_code=status_code,
+            response_time=timings.total,
+            timings=timings,
+            slow=slow is not None,
+        )
+
+    def _check_slow(self, endpoint: str, response_time: float) -> Optional[str]:
+        slow = self.slow_responses.check(
+            endpoint, response_time, self._app_config.warn_threshold
+        )
+        if slow:
+            LOGGER.warning(f"Endpoint {endpoint} {slow}")
+        return slow
+
+    def _check_certificate(self, endpoint: str, expires: float) -> None:
+        self.cert_expiry[endpoint] = expires
+        days = (expires - time.time()) / 86400
+        if days < self._app_config.cert_expiry_warn_days:
+            expiry = time.strftime("%Y-%m-%d", time.gmtime(expires))
+            msg = f"Certificate of endpoint {endpoint} expires on {expiry}"
+            LOGGER.warning(msg)
+            self._notifier.notify(msg)
+
+    def _probe_options(self, endpoint: str) -> ProbeOptions:
+        app_config = self._app_config
+        options = (app_config.endpoint_probes or {}).get(endpoint)
+        if options is None:
+            options = ProbeOptions(
+                app_config.probe_method, app_config.probe_max_bytes
+            )
+        return options
+
+    def _record_reachable(self, host: str) -> None:
+        if self.breakers.record_success(host):
+            LOGGER.info(f"Host {host} is reachable again, resuming its probes")
+
+    def _record_unreachable(self, host: str) -> None:
+        if self.breakers.record_failure(host):
+            msg = (
+                f"Host {host} is down, pausing its probes for "
+                f"{self._app_config.breaker_reset_timeout:g} seconds"
+            )
+            LOGGER.error(msg)
+            self._notifier.notify(msg)
+
+    def check_once(self) -> list[Optional[ProbeResult]]:
+        """Probe every endpoint once and store the results
+
+        Returns:
+            list[Optional[ProbeResult]]: The result of every endpoint, in
+                    order, None when no response was received
+        """
+        # Alone, e.g. with --once, the check delivers its own notifications;
+        # without a webhook they are printed inline
+        alone = (
+            self._app_config.notification_webhook is not None
+            and not self._notifier.running
+        )
+        if alone:
+            self._notifier.start_in_thread()
+        try:
+            results = self._probe_all()
+        finally:
+            if alone:
+                self._notifier.stop_thread()
+        if self.store is not None:
+            for result in results:
+                if result is not None:
+                    self.store.append(result)
+        return results
+
+    def _probe_all(self) -> list[Optional[ProbeResult]]:
+        if self._workers > 1:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._workers,
+                    thread_name_prefix="app_monitor",
+                )
+            # Consume the iterator so that worker exceptions are raised here
+            return list(
+                self._executor.map(
+                    self.probe_endpoint, self._app_config.endpoints
+                )
+            )
+        return [
             self.probe_endpoint(endpoint)
+            for endpoint in self._app_config.endpoints
+        ]
+
+    def probe_all_endpoints(self) -> None:
+        """Probe all endpoints, then wait for the next cycle"""
+        self._cycle_started = time.monotonic()
+        self.check_once()
+        dns = self.dns_cache.stats()
+        LOGGER.debug(
+            f"DNS cache: {dns['hits']:g} hits, {dns['misses']:g} misses, "
+            f"{dns['saved_seconds']:.3f} seconds saved"
+        )
         time.sleep(self._app_config.check_interval)
 
+    def close(self) -> None:
+        """Stop the worker threads and close the pooled connections"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        with self._sessions_lock:
+            for session in self._sessions:
+                session.close()
+            self._sessions.clear()
+        self._local = threading.local()
+
+    def export_state(self, now: float) -> dict:
+        """Return the state worth keeping across restarts
+
+        Args:
+            now (float): The current monotonic time
+        """
+        started = self._cycle_started
+        return {
+            "cycle_started": None if started is None else started - now,
+            "breakers": self.breakers.export_state(now),
+            "slow_responses": self.slow_responses.export_state(now),
+            "notifications": self._notifier.export_state(now),
+        }
+
+    def import_state(self, state: dict, now: float) -> None:
+        """Restore the state exported before a restart
+
+        Args:
+            state (dict): Returned by `export_state`
+            now (float): The monotonic time matching the export's `now`
+        """
+        endpoints = set(self._app_config.endpoints)
+        hosts = {urlsplit(endpoint).hostname or "" for endpoint in endpoints}
+        self.breakers.import_state(
+            {
+                host: breaker
+                for host, breaker in state["breakers"].items()
+                if host in hosts
+            },
+            now,
+        )
+        self.slow_responses.import_state(
+            {
+                endpoint: sketch
+                for endpoint, sketch in state["slow_responses"].items()
+                if endpoint in endpoints
+            },
+            now,
+        )
+        self._notifier.import_state(state["notifications"], now)
+        if state["cycle_started"] is not None:
+            self._resume_at = (
+                now + state["cycle_started"] + self._app_config.check_interval
+            )
+
     def run(self) -> None:
         """Run the monitor"""
-        while self.RUN:
-            self.probe_all_endpoints()
+        self._notifier.start_in_thread()
+        if self.store is not None:
+            self.store.start()
+        try:
+            if self.checkpoint is not None and self.checkpoint.restore(self):
+                # Keep the cadence of the cycles before the restart
+                delay = self._resume_at - time.monotonic()
+                if delay > 0:
+                    LOGGER.info(f"Resuming the checks in {delay:.0f}s")
+                    time.sleep(delay)
+            while self.RUN:
+                self.probe_all_endpoints()
+                if self.checkpoint is not None and self.checkpoint.due():
+                    self.checkpoint.save(self)
+        finally:
+            self.close()
+            self._notifier.stop_thread()
+            if self.store is not None:
+                self.store.close()
+            if self.checkpoint is not None:
+                self.checkpoint.save(self)
@@ -0,0 +1,111 @@
+"""HTTP/2 support and per-origin stream accounting of the async monitor."""
+
+from collections import Counter
+from contextlib import contextmanager
+import importlib.util
+from typing import Iterator
+
+from app_monitor.metrics import MetricFamily, escape_label, sample
+
+
+def http2_available() -> bool:
+    """Whether the optional h2 package, needed by httpx for HTTP/2, is there"""
+    return importlib.util.find_spec("h2") is not None
+
+
+class OriginStreams:
+    """Requests in flight and HTTP versions negotiated per origin
+
+    With HTTP/2 the requests in flight to an origin are streams multiplexed
+    over its connections; with HTTP/1.1 each one holds a connection.
+    """
+
+    def __init__(self) -> None:
+        self._in_flight: Counter[str] = Counter()
+        self._peak: Counter[str] = Counter()
+        self._versions: Counter[tuple[str, str]] = Counter()
+
+    @contextmanager
+    def track(self, origin: str) -> Iterator[None]:
+        """Count a request in flight to an origin while the block runs
+
+        Args:
+            origin (str): The origin, as returned by `catalog.origin()`
+        """
+        self._in_flight[origin] += 1
+        if self._in_flight[origin] > self._peak[origin]:
+            self._peak[origin] = self._in_flight[origin]
+        try:
+            yield
+        finally:
+            self._in_flight[origin] -= 1
+            if not self._in_flight[origin]:
+                del self._in_flight[origin]
+
+    def record_version(self, origin: str, http_version: str) -> None:
+        """Count a response by the HTTP version it came over
+
+        Args:
+            origin (str): The origin
+            http_version (str): e.g. "HTTP/2" or "HTTP/1.1"
+        """
+        self._versions[origin, http_version] += 1
+
+    def peak(self, origin: str) -> int:
+        """Return the most requests ever in flight to an origin at once"""
+        return self._peak[origin]
+
+    def versions(self, origin: str) -> dict[str, int]:
+        """Return the number of responses of an origin per HTTP version"""
+        return {
+            version: count
+            for (key, version), count in self._versions.items()
+            if key == origin
+        }
+
+    def collect(self) -> list[MetricFamily]:
+        """Metrics collector of the per-origin streams"""
+        labels = {
+            origin: f'origin="{escape_label(origin)}"' for origin in self._peak
+        }
+        return [
+            MetricFamily(
+                "app_monitor_origin_streams",
+                "gauge",
+                "Requests in flight per origin",
+                [
+                    sample(
+                        "app_monitor_origin_streams",
+                        self._in_flight[origin],
+                        label,
+                    )
+                    for origin, label in labels.items()
+                ],
+            ),
+            MetricFamily(
+                "app_monitor_origin_streams_peak",
+                "gauge",
+                "Most requests in flight at once per origin",
+                [
+                    sample(
+                        "app_monitor_origin_streams_peak",
+                        self._peak[origin],
+                        label,
+                    )
+                    for origin, label in labels.items()
+                ],
+            ),
+            MetricFamily(
+                "app_monitor_origin_responses",
+                "counter",
+                "Responses per origin and HTTP version",
+                [
+                    sample(
+                        "app_monitor_origin_responses_total",
+                        count,
+                        f'{labels[origin]},version="{version}"',
+                    )
+                    for (origin, version), count in self._versions.items()
+                ],
+            ),
+        ]
@@ -0,0 +1,310 @@
+"""Background notification dispatcher that batches and rate limits alerts."""
+
+import asyncio
+from collections import Counter
+import threading
+from typing import TYPE_CHECKING, Optional
+
+from app_monitor.app_config import AppConfig
+from app_monitor.logger import LOGGER, send_slack_notification
+
+if TYPE_CHECKING:
+    import httpx
+
+
+class NotificationDispatcher:
+    """Delivers notifications from a background task
+
+    `notify` only enqueues the message, so callers never wait on the network.
+    Messages arriving within `batch_window` seconds of each other are sent as
+    one notification, identical messages are coalesced, messages already sent
+    within `dedupe_window` seconds are suppressed and at most `rate_limit`
+    notifications are sent per second. When the bounded queue is full new
+    messages are dropped and counted.
+
+    The dispatcher runs on the caller's event loop (`start`/`stop`) or on a
+    private one in a background thread (`start_in_thread`/`stop_thread`).
+    Until it is started, messages are printed inline without a webhook, and
+    held for the webhook until it starts or stops otherwise.
+    """
+
+    def __init__(
+        self,
+        webhook_url: Optional[str] = None,
+        batch_window: float = 1.0,
+        rate_limit: float = 1.0,
+        dedupe_window: float = 300.0,
+        max_queue: int = 1000,
+        max_batch: int = 50,
+        timeout: float = 5.0,
+    ) -> None:
+        """Set up the dispatcher
+
+        Args:
+            webhook_url (Optional[str]): Where to POST notifications. When
+                    None, they are handed to `send_slack_notification`
+            batch_window (float): Seconds to wait for more messages before
+                    sending a batch
+            rate_limit (float): Maximum notifications sent per second
+            dedupe_window (float): Seconds during which a message already sent
+                    is not sent again
+            max_queue (int): Maximum messages waiting to be sent
+            max_batch (int): Maximum messages sent in one notification
+            timeout (float): Timeout of a webhook request, in seconds
+        """
+        self._webhook_url = webhook_url
+        self._batch_window = batch_window
+        self._rate_limit = rate_limit
+        self._dedupe_window = dedupe_window
+        self._max_queue = max_queue
+        self._max_batch = max_batch
+        self._timeout = timeout
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._queue: Optional[asyncio.Queue[str]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._delivery: Optional[asyncio.Task] = None
+        self._pending: list[str] = []
+        self._recently_sent: dict[str, float] = {}
+        self._tokens = 1.0
+        self._tokens_updated = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._thread_stop: Optional[asyncio.Event] = None
+        self.counters: Counter[str] = Counter()
+
+    @classmethod
+    def from_config(cls, app_config: AppConfig) -> "NotificationDispatcher":
+        """Build a dispatcher from the application configuration
+
+        Args:
+            app_config (AppConfig): The application configuration
+
+        Returns:
+            NotificationDispatcher: The dispatcher
+        """
+        return cls(
+            webhook_url=app_config.notification_webhook,
+            batch_window=app_config.notification_batch_window,
+            rate_limit=app_config.notification_rate_limit,
+            dedupe_window=app_config.notification_dedupe_window,
+        )
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def notify(self, message: str) -> None:
+        """Queue a message for delivery; safe to call from any thread
+
+        Args:
+            message (str): The message to send
+        """
+        loop = self._loop
+        if loop is None or not self.running:
+            if self._webhook_url is None:
+                send_slack_notification(message)
+                self.counters["sent"] += 1
+            elif len(self._pending) < self._max_queue:
+                self._pending.append(message)
+            else:
+                self.counters["dropped"] += 1
+        elif threading.get_ident() == self._loop_thread:
+            self._enqueue(message)
+        else:
+            loop.call_soon_threadsafe(self._enqueue, message)
+
+    def export_state(self, now: float) -> dict[str, float]:
+        """Return when recent messages were sent, for deduplication
+
+        Args:
+            now (float): The current time of the dispatcher's event loop,
+                    sending times are exported relative to it
+        """
+        return {
+            message: sent_at - now
+            for message, sent_at in self._recently_sent.items()
+            if now - sent_at < self._dedupe_window
+        }
+
+    def import_state(self, state: dict[str, float], now: float) -> None:
+        """Restore exported sending times
+
+        Args:
+            state (dict[str, float]): Returned by `export_state`
+            now (float): The loop time matching the export's `now`
+        """
+        for message, sent_at in state.items():
+            self._recently_sent[message] = now + sent_at
+
+    def _enqueue(self, message: str) -> None:
+        assert self._queue is not None
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.counters["dropped"] += 1
+            LOGGER.debug(f"Notification queue full, dropped: {message}")
+
+    async def start(self) -> None:
+        """Start delivering notifications from the running event loop"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._queue = asyncio.Queue(maxsize=self._max_queue)
+        self._tokens_updated = self._loop.time()
+        held, self._pending = self._pending, []
+        for message in held:
+            self._enqueue(message)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Send whatever is still queued, then stop"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._delivery is not None:
+            await asyncio.wait([self._delivery])
+        if self._queue is not None:
+            while not self._queue.empty():
+                self._pending.append(self._queue.get_nowait())
+        if self._pending:
+            await self._wait_for_token()
+            await self._send_pending()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self._loop = None
+
+    def start_in_thread(self) -> None:
+        """Start delivering notifications from a background thread"""
+        ready = threading.Event()
+
+        async def serve() -> None:
+            self._thread_stop = asyncio.Event()
+            await self.start()
+            ready.set()
+            await self._thread_stop.wait()
+            await self.stop()
+
+        self._thread = threading.Thread(
+            target=asyncio.run,
+            args=(serve(),),
+            name="app_monitor-notifier",
+            daemon=True,
+        )
+        self._thread.start()
+        ready.wait()
+
+    def stop_thread(self) -> None:
+        """Flush and stop the background thread started by start_in_thread"""
+        if self._thread is None:
+            return
+        if self._loop is not None and self._thread_stop is not None:
+            self._loop.call_soon_threadsafe(self._thread_stop.set)
+        self._thread.join()
+        self._thread = None
+
+    async def _run(self) -> None:
+        assert self._queue is not None
+        loop = asyncio.get_running_loop()
+        while True:
+            self._pending.append(await self._queue.get())
+            deadline = loop.time() + self._batch_window
+            while len(self._pending) < self._max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    self._pending.append(
+                        await asyncio.wait_for(self._queue.get(), timeout)
+                    )
+                except TimeoutError:
+                    break
+
+            await self._wait_for_token()
+            # Fold in what arrived while we were rate limited
+            while len(self._pending) < self._max_batch:
+                try:
+                    self._pending.append(self._queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            await self._send_pending()
+
+    async def _wait_for_token(self) -> None:
+        """Token bucket allowing `rate_limit` sends per second"""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        self._tokens = min(
+            1.0, self._tokens + (now - self._tokens_updated) * self._rate_limit
+        )
+        self._tokens_updated = now
+        if self._tokens < 1:
+            await asyncio.sleep((1 - self._tokens) / self._rate_limit)
+            self._tokens = 1.0
+            self._tokens_updated = loop.time()
+        self._tokens -= 1
+
+    def _format(self, batch: list[str], now: float) -> Optional[str]:
+        """Coalesce a batch into the text of one notification"""
+        occurrences: Counter[str] = Counter(batch)
+        lines = []
+        for message, count in occurrences.items():
+            sent_at = self._recently_sent.get(message)
+            if sent_at is not None and now - sent_at < self._dedupe_window:
+                self.counters["deduplicated"] += count
+                continue
+            self._recently_sent[message] = now
+            self.counters["deduplicated"] += count - 1
+            lines.append(message if count == 1 else f"{message} (x{count})")
+
+        if len(self._recently_sent) > 10 * self._max_queue:
+            self._recently_sent = {
+                message: sent_at
+                for message, sent_at in self._recently_sent.items()
+                if now - sent_at < self._dedupe_window
+            }
+
+        if not lines:
+            return None
+        if len(lines) == 1:
+            return lines[0]
+        return f"{len(lines)} alerts:\n" + "\n".join(
+            f"- {line}" for line in lines
+        )
+
+    async def _send_pending(self) -> None:
+        batch, self._pending = self._pending, []
+        text = self._format(batch, asyncio.get_running_loop().time())
+        if text is None:
+            return
+        # Shielded so that stopping the dispatcher does not lose a batch
+        # that is already on its way
+        self._delivery = asyncio.create_task(self._deliver(text))
+        await asyncio.shield(self._delivery)
+
+    async def _deliver(self, text: str) -> None:
+        try:
+            await self._post(text)
+        except Exception as exc:
+            self.counters["failed"] += 1
+            LOGGER.error(f"Failed to send notification: {exc!r}")
+        else:
+            self.counters["sent"] += 1
+
+    async def _post(self, text: str) -> None:
+        if self._webhook_url is None:
+            send_slack_notification(text)
+            return
+        if self._client is None:
+            # httpx is only needed once a webhook is configured, which keeps
+            # it out of the serial monitor otherwise
+            import httpx
+
+            self._client = httpx.AsyncClient(timeout=self._timeout)
+        response = await self._client.post(
+            self._webhook_url, json={"text": text}
+        )
+        response.raise_for_status()
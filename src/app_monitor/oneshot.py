@@ -0,0 +1,134 @@
+"""One-shot check of every endpoint, for cron jobs, CI gates and probes."""
+
+import asyncio
+import contextlib
+import json
+import sys
+from typing import Optional
+
+from app_monitor.app_config import AppConfig
+from app_monitor.probing import ProbeOptions
+from app_monitor.results import ProbeResult
+
+# Exit codes of `run_once`
+HEALTHY, FAILED, UNHEALTHY = 0, 1, 2
+
+
+def check_once(
+    app_config: AppConfig, serial: bool = False
+) -> list[Optional[ProbeResult]]:
+    """Probe every endpoint once, concurrently
+
+    Only the HTTP client of the chosen monitor is imported: requests for the
+    serial one, httpx for the async one.
+
+    Args:
+        app_config (AppConfig): The application configuration
+        serial (bool): Probe from threads with the serial monitor rather
+                than with the async monitor
+
+    Returns:
+        list[Optional[ProbeResult]]: The result of every endpoint, in order,
+                None when no response was received
+    """
+    if serial:
+        from app_monitor.monitor import AppMonitor
+
+        workers = min(len(app_config.endpoints), app_config.max_concurrency)
+        monitor = AppMonitor(app_config, workers=workers)
+        try:
+            return monitor.check_once()
+        finally:
+            monitor.close()
+            if monitor.store is not None:
+                monitor.store.close()
+
+    from app_monitor.async_monitor import AsyncAppMonitor
+
+    async_monitor = AsyncAppMonitor(app_config)
+    try:
+        return asyncio.run(async_monitor.check_once())
+    finally:
+        if async_monitor.store is not None:
+            async_monitor.store.close()
+
+
+def report(app_config: AppConfig, results: list[Optional[ProbeResult]]) -> dict:
+    """Summarize one-shot results
+
+    An endpoint is healthy when its probe options accept its status code, as
+    the monitors decide, and its body passed its content assertions, if any;
+    the failure says why it did not. It is slow when the monitor's warning
+    rule found it slow.
+
+    Args:
+        app_config (AppConfig): The application configuration
+        results (list[Optional[ProbeResult]]): Returned by `check_once`
+
+    Returns:
+        dict: The JSON-serializable report
+    """
+    probes = app_config.endpoint_probes or {}
+    default = ProbeOptions(app_config.probe_method, app_config.probe_max_bytes)
+    entries = []
+    for endpoint, result in zip(app_config.endpoints, results):
+        if result is None:
+            entries.append(
+                {
+                    "endpoint": endpoint,
+                    "status_code": 0,
+                    "response_time": None,
+                    "healthy": False,
+                    "slow": False,
+                    "failure": None,
+                }
+            )
+            continue
+        options = probes.get(endpoint, default)
+        entries.append(
+            {
+                "endpoint": endpoint,
+                "status_code": result.status_code,
+                "response_time": round(result.response_time, 6),
+                "healthy": options.is_healthy(result.status_code)
+                and result.failure is None,
+                "slow": result.slow,
+                "failure": result.failure,
+            }
+        )
+    unhealthy = sum(not entry["healthy"] for entry in entries)
+    return {
+        "healthy": not unhealthy,
+        "checked": len(entries),
+        "unhealthy": unhealthy,
+        "slow": sum(entry["slow"] for entry in entries),
+        "results": entries,
+    }
+
+
+def run_once(app_config: AppConfig, serial: bool = False) -> int:
+    """Check every endpoint once and print the report as JSON
+
+    Anything else the checks print, such as notifications, goes to stderr,
+    so stdout only holds the report. No report is printed when the check
+    itself could not run, e.g. because the history store could not be
+    opened.
+
+    Args:
+        app_config (AppConfig): The application configuration
+        serial (bool): Use the serial monitor
+
+    Returns:
+        int: The exit code: 0 if every endpoint is healthy, 2 if any is not
+                and 1 if the check could not run
+    """
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            results = check_once(app_config, serial)
+    except Exception as exc:
+        print(f"Check failed: {exc}", file=sys.stderr)
+        return FAILED
+    summary = report(app_config, results)
+    json.dump(summary, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return HEALTHY if summary["healthy"] else UNHEALTHY
@@ -0,0 +1,234 @@
+"""Probe methods: full GET, HEAD, capped GET, conditional GET, status line."""
+
+import threading
+from typing import TYPE_CHECKING, Mapping, NamedTuple, Optional
+
+from app_monitor.content import (
+    ASSERTION_KEYS,
+    ContentAssertions,
+    ContentCheck,
+    parse_assertions,
+)
+
+if TYPE_CHECKING:
+    # Each monitor imports its own HTTP client only
+    import httpx
+    import requests
+
+GET, HEAD, STREAM, CONDITIONAL = "GET", "HEAD", "STREAM", "CONDITIONAL"
+STATUS = "STATUS"
+PROBE_METHODS = (GET, HEAD, STREAM, CONDITIONAL, STATUS)
+
+CHUNK_SIZE = 16384
+
+# Seconds a probe waits to connect, and then for each read of the response
+PROBE_TIMEOUT = 5
+
+
+class ProbeOptions(NamedTuple):
+    """NamedTuple for how an endpoint is probed
+
+    GET reads the whole body, HEAD none. STREAM stops reading after
+    `max_bytes` bytes of body, right after the headers when 0. CONDITIONAL
+    sends the validators of the last response and reads the body only when
+    it changed, a 304 counting as healthy. STATUS sends a bare GET over a raw
+    socket and reads the status line only, without an HTTP client, following
+    no redirects (see socket_probes.py).
+
+    With content assertions, GET and STREAM read the body until they are
+    decided or their byte budget is spent, whatever `max_bytes`.
+    """
+
+    method: str = GET
+    max_bytes: int = 0
+    assertions: Optional[ContentAssertions] = None
+
+    @property
+    def http_method(self) -> str:
+        """The HTTP method sent"""
+        return "HEAD" if self.method == HEAD else "GET"
+
+    @property
+    def body_limit(self) -> Optional[int]:
+        """The most bytes of body read, None for no limit"""
+        return self.max_bytes if self.method == STREAM else None
+
+    def content_check(self) -> Optional[ContentCheck]:
+        """A new check of the content assertions, None without any"""
+        if self.assertions is None:
+            return None
+        return ContentCheck(self.assertions)
+
+    def is_healthy(self, status_code: int) -> bool:
+        """Whether a status code is the expected one"""
+        return status_code == 200 or (
+            self.method == CONDITIONAL and status_code == 304
+        )
+
+
+def parse_probe_options(
+    raw: Mapping, default: ProbeOptions = ProbeOptions()
+) -> ProbeOptions:
+    """Build the probe options of an endpoint from its configuration
+
+    Args:
+        raw (Mapping): The "method" and "max_bytes" keys and the content
+                assertions (see `content.parse_assertions`), all optional
+        default (ProbeOptions): The options of endpoints without their own
+
+    Raises:
+        ValueError: When a key or value is invalid
+
+    Returns:
+        ProbeOptions: The options
+    """
+    unknown = set(raw) - {"method", "max_bytes", *ASSERTION_KEYS}
+    if unknown:
+        raise ValueError(f"unknown probe options: {', '.join(sorted(unknown))}")
+    method = raw.get("method", default.method)
+    if not isinstance(method, str) or method.upper() not in PROBE_METHODS:
+        raise ValueError(f"'method' must be one of {', '.join(PROBE_METHODS)}")
+    max_bytes = raw.get("max_bytes", default.max_bytes)
+    if (
+        not isinstance(max_bytes, int)
+        or isinstance(max_bytes, bool)
+        or max_bytes < 0
+    ):
+        raise ValueError("'max_bytes' must be a non-negative integer")
+    assertions = parse_assertions(raw)
+    if assertions is not None and method.upper() not in (GET, STREAM):
+        raise ValueError(
+            f"content assertions need the {GET} or {STREAM} method"
+        )
+    return ProbeOptions(method.upper(), max_bytes, assertions)
+
+
+class ValidatorCache:
+    """The ETag and Last-Modified validators of the last responses
+
+    Endpoints probed with CONDITIONAL send them back in If-None-Match and
+    If-Modified-Since, so that unchanged pages are answered with a bodiless
+    304.
+    """
+
+    def __init__(self) -> None:
+        self._validators: dict[str, tuple[Optional[str], Optional[str]]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._validators)
+
+    def headers(self, endpoint: str) -> dict[str, str]:
+        """Return the conditional request headers of an endpoint
+
+        Args:
+            endpoint (str): The endpoint
+
+        Returns:
+            dict[str, str]: The headers, empty until a response had validators
+        """
+        etag, last_modified = self._validators.get(endpoint, (None, None))
+        headers = {}
+        if etag is not None:
+            headers["If-None-Match"] = etag
+        if last_modified is not None:
+            headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def update(self, endpoint: str, status_code: int, headers: Mapping) -> None:
+        """Keep the validators of a response
+
+        Args:
+            endpoint (str): The endpoint
+            status_code (int): The response status code
+            headers (Mapping): The case-insensitive response headers
+        """
+        if status_code not in (200, 304):
+            return
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+        with self._lock:
+            if status_code == 304:
+                # A 304 may omit the validators it confirms
+                old_etag, old_last_modified = self._validators.get(
+                    endpoint, (None, None)
+                )
+                etag = etag or old_etag
+                last_modified = last_modified or old_last_modified
+            if etag is None and last_modified is None:
+                self._validators.pop(endpoint, None)
+            else:
+                self._validators[endpoint] = (etag, last_modified)
+
+    def forget(self, endpoint: str) -> None:
+        """Drop the validators of an endpoint"""
+        with self._lock:
+            self._validators.pop(endpoint, None)
+
+
+async def aread_body(
+    response: "httpx.Response",
+    limit: Optional[int],
+    check: Optional[ContentCheck] = None,
+) -> int:
+    """Read and discard the body of a streamed httpx response
+
+    Args:
+        response (httpx.Response): The response, opened with `stream()`
+        limit (Optional[int]): The most bytes to read, None for all of them
+        check (Optional[ContentCheck]): Fed the decoded body instead, until
+                it is decided; `limit` is then ignored
+
+    Returns:
+        int: The number of bytes read, as received, or decoded with a check
+    """
+    read = 0
+    if check is not None:
+        async for chunk in response.aiter_bytes(CHUNK_SIZE):
+            read += len(chunk)
+            if check.feed(chunk):
+                break
+        else:
+            check.finish()
+        return read
+    if limit == 0:
+        return read
+    async for chunk in response.aiter_raw(CHUNK_SIZE):
+        read += len(chunk)
+        if limit is not None and read >= limit:
+            break
+    return read
+
+
+def read_body(
+    response: "requests.Response",
+    limit: Optional[int],
+    check: Optional[ContentCheck] = None,
+) -> int:
+    """Read and discard the body of a streamed requests response
+
+    Args:
+        response (requests.Response): The response, sent with `stream=True`
+        limit (Optional[int]): The most bytes to read, None for all of them
+        check (Optional[ContentCheck]): Fed the decoded body instead, until
+                it is decided; `limit` is then ignored
+
+    Returns:
+        int: The number of bytes read, as received, or decoded with a check
+    """
+    read = 0
+    if check is not None:
+        for chunk in response.iter_content(CHUNK_SIZE):
+            read += len(chunk)
+            if check.feed(chunk):
+                break
+        else:
+            check.finish()
+        return read
+    while limit is None or read < limit:
+        size = CHUNK_SIZE if limit is None else min(CHUNK_SIZE, limit - read)
+        chunk = response.raw.read(size, decode_content=False)
+        if not chunk:
+            break
+        read += len(chunk)
+    return read
@@ -0,0 +1,355 @@
+"""Streaming latency quantiles and slow response detection."""
+
+import math
+import time
+from typing import Iterable, Optional
+
+WARN_RULES = ("fixed", "p95", "p99", "baseline")
+
+
+class LatencySketch:
+    """DDSketch of latencies
+
+    Values are counted in logarithmic buckets, so any quantile is returned
+    within `relative_accuracy` of the true value. Memory is bounded by
+    `max_buckets`: past it the lowest buckets are collapsed, which only costs
+    accuracy on the fastest responses. Sketches with the same accuracy can be
+    merged, e.g. to combine the sketches of several worker processes.
+    """
+
+    def __init__(
+        self,
+        relative_accuracy: float = 0.01,
+        max_buckets: int = 512,
+        min_value: float = 1e-6,
+    ) -> None:
+        """Set up the sketch
+
+        Args:
+            relative_accuracy (float): The relative error of the quantiles
+            max_buckets (int): The maximum number of buckets kept
+            min_value (float): Values below this one are counted as zero
+        """
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._max_buckets = max_buckets
+        self._min_value = min_value
+        self._buckets: dict[int, int] = {}
+        self._zeros = 0
+        self.count = 0
+        self.total = 0.0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def add(self, value: float) -> None:
+        """Add a latency to the sketch
+
+        Args:
+            value (float): The latency, in seconds
+        """
+        self.count += 1
+        self.total += value
+        if value <= self._min_value:
+            self._zeros += 1
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        self._buckets[key] = self._buckets.get(key, 0) + 1
+        if len(self._buckets) > self._max_buckets:
+            self._collapse()
+
+    def _collapse(self) -> None:
+        lowest, second = sorted(self._buckets)[:2]
+        self._buckets[second] += self._buckets.pop(lowest)
+
+    def merge(self, other: "LatencySketch") -> None:
+        """Add the values of another sketch to this one
+
+        Args:
+            other (LatencySketch): A sketch with the same relative accuracy
+        """
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches of different accuracy")
+        self.count += other.count
+        self.total += other.total
+        self._zeros += other._zeros
+        for key, count in other._buckets.items():
+            self._buckets[key] = self._buckets.get(key, 0) + count
+        while len(self._buckets) > self._max_buckets:
+            self._collapse()
+
+    def quantile(self, q: float) -> float:
+        """Return the q-quantile of the values added so far
+
+        Args:
+            q (float): The quantile, between 0 and 1
+
+        Returns:
+            float: The quantile, or NaN when the sketch is empty
+        """
+        return _quantile([self], q)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else math.nan
+
+    def export_state(self) -> dict:
+        """Return the values of the sketch as JSON-serializable data"""
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "zeros": self._zeros,
+            "count": self.count,
+            "total": self.total,
+            "buckets": list(self._buckets.items()),
+        }
+
+    def import_state(self, state: dict) -> None:
+        """Replace the values of the sketch with exported ones
+
+        Args:
+            state (dict): Returned by `export_state` of a sketch with the
+                    same relative accuracy
+        """
+        if state["relative_accuracy"] != self.relative_accuracy:
+            raise ValueError("Cannot import a sketch of different accuracy")
+        self._zeros = int(state["zeros"])
+        self.count = int(state["count"])
+        self.total = float(state["total"])
+        self._buckets = {
+            int(key): int(count) for key, count in state["buckets"]
+        }
+
+
+def _quantile(sketches: Iterable[LatencySketch], q: float) -> float:
+    """Return the q-quantile of the union of sketches of the same accuracy"""
+    sketches = list(sketches)
+    count = sum(sketch.count for sketch in sketches)
+    if not count:
+        return math.nan
+    rank = q * (count - 1)
+    seen = sum(sketch._zeros for sketch in sketches)
+    if seen > rank:
+        return 0.0
+    buckets: dict[int, int] = {}
+    for sketch in sketches:
+        for key, bucket_count in sketch._buckets.items():
+            buckets[key] = buckets.get(key, 0) + bucket_count
+    gamma = sketches[0]._gamma
+    key = 0
+    for key in sorted(buckets):
+        seen += buckets[key]
+        if seen > rank:
+            break
+    return 2 * gamma**key / (gamma + 1)
+
+
+class RollingLatencySketch:
+    """Latency sketch over the last one to two windows
+
+    Values go into the current window's sketch. When a window ends it becomes
+    the previous one, so quantiles always cover between one and two windows
+    of recent probes.
+    """
+
+    def __init__(self, window: float = 300.0, **sketch_options) -> None:
+        """Set up the sketch
+
+        Args:
+            window (float): The window length, in seconds
+            sketch_options: Passed on to LatencySketch
+        """
+        self._window = window
+        self._sketch_options = sketch_options
+        self._current = LatencySketch(**sketch_options)
+        self._previous = LatencySketch(**sketch_options)
+        self._window_start: Optional[float] = None
+
+    def __len__(self) -> int:
+        return self._current.count + self._previous.count
+
+    def _rotate(self, now: float) -> None:
+        if self._window_start is None:
+            self._window_start = now
+        elapsed = now - self._window_start
+        if elapsed < self._window:
+            return
+        if elapsed < 2 * self._window:
+            self._previous = self._current
+        else:
+            self._previous = LatencySketch(**self._sketch_options)
+        self._current = LatencySketch(**self._sketch_options)
+        self._window_start = now - elapsed % self._window
+
+    def add(self, value: float, now: Optional[float] = None) -> None:
+        """Add a latency
+
+        Args:
+            value (float): The latency, in seconds
+            now (Optional[float]): The current monotonic time
+        """
+        self._rotate(time.monotonic() if now is None else now)
+        self._current.add(value)
+
+    def quantile(self, q: float, now: Optional[float] = None) -> float:
+        """Return the q-quantile of the recent latencies
+
+        Args:
+            q (float): The quantile, between 0 and 1
+            now (Optional[float]): The current monotonic time
+        """
+        self._rotate(time.monotonic() if now is None else now)
+        return _quantile((self._current, self._previous), q)
+
+    def snapshot(self) -> LatencySketch:
+        """Return a mergeable copy of the recent latencies"""
+        sketch = LatencySketch(**self._sketch_options)
+        sketch.merge(self._previous)
+        sketch.merge(self._current)
+        return sketch
+
+    def export_state(self, now: float) -> dict:
+        """Return the windows as JSON-serializable data
+
+        Args:
+            now (float): The current monotonic time, window times are
+                    exported relative to it
+        """
+        start = self._window_start
+        return {
+            "window_start": None if start is None else start - now,
+            "current": self._current.export_state(),
+            "previous": self._previous.export_state(),
+        }
+
+    def import_state(self, state: dict, now: float) -> None:
+        """Replace the windows with exported ones
+
+        Args:
+            state (dict): Returned by `export_state`
+            now (float): The monotonic time matching the export's `now`
+        """
+        start = state["window_start"]
+        self._window_start = None if start is None else now + start
+        self._current.import_state(state["current"])
+        self._previous.import_state(state["previous"])
+
+
+class SlowResponseDetector:
+    """Decides whether a response was slow, per endpoint
+
+    Rules:
+        fixed: the response time is above the warning threshold
+        p95, p99: the endpoint's rolling p95/p99 is above the threshold
+        baseline: the response time is `baseline_factor` times the
+                  endpoint's rolling median
+
+    Sketch-based rules stay silent until `min_samples` probes were seen.
+    """
+
+    def __init__(
+        self,
+        rule: str = "fixed",
+        baseline_factor: float = 3.0,
+        window: float = 300.0,
+        min_samples: int = 20,
+    ) -> None:
+        """Set up the detector
+
+        Args:
+            rule (str): One of "fixed", "p95", "p99" or "baseline"
+            baseline_factor (float): See the baseline rule
+            window (float): The window of the rolling sketches, in seconds
+            min_samples (int): The probes needed before sketch-based rules
+                    apply
+        """
+        if rule not in WARN_RULES:
+            raise ValueError(f"Unknown warning rule: {rule}")
+        self._rule = rule
+        self._baseline_factor = baseline_factor
+        self._window = window
+        self._min_samples = min_samples
+        self._sketches: dict[str, RollingLatencySketch] = {}
+
+    def sketch(self, endpoint: str) -> Optional[RollingLatencySketch]:
+        """Return the rolling latency sketch of an endpoint"""
+        return self._sketches.get(endpoint)
+
+    def remove_endpoint(self, endpoint: str) -> None:
+        """Forget the latencies of an endpoint"""
+        self._sketches.pop(endpoint, None)
+
+    def export_state(self, now: float) -> dict[str, dict]:
+        """Return the sketch of every endpoint as JSON-serializable data
+
+        Args:
+            now (float): The current monotonic time
+        """
+        return {
+            endpoint: sketch.export_state(now)
+            for endpoint, sketch in self._sketches.items()
+        }
+
+    def import_state(self, state: dict[str, dict], now: float) -> None:
+        """Restore exported endpoint sketches
+
+        Args:
+            state (dict[str, dict]): Returned by `export_state`
+            now (float): The monotonic time matching the export's `now`
+        """
+        for endpoint, sketch_state in state.items():
+            sketch = RollingLatencySketch(self._window)
+            sketch.import_state(sketch_state, now)
+            self._sketches[endpoint] = sketch
+
+    def check(
+        self,
+        endpoint: str,
+        response_time: float,
+        threshold: float | int,
+        now: Optional[float] = None,
+    ) -> Optional[str]:
+        """Record a successful response and tell whether it was slow
+
+        Args:
+            endpoint (str): The endpoint
+            response_time (float): The response time, in seconds
+            threshold (float | int): The warning threshold, in seconds
+            now (Optional[float]): The current monotonic time
+
+        Returns:
+            Optional[str]: Why the endpoint is slow, or None
+        """
+        if now is None:
+            now = time.monotonic()
+        sketch = self._sketches.get(endpoint)
+        if sketch is None:
+            sketch = self._sketches[endpoint] = RollingLatencySketch(
+                self._window
+            )
+
+        reason = None
+        if self._rule == "fixed":
+            if response_time > threshold:
+                reason = (
+                    f"took too long to respond: {response_time:.2f} seconds"
+                )
+        elif self._rule == "baseline":
+            if len(sketch) >= self._min_samples:
+                median = sketch.quantile(0.5, now)
+                if response_time > self._baseline_factor * median:
+                    reason = (
+                        f"took too long to respond: {response_time:.2f} "
+                        f"seconds ({response_time / median:.1f}x its median "
+                        f"of {median:.2f} seconds)"
+                    )
+        sketch.add(response_time, now)
+
+        if self._rule in ("p95", "p99") and len(sketch) >= self._min_samples:
+            value = sketch.quantile(0.95 if self._rule == "p95" else 0.99, now)
+            if value > threshold:
+                reason = (
+                    f"{self._rule} response time is {value:.2f} seconds "
+                    f"over the last {self._window:g} seconds"
+                )
+        return reason
@@ -0,0 +1,105 @@
+"""Reloads the configuration file while the monitor runs."""
+
+import asyncio
+import os
+from pathlib import Path
+import signal
+from typing import Callable, Optional
+
+from app_monitor.app_config import (
+    AppConfig,
+    ConfigValidationError,
+    load_config,
+)
+from app_monitor.logger import LOGGER
+
+
+class ConfigWatcher:
+    """Reloads the configuration when its file changes or on SIGHUP
+
+    The file is polled with `stat`, which costs one system call per poll. A
+    file that fails to load or validate is logged and ignored, so the monitor
+    keeps running with the last good configuration.
+    """
+
+    def __init__(
+        self,
+        config_path: Path,
+        apply: Callable[[AppConfig], None],
+        poll_interval: float = 5.0,
+    ) -> None:
+        """Set up the watcher
+
+        Args:
+            config_path (Path): The configuration file
+            apply (Callable[[AppConfig], None]): Called with every
+                    configuration reloaded successfully
+            poll_interval (float): Seconds between two checks of the file,
+                    0 to only reload on SIGHUP
+        """
+        self._config_path = config_path
+        self._apply = apply
+        self._poll_interval = poll_interval
+        self._signature = self._stat()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _stat(self) -> Optional[tuple[int, int, int]]:
+        try:
+            stat = os.stat(self._config_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def reload(self) -> bool:
+        """Load the configuration file and apply it
+
+        Returns:
+            bool: Whether the configuration was applied
+        """
+        self._signature = self._stat()
+        try:
+            app_config = load_config(self._config_path)
+        except (OSError, ConfigValidationError, TypeError) as exc:
+            LOGGER.error(
+                f"Keeping the current configuration, failed to reload "
+                f"{self._config_path}: {exc}"
+            )
+            return False
+        self._apply(app_config)
+        return True
+
+    def check(self) -> bool:
+        """Reload the configuration if its file changed since the last load
+
+        Returns:
+            bool: Whether the configuration was applied
+        """
+        if self._stat() == self._signature:
+            return False
+        return self.reload()
+
+    def install_signal_handler(self) -> bool:
+        """Reload on SIGHUP, from the running event loop
+
+        Returns:
+            bool: False where SIGHUP is not available
+        """
+        if not hasattr(signal, "SIGHUP"):
+            return False
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_signal_handler(signal.SIGHUP, self.reload)
+        return True
+
+    def remove_signal_handler(self) -> None:
+        """Stop reloading on SIGHUP"""
+        if self._loop is not None:
+            self._loop.remove_signal_handler(signal.SIGHUP)
+            self._loop = None
+
+    async def run(self) -> None:
+        """Poll the file until cancelled"""
+        if self._poll_interval <= 0:
+            return
+        while True:
+            await asyncio.sleep(self._poll_interval)
+            self.check()
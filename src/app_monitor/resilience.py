@@ -0,0 +1,266 @@
+"""Retry backoff, retry budget and per-host circuit breakers."""
+
+import random
+import threading
+import time
+from typing import Optional
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised when a probe is short-circuited by an open breaker"""
+
+
+def backoff_delay(
+    attempt: int,
+    base: float,
+    cap: float,
+    rng: Optional[random.Random] = None,
+) -> float:
+    """Return how long to wait before a retry, with full jitter
+
+    The delay is drawn uniformly between 0 and `base * 2**attempt`, capped at
+    `cap`, so that probes failing together do not retry together.
+
+    Args:
+        attempt (int): The number of retries already made
+        base (float): The delay bound of the first retry, in seconds
+        cap (float): The maximum delay, in seconds
+        rng (Optional[random.Random]): The random generator
+
+    Returns:
+        float: The delay, in seconds
+    """
+    bound = min(cap, base * 2**attempt)
+    return (rng or random).uniform(0, bound)
+
+
+class RetryBudget:
+    """Token bucket limiting retries to a share of the probes
+
+    Every probe deposits `ratio` tokens and every retry spends one, so retries
+    stay below `ratio` times the probe rate. `min_per_second` tokens are added
+    each second so that a few retries are always possible. When most probes
+    fail, e.g. during a large outage, the budget runs out and failing probes
+    are given up after their first attempt.
+    """
+
+    def __init__(
+        self,
+        ratio: float = 0.2,
+        min_per_second: float = 1.0,
+        max_tokens: float = 100.0,
+    ) -> None:
+        """Set up the budget
+
+        Args:
+            ratio (float): Retries allowed per probe
+            min_per_second (float): Retries always allowed per second
+            max_tokens (float): The most retries that can be saved up
+        """
+        self._ratio = ratio
+        self._min_per_second = min_per_second
+        self._max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, amount: float, now: Optional[float]) -> None:
+        if now is None:
+            now = time.monotonic()
+        amount += max(0.0, now - self._updated) * self._min_per_second
+        self._updated = now
+        self._tokens = min(self._max_tokens, self._tokens + amount)
+
+    def record_probe(self, now: Optional[float] = None) -> None:
+        """Deposit the share of a new probe
+
+        Args:
+            now (Optional[float]): The current monotonic time
+        """
+        with self._lock:
+            self._refill(self._ratio, now)
+
+    def try_spend(self, now: Optional[float] = None) -> bool:
+        """Take a token for a retry
+
+        Args:
+            now (Optional[float]): The current monotonic time
+
+        Returns:
+            bool: Whether the retry is allowed
+        """
+        with self._lock:
+            self._refill(0.0, now)
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class _Breaker:
+    __slots__ = ("state", "failures", "opened_at", "reset_timeout")
+
+    def __init__(self, reset_timeout: float) -> None:
+        self.state = CLOSED
+        self.failures = 0
+        # When the breaker opened or, half-open, when the last trial started
+        self.opened_at = 0.0
+        self.reset_timeout = reset_timeout
+
+
+class CircuitBreakers:
+    """Per-host circuit breakers
+
+    A host's breaker opens after `failure_threshold` consecutive connection
+    failures and probes to the host are then short-circuited. After
+    `reset_timeout` seconds the breaker is half-open: a single trial probe is
+    let through, which closes the breaker if it connects or opens it again
+    for twice as long, up to `max_reset_timeout`, if it fails.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        max_reset_timeout: float = 300.0,
+    ) -> None:
+        """Set up the breakers
+
+        Args:
+            failure_threshold (int): Consecutive failures opening a breaker
+            reset_timeout (float): Seconds before the first trial probe
+            max_reset_timeout (float): The longest wait between trial probes
+        """
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._max_reset_timeout = max_reset_timeout
+        self._breakers: dict[str, _Breaker] = {}
+        self._lock = threading.Lock()
+
+    def state(self, host: str) -> str:
+        """Return the state of a host's breaker: closed, open or half_open"""
+        breaker = self._breakers.get(host)
+        return CLOSED if breaker is None else breaker.state
+
+    def open_hosts(self) -> list[str]:
+        """Return the hosts whose breaker is not closed"""
+        return [
+            host
+            for host, breaker in self._breakers.items()
+            if breaker.state != CLOSED
+        ]
+
+    def export_state(self, now: float) -> dict[str, list]:
+        """Return the breakers not closed as JSON-serializable data
+
+        Args:
+            now (float): The current monotonic time, opening times are
+                    exported relative to it
+        """
+        with self._lock:
+            return {
+                host: [
+                    breaker.state,
+                    breaker.failures,
+                    breaker.opened_at - now,
+                    breaker.reset_timeout,
+                ]
+                for host, breaker in self._breakers.items()
+            }
+
+    def import_state(self, state: dict[str, list], now: float) -> None:
+        """Restore exported breakers
+
+        Args:
+            state (dict[str, list]): Returned by `export_state`
+            now (float): The monotonic time matching the export's `now`
+        """
+        with self._lock:
+            for host, (
+                breaker_state,
+                failures,
+                opened_at,
+                reset_timeout,
+            ) in state.items():
+                if breaker_state not in (CLOSED, OPEN, HALF_OPEN):
+                    raise ValueError(f"Invalid breaker state {breaker_state}")
+                breaker = _Breaker(float(reset_timeout))
+                breaker.state = breaker_state
+                breaker.failures = int(failures)
+                breaker.opened_at = now + opened_at
+                self._breakers[host] = breaker
+
+    def allow(self, host: str, now: Optional[float] = None) -> bool:
+        """Tell whether a probe to a host may be sent
+
+        Args:
+            host (str): The host
+            now (Optional[float]): The current monotonic time
+
+        Returns:
+            bool: False when the probe is short-circuited
+        """
+        breaker = self._breakers.get(host)
+        if breaker is None or breaker.state == CLOSED:
+            return True
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            if now - breaker.opened_at < breaker.reset_timeout:
+                # Still open, or a trial probe is under way. A trial that
+                # never reported back is replaced after the same delay
+                return False
+            breaker.state = HALF_OPEN
+            breaker.opened_at = now
+            return True
+
+    def record_success(self, host: str) -> bool:
+        """Record that a probe reached the host
+
+        Args:
+            host (str): The host
+
+        Returns:
+            bool: Whether the host's breaker was open and is now closed
+        """
+        if host not in self._breakers:
+            return False
+        # Only failing hosts are kept
+        with self._lock:
+            breaker = self._breakers.pop(host, None)
+        return breaker is not None and breaker.state != CLOSED
+
+    def record_failure(self, host: str, now: Optional[float] = None) -> bool:
+        """Record that a probe could not connect to the host
+
+        Args:
+            host (str): The host
+            now (Optional[float]): The current monotonic time
+
+        Returns:
+            bool: Whether the breaker was closed and just opened
+        """
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = self._breakers[host] = _Breaker(self._reset_timeout)
+            if breaker.state == OPEN:
+                return False
+            if breaker.state == HALF_OPEN:
+                # The trial failed, wait longer before the next one
+                breaker.reset_timeout = min(
+                    2 * breaker.reset_timeout, self._max_reset_timeout
+                )
+                opened = False
+            else:
+                breaker.failures += 1
+                if breaker.failures < self._failure_threshold:
+                    return False
+                opened = True
+            breaker.state = OPEN
+            breaker.opened_at = now
+            return opened
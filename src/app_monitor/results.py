@@ -0,0 +1,46 @@
+"""Records describing the outcome of a probe."""
+
+from typing import Callable, NamedTuple, Optional
+
+from app_monitor.history import is_error
+
+
+class PhaseTimings(NamedTuple):
+    """NamedTuple for where the time of a probe went, in seconds
+
+    DNS, connect and TLS are 0 when an open connection was reused. TTFB runs
+    from sending the request to receiving the response headers.
+    """
+
+    dns: float
+    connect: float
+    tls: float
+    ttfb: float
+    body: float
+    total: float
+    new_connection: bool
+
+
+class ProbeResult(NamedTuple):
+    """NamedTuple for the probe result
+
+    A status code of 0 means no response was received. For failed probes the
+    response time is the time spent until the failure. Slow is set by the
+    monitor when its warning rule found a healthy response slow, and failure
+    to why a response failed its content assertions, its status code kept.
+    """
+
+    endpoint: str
+    status_code: int
+    response_time: float
+    timings: Optional[PhaseTimings] = None
+    slow: bool = False
+    failure: Optional[str] = None
+
+    @property
+    def is_error(self) -> bool:
+        """Whether the probe counts as an error, status or content"""
+        return self.failure is not None or is_error(self.status_code)
+
+
+ResultListener = Callable[[ProbeResult], None]
@@ -0,0 +1,116 @@
+"""Deadline scheduler used to dispatch endpoint probes on their own cadence."""
+
+import heapq
+import itertools
+import math
+from typing import Iterator, Optional
+
+# Heap entry layout: [due, sequence, key, interval]. A removed entry keeps its
+# slot in the heap with key set to None and is discarded lazily.
+_DUE, _SEQ, _KEY, _INTERVAL = range(4)
+
+
+class DeadlineScheduler:
+    """Min-heap of per-endpoint deadlines
+
+    Every key keeps its own next-due time. A due key is re-armed one interval
+    after the time it was *scheduled* for, not after its probe completes, so
+    the period does not drift. Dispatching a key costs O(log n).
+    """
+
+    def __init__(self) -> None:
+        self._heap: list[list] = []
+        self._entries: dict[str, list] = {}
+        self._removed = 0
+        self._sequence = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._entries
+
+    def add(self, key: str, interval: float, due: float) -> None:
+        """Schedule a key
+
+        Args:
+            key (str): The key to schedule, usually an endpoint URL
+            interval (float): The period, in seconds, between two deadlines
+            due (float): The first deadline, on the event loop's clock
+        """
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        if key in self._entries:
+            self.remove(key)
+        entry = [due, next(self._sequence), key, interval]
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+
+    def remove(self, key: str) -> None:
+        """Stop scheduling a key
+
+        Args:
+            key (str): The key to remove
+        """
+        entry = self._entries.pop(key)
+        entry[_KEY] = None
+        self._removed += 1
+        if self._removed > len(self._heap) // 2:
+            self._compact()
+
+    def set_interval(self, key: str, interval: float) -> None:
+        """Change the period of a key, keeping the phase of its last deadline
+
+        Args:
+            key (str): The scheduled key
+            interval (float): The new period, in seconds
+        """
+        entry = self._entries[key]
+        if interval != entry[_INTERVAL]:
+            self.add(key, interval, entry[_DUE] - entry[_INTERVAL] + interval)
+
+    def deadlines(self) -> Iterator[tuple[str, float, float]]:
+        """Yield every key with its next deadline and interval, unordered"""
+        for key, entry in self._entries.items():
+            yield key, entry[_DUE], entry[_INTERVAL]
+
+    def next_due(self) -> Optional[float]:
+        """Return the earliest deadline or None if nothing is scheduled"""
+        heap = self._heap
+        while heap and heap[0][_KEY] is None:
+            heapq.heappop(heap)
+            self._removed -= 1
+        return heap[0][_DUE] if heap else None
+
+    def pop_due(self, now: float) -> Iterator[tuple[str, float]]:
+        """Yield every key whose deadline has passed and re-arm it
+
+        Deadlines missed entirely, e.g. after the loop was blocked, are
+        skipped rather than fired back to back, keeping the original phase.
+
+        Args:
+            now (float): The current time, on the event loop's clock
+
+        Yields:
+            tuple[str, float]: The key and the deadline it was due at
+        """
+        while self._heap and self._heap[0][_DUE] <= now:
+            entry = self._heap[0]
+            key = entry[_KEY]
+            if key is None:
+                heapq.heappop(self._heap)
+                self._removed -= 1
+                continue
+            due = entry[_DUE]
+            interval = entry[_INTERVAL]
+            missed = math.floor((now - due) / interval)
+            entry[_DUE] = due + interval * (missed + 1)
+            entry[_SEQ] = next(self._sequence)
+            heapq.heapreplace(self._heap, entry)
+            yield key, due
+
+    def _compact(self) -> None:
+        """Drop removed entries from the heap"""
+        self._heap = [entry for entry in self._heap if entry[_KEY] is not None]
+        heapq.heapify(self._heap)
+        self._removed = 0
@@ -0,0 +1,258 @@
+"""Outbound rate shaping and phase spreading of the probes."""
+
+import asyncio
+from collections import Counter
+import time
+from typing import Optional
+import zlib
+
+from app_monitor.metrics import MetricFamily, escape_label, sample
+
+
+def phase_offset(endpoint: str, interval: float) -> float:
+    """Return the stable offset of an endpoint within its check interval
+
+    The CRC32 of the URL spreads endpoints evenly over the interval, and the
+    same endpoint always gets the same offset, across restarts and hosts.
+
+    Args:
+        endpoint (str): The endpoint
+        interval (float): The check interval, in seconds
+
+    Returns:
+        float: The offset, between 0 and `interval`
+    """
+    return zlib.crc32(endpoint.encode()) / 2**32 * interval
+
+
+def next_phase(
+    endpoint: str,
+    interval: float,
+    now: float,
+    wall_now: Optional[float] = None,
+) -> float:
+    """Return the first deadline of an endpoint at its phase offset
+
+    Phases are aligned on the wall clock, so an endpoint is checked at the
+    same second of every interval whichever host checks it.
+
+    Args:
+        endpoint (str): The endpoint
+        interval (float): The check interval, in seconds
+        now (float): The current time of the clock of the deadline
+        wall_now (Optional[float]): The current UNIX time
+
+    Returns:
+        float: The deadline, between `now` and `now + interval`
+    """
+    if wall_now is None:
+        wall_now = time.time()
+    wait = (phase_offset(endpoint, interval) - wall_now) % interval
+    return now + wait
+
+
+class TokenBucket:
+    """Token bucket handing out tokens at `rate` per second
+
+    Tokens are reserved rather than polled: a caller takes its token at once,
+    letting the balance go negative, and is told how long to wait for it.
+    Waiters are thus served in order and paced exactly `1 / rate` apart,
+    without retrying.
+    """
+
+    def __init__(self, rate: float, burst: float = 1.0) -> None:
+        """Set up a full bucket
+
+        Args:
+            rate (float): Tokens added per second
+            burst (float): Tokens the bucket holds, taken without waiting
+        """
+        self.rate = rate
+        self._burst = burst
+        self._tokens = burst
+        self._updated: Optional[float] = None
+
+    def reserve(self, now: float) -> float:
+        """Take a token
+
+        Args:
+            now (float): The current monotonic time
+
+        Returns:
+            float: Seconds to wait before using the token
+        """
+        if self._updated is not None:
+            self._tokens = min(
+                self._burst, self._tokens + (now - self._updated) * self.rate
+            )
+        self._updated = now
+        self._tokens -= 1
+        return max(0.0, -self._tokens / self.rate)
+
+
+class _RateMeter:
+    """Events per second over the last `window` seconds, in 1s buckets"""
+
+    __slots__ = ("_counts", "_second")
+
+    def __init__(self, window: int = 10) -> None:
+        self._counts = [0] * window
+        self._second = 0
+
+    def _advance(self, second: int) -> None:
+        window = len(self._counts)
+        for stale in range(
+            self._second + 1, min(second, self._second + window) + 1
+        ):
+            self._counts[stale % window] = 0
+        self._second = max(self._second, second)
+
+    def add(self, now: float) -> None:
+        second = int(now)
+        self._advance(second)
+        self._counts[second % len(self._counts)] += 1
+
+    def rate(self, now: float) -> float:
+        self._advance(int(now))
+        return sum(self._counts) / len(self._counts)
+
+
+class RateShaper:
+    """Global and per-origin limits of the probes sent per second
+
+    A probe first waits for its origin's bucket, then for the global one, so
+    probes held back by a busy origin do not use up the global rate.
+    """
+
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        origin_rate: Optional[float] = None,
+        origin_rates: Optional[dict[str, float]] = None,
+    ) -> None:
+        """Set up the shaper
+
+        Args:
+            rate (Optional[float]): Probes per second across all origins,
+                    None for no limit
+            origin_rate (Optional[float]): Probes per second to any one
+                    origin, None for no limit
+            origin_rates (Optional[dict[str, float]]): Probes per second to
+                    specific origins, overriding `origin_rate`
+        """
+        self._global = None if rate is None else TokenBucket(rate)
+        self._origin_rate = origin_rate
+        self._origin_rates = origin_rates or {}
+        self._buckets: dict[str, TokenBucket] = {}
+        self._meter = _RateMeter()
+        self.counters: Counter[str] = Counter()
+        self.throttled_seconds = {"global": 0.0, "origin": 0.0}
+
+    @property
+    def enabled(self) -> bool:
+        return (
+            self._global is not None
+            or self._origin_rate is not None
+            or bool(self._origin_rates)
+        )
+
+    def _bucket(self, origin: str) -> Optional[TokenBucket]:
+        bucket = self._buckets.get(origin)
+        if bucket is None:
+            rate = self._origin_rates.get(origin, self._origin_rate)
+            if rate is None:
+                return None
+            bucket = self._buckets[origin] = TokenBucket(rate)
+        return bucket
+
+    async def acquire(self, origin: str) -> float:
+        """Wait until a probe to an origin may be sent
+
+        Args:
+            origin (str): The origin, as returned by `catalog.origin()`
+
+        Returns:
+            float: The seconds waited
+        """
+        loop = asyncio.get_running_loop()
+        waited = 0.0
+        for scope, bucket in (
+            ("origin", self._bucket(origin)),
+            ("global", self._global),
+        ):
+            if bucket is None:
+                continue
+            delay = bucket.reserve(loop.time())
+            if delay > 0:
+                self.counters[scope] += 1
+                self.throttled_seconds[scope] += delay
+                await asyncio.sleep(delay)
+                waited += delay
+        self.counters["sent"] += 1
+        self._meter.add(loop.time())
+        return waited
+
+    def rate(self, now: Optional[float] = None) -> float:
+        """Return the probes sent per second over the last 10 seconds"""
+        if now is None:
+            now = asyncio.get_running_loop().time()
+        return self._meter.rate(now)
+
+    def collect(self) -> list[MetricFamily]:
+        """Metrics collector of the achieved and throttled rates"""
+        families = [
+            MetricFamily(
+                "app_monitor_probe_rate",
+                "gauge",
+                "Probes sent per second over the last 10 seconds",
+                [
+                    sample(
+                        "app_monitor_probe_rate",
+                        self._meter.rate(time.monotonic()),
+                    )
+                ],
+            ),
+            MetricFamily(
+                "app_monitor_throttled_probes",
+                "counter",
+                "Probes delayed by a rate limit",
+                [
+                    sample(
+                        "app_monitor_throttled_probes_total",
+                        self.counters[scope],
+                        f'scope="{scope}"',
+                    )
+                    for scope in ("global", "origin")
+                ],
+            ),
+            MetricFamily(
+                "app_monitor_throttled_seconds",
+                "counter",
+                "Time probes were delayed by a rate limit",
+                [
+                    sample(
+                        "app_monitor_throttled_seconds_total",
+                        self.throttled_seconds[scope],
+                        f'scope="{scope}"',
+                    )
+                    for scope in ("global", "origin")
+                ],
+            ),
+        ]
+        if self._origin_rate is not None or self._origin_rates:
+            families.append(
+                MetricFamily(
+                    "app_monitor_origin_rate_limit",
+                    "gauge",
+                    "Probes per second allowed per origin",
+                    [
+                        sample(
+                            "app_monitor_origin_rate_limit",
+                            bucket.rate,
+                            f'origin="{escape_label(origin)}"',
+                        )
+                        for origin, bucket in self._buckets.items()
+                    ],
+                )
+            )
+        return families
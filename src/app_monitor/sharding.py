@@ -0,0 +1,316 @@
+"""Shards the endpoints across worker processes, one event loop each."""
+
+import asyncio
+from collections import Counter
+import logging
+import math
+import multiprocessing
+from multiprocessing.process import BaseProcess
+from pathlib import Path
+import queue
+import signal
+import time
+from typing import Callable, NamedTuple, Optional
+
+from app_monitor.app_config import AppConfig
+from app_monitor.async_monitor import AsyncAppMonitor, ProbeResult
+from app_monitor.catalog import group_by_origin
+from app_monitor.logger import LOGGER, set_file_handler, set_logging_level
+from app_monitor.quantiles import LatencySketch
+
+
+class ShardReport(NamedTuple):
+    """NamedTuple for the periodic report a worker sends to its parent"""
+
+    shard: int
+    counters: dict[str, int]
+    results: dict[str, ProbeResult]
+    latency: LatencySketch
+
+
+def shard_endpoints(endpoints: list[str], shards: int) -> list[list[str]]:
+    """Split endpoints into balanced shards
+
+    Endpoints of the same origin are kept in the same shard so that each
+    worker reuses its connections. Origins are assigned largest first to the
+    least loaded shard, and an origin with more than a fair share of endpoints
+    is split.
+    The assignment only depends on the endpoints, not on their order.
+
+    Args:
+        endpoints (list[str]): The endpoints to split
+        shards (int): The number of shards
+
+    Returns:
+        list[list[str]]: The endpoints of every shard
+    """
+    by_origin = group_by_origin(sorted(endpoints))
+
+    fair_share = max(1, math.ceil(len(endpoints) / shards))
+    groups = [
+        origin_endpoints[i : i + fair_share]
+        for origin_endpoints in by_origin.values()
+        for i in range(0, len(origin_endpoints), fair_share)
+    ]
+    groups.sort(key=lambda group: (-len(group), group[0]))
+
+    result: list[list[str]] = [[] for _ in range(shards)]
+    for group in groups:
+        min(result, key=len).extend(group)
+    return result
+
+
+async def _report_periodically(
+    shard: int,
+    monitor: AsyncAppMonitor,
+    reports: multiprocessing.Queue,
+    report_interval: float,
+) -> None:
+    """Send the counters, results and latencies collected since the last
+    report"""
+    latest: dict[str, ProbeResult] = {}
+    latency = LatencySketch()
+
+    def collect(result: ProbeResult) -> None:
+        latest[result.endpoint] = result
+        if not result.is_error:
+            latency.add(result.response_time)
+
+    monitor.add_result_listener(collect)
+    reported: Counter[str] = Counter()
+    while True:
+        await asyncio.sleep(report_interval)
+        counters = monitor.counters.copy()
+        reports.put(
+            ShardReport(
+                shard=shard,
+                counters=dict(counters - reported),
+                results=latest.copy(),
+                latency=latency,
+            )
+        )
+        reported = counters
+        latest.clear()
+        latency = LatencySketch()
+
+
+async def _monitor_shard(
+    shard: int,
+    app_config: AppConfig,
+    reports: multiprocessing.Queue,
+    report_interval: float,
+) -> None:
+    monitor = AsyncAppMonitor(app_config)
+    try:
+        # Stop gracefully, saving the checkpoint, when the parent stops us
+        asyncio.get_running_loop().add_signal_handler(
+            signal.SIGTERM, monitor.stop
+        )
+    except NotImplementedError:
+        pass
+    reporter = asyncio.create_task(
+        _report_periodically(shard, monitor, reports, report_interval)
+    )
+    try:
+        await monitor.supervisor()
+    finally:
+        reporter.cancel()
+
+
+def run_shard(
+    shard: int,
+    app_config: AppConfig,
+    reports: multiprocessing.Queue,
+    report_interval: float,
+    log_path: Optional[Path],
+    log_level: int,
+) -> None:
+    """Entry point of a worker process
+
+    Args:
+        shard (int): The index of the shard
+        app_config (AppConfig): The configuration restricted to the shard's
+                    endpoints
+        reports (multiprocessing.Queue): Where to send ShardReport objects
+        report_interval (float): Seconds between two reports
+        log_path (Optional[Path]): The log file shared by all processes
+        log_level (int): The logging level
+    """
+    if log_path is not None:
+        set_file_handler(log_path)
+    set_logging_level(log_level)
+    try:
+        asyncio.run(_monitor_shard(shard, app_config, reports, report_interval))
+    except KeyboardInterrupt:
+        pass
+
+
+ShardTarget = Callable[
+    [int, AppConfig, multiprocessing.Queue, float, Optional[Path], int], None
+]
+
+
+class ShardedMonitor:
+    """Runs one AsyncAppMonitor per process and merges their reports"""
+
+    RUN = True
+
+    def __init__(
+        self,
+        app_config: AppConfig,
+        processes: int,
+        log_path: Optional[Path] = None,
+        log_level: int = logging.WARNING,
+        report_interval: float = 5.0,
+        restart_delay: float = 1.0,
+        target: ShardTarget = run_shard,
+    ) -> None:
+        """Set up the sharded monitor
+
+        Args:
+            app_config (AppConfig): The application configuration
+            processes (int): The number of worker processes
+            log_path (Optional[Path]): The log file shared by all processes
+            log_level (int): The logging level of the workers
+            report_interval (float): Seconds between two worker reports
+            restart_delay (float): Minimum seconds between two starts of the
+                    same worker, so a worker crashing on start does not spin
+            target (ShardTarget): The worker entry point
+        """
+        self._app_config = app_config
+        self._log_path = log_path
+        self._log_level = log_level
+        self._report_interval = report_interval
+        self._restart_delay = restart_delay
+        self._target = target
+        self._context = multiprocessing.get_context("spawn")
+        self._reports: multiprocessing.Queue = self._context.Queue()
+        self._shards = [
+            shard
+            for shard in shard_endpoints(app_config.endpoints, processes)
+            if shard
+        ]
+        self._processes: list[Optional[BaseProcess]] = [None] * len(
+            self._shards
+        )
+        self._started_at = [0.0] * len(self._shards)
+        self.counters: Counter[str] = Counter()
+        self.results: dict[str, ProbeResult] = {}
+        self.latency = LatencySketch()
+
+    def _start(self, shard: int) -> None:
+        app_config = self._app_config._replace(endpoints=self._shards[shard])
+        if app_config.metrics_port is not None:
+            # Every worker serves its own metrics, on consecutive ports
+            app_config = app_config._replace(
+                metrics_port=app_config.metrics_port + shard
+            )
+        if app_config.store_path is not None:
+            # Stores are not shared between processes; the query reads all
+            app_config = app_config._replace(
+                store_path=str(Path(app_config.store_path) / f"shard-{shard}")
+            )
+        if app_config.checkpoint_path is not None:
+            app_config = app_config._replace(
+                checkpoint_path=f"{app_config.checkpoint_path}.shard-{shard}"
+            )
+        process = self._context.Process(
+            target=self._target,
+            args=(
+                shard,
+                app_config,
+                self._reports,
+                self._report_interval,
+                self._log_path,
+                self._log_level,
+            ),
+            name=f"app_monitor-shard-{shard}",
+            daemon=True,
+        )
+        process.start()
+        self._processes[shard] = process
+        self._started_at[shard] = time.monotonic()
+
+    def start(self) -> None:
+        """Start every worker"""
+        for shard in range(len(self._shards)):
+            self._start(shard)
+
+    def poll(self, timeout: float = 1.0) -> int:
+        """Merge pending reports and restart workers that died
+
+        Args:
+            timeout (float): How long to wait for the first report
+
+        Returns:
+            int: The number of reports merged
+        """
+        merged = 0
+        try:
+            report = self._reports.get(timeout=timeout)
+            while True:
+                self.counters.update(report.counters)
+                self.results.update(report.results)
+                self.latency.merge(report.latency)
+                merged += 1
+                report = self._reports.get_nowait()
+        except queue.Empty:
+            pass
+
+        for shard, process in enumerate(self._processes):
+            if process is None or process.is_alive():
+                continue
+            if time.monotonic() - self._started_at[shard] < self._restart_delay:
+                continue
+            LOGGER.error(
+                f"Worker for shard {shard} exited with code "
+                f"{process.exitcode}, restarting it"
+            )
+            self.counters["restarts"] += 1
+            self._start(shard)
+        return merged
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop every worker
+
+        Workers are sent SIGTERM, so that, as a single monitor does, they
+        finish their checks in flight, save their checkpoint and close their
+        store. Those still running after the timeout are killed.
+
+        Args:
+            timeout (float): Seconds to wait for the workers to exit
+        """
+        processes = [
+            process
+            for process in self._processes
+            if process is not None and process.is_alive()
+        ]
+        for process in processes:
+            process.terminate()
+        deadline = time.monotonic() + timeout
+        for process in processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+        for process in processes:
+            if process.is_alive():
+                LOGGER.warning(
+                    f"Worker {process.name} did not stop within {timeout}s, "
+                    "killing it"
+                )
+                process.kill()
+                process.join()
+
+    def run(self) -> None:
+        """Run the workers until stopped"""
+        self.start()
+        try:
+            while self.RUN:
+                if not self.poll():
+                    continue
+                LOGGER.info(
+                    f"Probed {self.counters['probes']} endpoints "
+                    f"({self.counters['errors']} errors, "
+                    f"{self.counters['unreachable']} unreachable) across "
+                    f"{len(self._shards)} workers"
+                )
+        finally:
+            self.stop()
@@ -0,0 +1,364 @@
+"""Raw socket probes: TCP connect, TLS handshake and HTTP status line."""
+
+import asyncio
+from functools import lru_cache
+import socket
+import ssl
+from time import perf_counter
+from typing import NamedTuple, Optional
+from urllib.parse import quote, urlsplit
+
+from app_monitor.catalog import DEFAULT_PORTS
+from app_monitor.dns import DNSCache
+from app_monitor.probing import STATUS
+from app_monitor.timing import PhaseRecorder, current_recorder, is_ip_address
+
+TCP, TLS = "tcp", "tls"
+SOCKET_SCHEMES = (TCP, TLS)
+
+# Status code of a port that accepted the connection, or of a completed
+# handshake, so that socket probes share the health checks of HTTP probes
+CONNECTED = 200
+
+# The longest status line read
+MAX_STATUS_LINE = 8192
+
+
+class UnreachableError(Exception):
+    """Raised when no connection could be established"""
+
+
+class UnhealthyError(Exception):
+    """Raised when the peer answered, but not as expected"""
+
+    def __init__(self, status_code: int, reason: str) -> None:
+        super().__init__(reason)
+        self.status_code = status_code
+
+
+class SocketTarget(NamedTuple):
+    """NamedTuple for what a socket probe connects to and sends"""
+
+    host: str
+    port: int
+    tls: bool
+    # Sent once connected and answered with a status line, None to only
+    # connect
+    request: Optional[bytes] = None
+
+
+class SocketResult(NamedTuple):
+    """NamedTuple for the outcome of a socket probe"""
+
+    status_code: int
+    # UNIX time the peer certificate expires, for TLS connections
+    cert_expires: Optional[float] = None
+
+
+def is_socket_probe(endpoint: str, method: str) -> bool:
+    """Whether an endpoint is probed over a raw socket
+
+    Args:
+        endpoint (str): The endpoint
+        method (str): Its probe method
+
+    Returns:
+        bool: True for tcp:// and tls:// endpoints and the STATUS method
+    """
+    return method == STATUS or endpoint[:3].lower() in SOCKET_SCHEMES
+
+
+@lru_cache(maxsize=65536)
+def socket_target(endpoint: str) -> SocketTarget:
+    """Return what to connect to and send to probe an endpoint
+
+    Args:
+        endpoint (str): A valid tcp://, tls://, http:// or https:// URL,
+                probed with STATUS for the latter two
+
+    Returns:
+        SocketTarget: The target
+    """
+    parts = urlsplit(endpoint)
+    scheme = parts.scheme.lower()
+    host = parts.hostname or ""
+    port = parts.port or DEFAULT_PORTS[scheme]
+    if scheme in SOCKET_SCHEMES:
+        return SocketTarget(host, port, scheme == TLS)
+    authority = f"[{host}]" if ":" in host else host
+    if port != DEFAULT_PORTS[scheme]:
+        authority = f"{authority}:{port}"
+    target = quote(parts.path or "/", safe="/%:@!$&'()*+,;=~")
+    if parts.query:
+        target = f"{target}?{quote(parts.query, safe='/%:@!$&()*+,;=?~')}"
+    request = (
+        f"GET {target} HTTP/1.1\r\n"
+        f"Host: {authority}\r\n"
+        "User-Agent: app_monitor\r\n"
+        "Accept: */*\r\n"
+        "Connection: close\r\n\r\n"
+    )
+    return SocketTarget(host, port, scheme == "https", request.encode())
+
+
+def default_ssl_context() -> ssl.SSLContext:
+    """Return a context verifying certificates as the HTTP clients do
+
+    certifi's CA bundle, which httpx and requests use, is preferred to the
+    system's when installed.
+    """
+    try:
+        import certifi
+    except ImportError:  # pragma: no cover
+        return ssl.create_default_context()
+    return ssl.create_default_context(cafile=certifi.where())
+
+
+def cert_expiry(certificate: Optional[dict]) -> Optional[float]:
+    """Return the UNIX time a peer certificate expires
+
+    Args:
+        certificate (Optional[dict]): As returned by `getpeercert()`
+
+    Returns:
+        Optional[float]: The time, None if the certificate has none
+    """
+    if not certificate or "notAfter" not in certificate:
+        return None
+    return float(ssl.cert_time_to_seconds(certificate["notAfter"]))
+
+
+def parse_status_line(line: bytes) -> int:
+    """Return the status code of an HTTP/1.x status line
+
+    Args:
+        line (bytes): The line, e.g. b"HTTP/1.1 200 OK\\r\\n"
+
+    Raises:
+        UnhealthyError: When the line is not a status line
+
+    Returns:
+        int: The status code
+    """
+    parts = line.split(None, 2)
+    if (
+        len(parts) < 2
+        or not parts[0].startswith(b"HTTP/")
+        or len(parts[1]) != 3
+        or not parts[1].isdigit()
+    ):
+        raise UnhealthyError(0, f"sent an invalid status line {line[:64]!r}")
+    return int(parts[1])
+
+
+def _failure(exc: Exception, step: Optional[str]) -> Exception:
+    """Map an error of a socket probe to UnreachableError or UnhealthyError
+
+    Args:
+        exc (Exception): The error
+        step (Optional[str]): What the probe was doing once connected, None
+                while connecting
+    """
+    if isinstance(exc, ssl.SSLError):
+        reason = getattr(exc, "verify_message", None) or exc.reason or exc
+        return UnhealthyError(0, f"failed the TLS handshake: {reason}")
+    if step is None:
+        if isinstance(exc, TimeoutError):
+            return UnreachableError("Connection timed out")
+        return UnreachableError(str(exc) or type(exc).__name__)
+    if isinstance(exc, TimeoutError):
+        return UnhealthyError(0, f"timed out during the {step}")
+    return UnhealthyError(0, f"closed the connection during the {step}")
+
+
+def _add_time(
+    recorder: Optional[PhaseRecorder], phase: str, started: float
+) -> None:
+    if recorder is not None:
+        setattr(
+            recorder, phase, getattr(recorder, phase) + perf_counter() - started
+        )
+
+
+async def _open_connection(
+    target: SocketTarget,
+    dns_cache: Optional[DNSCache],
+    recorder: Optional[PhaseRecorder],
+) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    addresses = [target.host]
+    if not is_ip_address(target.host):
+        started = perf_counter()
+        try:
+            if dns_cache is not None:
+                addresses = await dns_cache.resolve(target.host)
+            else:
+                loop = asyncio.get_running_loop()
+                infos = await loop.getaddrinfo(
+                    target.host, target.port, type=socket.SOCK_STREAM
+                )
+                addresses = list(dict.fromkeys(str(i[4][0]) for i in infos))
+        finally:
+            _add_time(recorder, "dns", started)
+    error: Optional[OSError] = None
+    for address in addresses:
+        started = perf_counter()
+        try:
+            return await asyncio.open_connection(address, target.port)
+        except OSError as exc:
+            error = exc
+        finally:
+            _add_time(recorder, "connect", started)
+    assert error is not None
+    raise error
+
+
+async def probe_socket(
+    target: SocketTarget,
+    dns_cache: Optional[DNSCache] = None,
+    ssl_context: Optional[ssl.SSLContext] = None,
+    timeout: float = 5.0,
+) -> SocketResult:
+    """Probe a target over a raw socket
+
+    The probe connects, completes the TLS handshake of TLS targets and reads
+    the status line of targets with a request, then closes the connection.
+    The phases are added to the current PhaseRecorder, if any.
+
+    Args:
+        target (SocketTarget): The target
+        dns_cache (Optional[DNSCache]): The cache resolving host names
+        ssl_context (Optional[ssl.SSLContext]): The context of TLS targets,
+                `default_ssl_context()` if None
+        timeout (float): Seconds the whole probe may take
+
+    Raises:
+        UnreachableError: When no connection could be established
+        UnhealthyError: When the handshake failed or the peer did not answer
+                with a status line
+
+    Returns:
+        SocketResult: The status code and the certificate expiry
+    """
+    recorder = current_recorder()
+    writer: Optional[asyncio.StreamWriter] = None
+    step: Optional[str] = None
+    try:
+        async with asyncio.timeout(timeout):
+            reader, writer = await _open_connection(target, dns_cache, recorder)
+            if recorder is not None:
+                recorder.new_connection = True
+            cert_expires = None
+            if target.tls:
+                step = "TLS handshake"
+                started = perf_counter()
+                await writer.start_tls(
+                    ssl_context or default_ssl_context(),
+                    server_hostname=target.host,
+                )
+                _add_time(recorder, "tls", started)
+                cert_expires = cert_expiry(writer.get_extra_info("peercert"))
+            if target.request is None:
+                return SocketResult(CONNECTED, cert_expires)
+            step = "status line"
+            writer.write(target.request)
+            if recorder is not None:
+                recorder.request_sent()
+            try:
+                line = await reader.readuntil(b"\n")
+            except asyncio.IncompleteReadError as exc:
+                line = exc.partial
+            except asyncio.LimitOverrunError:
+                line = b""
+            if recorder is not None:
+                recorder.headers_received()
+            return SocketResult(parse_status_line(line), cert_expires)
+    except (OSError, TimeoutError) as exc:
+        raise _failure(exc, step) from exc
+    finally:
+        if writer is not None:
+            # Not waiting for the peer to acknowledge the close
+            writer.close()
+
+
+def probe_socket_sync(
+    target: SocketTarget,
+    dns_cache: Optional[DNSCache] = None,
+    ssl_context: Optional[ssl.SSLContext] = None,
+    timeout: float = 5.0,
+) -> SocketResult:
+    """Blocking version of `probe_socket`, for the serial monitor
+
+    Args:
+        target (SocketTarget): The target
+        dns_cache (Optional[DNSCache]): The cache resolving host names
+        ssl_context (Optional[ssl.SSLContext]): The context of TLS targets,
+                `default_ssl_context()` if None
+        timeout (float): Seconds each socket operation may take
+
+    Raises:
+        UnreachableError: When no connection could be established
+        UnhealthyError: When the handshake failed or the peer did not answer
+                with a status line
+
+    Returns:
+        SocketResult: The status code and the certificate expiry
+    """
+    recorder = current_recorder()
+    sock: Optional[socket.socket] = None
+    step: Optional[str] = None
+    try:
+        # Without a cache, create_connection resolves the name itself
+        addresses = [target.host]
+        if dns_cache is not None and not is_ip_address(target.host):
+            started = perf_counter()
+            try:
+                addresses = dns_cache.resolve_sync(target.host)
+            finally:
+                _add_time(recorder, "dns", started)
+        error: Optional[OSError] = None
+        for address in addresses:
+            started = perf_counter()
+            try:
+                sock = socket.create_connection((address, target.port), timeout)
+                break
+            except OSError as exc:
+                error = exc
+            finally:
+                _add_time(recorder, "connect", started)
+        if sock is None:
+            assert error is not None
+            raise error
+        if recorder is not None:
+            recorder.new_connection = True
+        cert_expires = None
+        if target.tls:
+            step = "TLS handshake"
+            started = perf_counter()
+            sock = (ssl_context or default_ssl_context()).wrap_socket(
+                sock, server_hostname=target.host, do_handshake_on_connect=False
+            )
+            sock.do_handshake()
+            _add_time(recorder, "tls", started)
+            cert_expires = cert_expiry(sock.getpeercert())
+        if target.request is None:
+            return SocketResult(CONNECTED, cert_expires)
+        step = "status line"
+        sock.sendall(target.request)
+        if recorder is not None:
+            recorder.request_sent()
+        line = b""
+        while b"\n" not in line and len(line) < MAX_STATUS_LINE:
+            chunk = sock.recv(1024)
+            if not chunk:
+                break
+            line += chunk
+        if recorder is not None:
+            recorder.headers_received()
+        return SocketResult(
+            parse_status_line(line.partition(b"\n")[0]), cert_expires
+        )
+    except OSError as exc:
+        raise _failure(exc, step) from exc
+    finally:
+        if sock is not None:
+            sock.close()
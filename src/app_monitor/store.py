@@ -0,0 +1,484 @@
+"""Append-only binary store of probe results, read through mmap."""
+
+from array import array
+from collections import Counter
+from datetime import datetime
+import math
+import mmap
+import os
+from pathlib import Path
+import re
+import struct
+import threading
+import time
+from typing import BinaryIO, Iterator, NamedTuple, Optional
+
+from app_monitor.history import CHECK_FAILED, is_error
+from app_monitor.logger import LOGGER
+from app_monitor.results import ProbeResult
+
+# Magic, format version and segment length in seconds
+HEADER = struct.Struct("<8sII")
+MAGIC = b"APMSTORE"
+VERSION = 1
+# UNIX time, endpoint id, status code and response time: 18 bytes. The
+# status code of a response that failed its content check has CHECK_FAILED
+# set
+RECORD = struct.Struct("<dIHf")
+DICTIONARY = "endpoints.dict"
+_SEGMENT_NAME = re.compile(r"(\d+)\.seg")
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)([smhd])")
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+class StoredResult(NamedTuple):
+    """NamedTuple for a probe result read back from the store"""
+
+    timestamp: float
+    endpoint: str
+    status_code: int
+    response_time: float
+    check_failed: bool = False
+
+
+class EndpointAggregate(NamedTuple):
+    """NamedTuple for the aggregate of an endpoint's stored results"""
+
+    endpoint: str
+    probes: int
+    errors: int
+    mean: float
+    p50: float
+    p99: float
+    max: float
+
+
+def parse_time(value: str, now: Optional[float] = None) -> float:
+    """Parse a query time bound
+
+    Args:
+        value (str): A duration before now, e.g. "90s", "30m", "24h" or
+                "7d", an ISO 8601 date or time, or a UNIX time
+        now (Optional[float]): The current UNIX time
+
+    Raises:
+        ValueError: When the value is none of these
+
+    Returns:
+        float: The UNIX time
+    """
+    match = _DURATION.fullmatch(value)
+    if match is not None:
+        if now is None:
+            now = time.time()
+        return now - float(match[1]) * _UNITS[match[2]]
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def _segment_path(directory: Path, start: int) -> Path:
+    return directory / f"{start:010d}.seg"
+
+
+def _segments(directory: Path) -> list[tuple[int, Path]]:
+    """Return the start and path of the segments of a store, oldest first"""
+    segments = []
+    for path in directory.iterdir():
+        match = _SEGMENT_NAME.fullmatch(path.name)
+        if match is not None:
+            segments.append((int(match[1]), path))
+    return sorted(segments)
+
+
+def _load_dictionary(directory: Path) -> list[str]:
+    """Read the endpoint of each id, dropping a line cut short by a crash"""
+    path = directory / DICTIONARY
+    try:
+        data = path.read_bytes()
+    except FileNotFoundError:
+        return []
+    complete = data.rfind(b"\n") + 1
+    return data[:complete].decode("utf-8").splitlines()
+
+
+class ResultStore:
+    """Append-only log of probe results
+
+    Results are kept as fixed-size records in segment files, one per
+    `segment_seconds` period of time, and endpoints as ids into an
+    append-only dictionary file. Appending only queues the record; a
+    background thread writes the queued records every `flush_interval`
+    seconds in one batch, so the event loop never waits on the disk. The
+    writer also deletes the segments older than `retention` seconds.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        segment_seconds: int = 3600,
+        retention: float = 7 * 86400,
+        flush_interval: float = 1.0,
+    ) -> None:
+        """Set up the store, creating its directory if needed
+
+        Args:
+            path (Path): The store directory
+            segment_seconds (int): The period of time of each segment
+            retention (float): Seconds the results are kept
+            flush_interval (float): Seconds between two writes
+        """
+        self._path = Path(path)
+        self._path.mkdir(parents=True, exist_ok=True)
+        self._segment_seconds = segment_seconds
+        self._retention = retention
+        self._flush_interval = flush_interval
+        self._endpoints = _load_dictionary(self._path)
+        self._ids = {
+            endpoint: index for index, endpoint in enumerate(self._endpoints)
+        }
+        # Bytes of complete lines in the dictionary
+        self._dictionary_size = sum(
+            len(endpoint.encode()) + 1 for endpoint in self._endpoints
+        )
+        self._unwritten_endpoints: list[str] = []
+        self._queue: list[tuple[float, int, int, float]] = []
+        self._lock = threading.Lock()
+        # Serializes the writes of the thread and of flush()
+        self._write_lock = threading.Lock()
+        self._segments: dict[int, BinaryIO] = {}
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def append(
+        self, result: ProbeResult, timestamp: Optional[float] = None
+    ) -> None:
+        """Queue a probe result; usable as a result listener
+
+        Args:
+            result (ProbeResult): The result
+            timestamp (Optional[float]): When it was probed, now by default
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        with self._lock:
+            endpoint_id = self._ids.get(result.endpoint)
+            if endpoint_id is None:
+                endpoint_id = self._ids[result.endpoint] = len(self._ids)
+                self._unwritten_endpoints.append(result.endpoint)
+            status_code = min(result.status_code, CHECK_FAILED - 1)
+            if result.failure is not None:
+                status_code |= CHECK_FAILED
+            self._queue.append(
+                (timestamp, endpoint_id, status_code, result.response_time)
+            )
+
+    def start(self) -> None:
+        """Start writing in a background thread"""
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="app_monitor-store", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self._flush_interval):
+            try:
+                self.flush()
+            except OSError as exc:
+                LOGGER.error(f"Could not write probe results: {exc}")
+
+    def flush(self, now: Optional[float] = None) -> None:
+        """Write the queued results and delete the expired segments
+
+        Args:
+            now (Optional[float]): The current UNIX time
+        """
+        with self._write_lock:
+            # Taken under the write lock so that ids are written in order
+            with self._lock:
+                queue, self._queue = self._queue, []
+                endpoints, self._unwritten_endpoints = (
+                    self._unwritten_endpoints,
+                    [],
+                )
+            if endpoints:
+                # Ids must be on disk before the records using them
+                try:
+                    self._write_dictionary(endpoints)
+                except OSError:
+                    # Both are written on the next flush, in order, so the
+                    # line numbers of the dictionary still match the ids
+                    with self._lock:
+                        self._unwritten_endpoints[:0] = endpoints
+                        self._queue[:0] = queue
+                    raise
+            batches: dict[int, list[bytes]] = {}
+            seconds = self._segment_seconds
+            for record in queue:
+                start = int(record[0] // seconds * seconds)
+                batches.setdefault(start, []).append(RECORD.pack(*record))
+            for start, records in batches.items():
+                segment = self._segment(start)
+                segment.write(b"".join(records))
+                segment.flush()
+            self._expire(time.time() if now is None else now)
+
+    def _write_dictionary(self, endpoints: list[str]) -> None:
+        """Append endpoints to the dictionary, all of them or none"""
+        data = "".join(f"{endpoint}\n" for endpoint in endpoints).encode()
+        with open(self._path / DICTIONARY, "ab") as dictionary:
+            # Drop the partial line a crash or a failed write may have left
+            # behind, which would shift the ids after it
+            dictionary.truncate(self._dictionary_size)
+            dictionary.write(data)
+        self._dictionary_size += len(data)
+
+    def _segment(self, start: int) -> BinaryIO:
+        segment = self._segments.get(start)
+        if segment is None:
+            path = _segment_path(self._path, start)
+            segment = open(path, "ab")
+            size = segment.tell()
+            # Drop a record cut short by a crash, which would misalign the
+            # records appended after it
+            if size < HEADER.size:
+                segment.truncate(0)
+                segment.write(
+                    HEADER.pack(MAGIC, VERSION, self._segment_seconds)
+                )
+            elif (size - HEADER.size) % RECORD.size:
+                segment.truncate(size - (size - HEADER.size) % RECORD.size)
+            self._segments[start] = segment
+            # Late results rarely go past the previous segment
+            for old in sorted(self._segments)[:-2]:
+                self._segments.pop(old).close()
+        return segment
+
+    def _expire(self, now: float) -> None:
+        horizon = now - self._retention
+        for start, path in _segments(self._path):
+            if start + self._segment_seconds > horizon:
+                break
+            segment = self._segments.pop(start, None)
+            if segment is not None:
+                segment.close()
+            LOGGER.debug(f"Deleting expired segment {path}")
+            os.unlink(path)
+
+    def close(self) -> None:
+        """Stop the writer thread, write what is queued and close the files"""
+        if self._thread is not None:
+            self._stopping.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        for segment in self._segments.values():
+            segment.close()
+        self._segments.clear()
+
+
+class StoreReader:
+    """Scans a store directory, or the shard stores it holds
+
+    Segments outside the queried time range are skipped by name. The others
+    are memory-mapped and their records unpacked straight from the mapping,
+    without copying the file into memory.
+    """
+
+    def __init__(self, path: Path) -> None:
+        """Open a store
+
+        Args:
+            path (Path): A store directory, or a directory of shard stores
+                    named shard-<n>
+
+        Raises:
+            FileNotFoundError: When there is no store there
+        """
+        path = Path(path)
+        if (path / DICTIONARY).exists():
+            directories = [path]
+        else:
+            directories = sorted(path.glob("shard-*"))
+        if not directories:
+            raise FileNotFoundError(f"No probe result store in {path}")
+        self._stores = [
+            (directory, _load_dictionary(directory))
+            for directory in directories
+        ]
+
+    def records(
+        self,
+        start: float = 0.0,
+        end: float = math.inf,
+        endpoint: Optional[str] = None,
+    ) -> Iterator[StoredResult]:
+        """Iterate over the results stored in a time range
+
+        Results are in write order within each segment.
+
+        Args:
+            start (float): The first UNIX time included
+            end (float): The first UNIX time excluded
+            endpoint (Optional[str]): Only return the results of this one
+
+        Yields:
+            StoredResult: The results
+        """
+        for endpoints, records in self._batches(start, end, endpoint):
+            for timestamp, index, status_code, response_time in records:
+                yield StoredResult(
+                    timestamp,
+                    _endpoint_name(endpoints, index),
+                    status_code & ~CHECK_FAILED,
+                    response_time,
+                    bool(status_code & CHECK_FAILED),
+                )
+
+    def _batches(
+        self, start: float, end: float, endpoint: Optional[str]
+    ) -> Iterator[tuple[list[str], list[tuple[float, int, int, float]]]]:
+        """Yield the dictionary and matching raw records of each segment"""
+        for directory, endpoints in self._stores:
+            endpoint_id = None
+            if endpoint is not None:
+                if endpoint not in endpoints:
+                    continue
+                endpoint_id = endpoints.index(endpoint)
+            for segment_start, path in _segments(directory):
+                if segment_start >= end:
+                    break
+                yield endpoints, _scan(
+                    path, segment_start, start, end, endpoint_id
+                )
+
+    def aggregates(
+        self,
+        start: float = 0.0,
+        end: float = math.inf,
+        endpoint: Optional[str] = None,
+    ) -> list[EndpointAggregate]:
+        """Aggregate the results stored in a time range per endpoint
+
+        Percentiles are exact, so the response times of the range are held
+        in memory, 4 bytes each.
+
+        Args:
+            start (float): The first UNIX time included
+            end (float): The first UNIX time excluded
+            endpoint (Optional[str]): Only aggregate this one
+
+        Returns:
+            list[EndpointAggregate]: The aggregates, sorted by endpoint
+        """
+        latencies: dict[str, array] = {}
+        errors: Counter[str] = Counter()
+        for endpoints, records in self._batches(start, end, endpoint):
+            columns: dict[int, array] = {}
+            failed: Counter[int] = Counter()
+            for _, index, status_code, response_time in records:
+                column = columns.get(index)
+                if column is None:
+                    column = columns[index] = array("f")
+                column.append(response_time)
+                # Failed content checks, with CHECK_FAILED set, included
+                if status_code == 0 or status_code >= 400:
+                    failed[index] += 1
+            for index, column in columns.items():
+                name = _endpoint_name(endpoints, index)
+                if name in latencies:
+                    latencies[name].extend(column)
+                else:
+                    latencies[name] = column
+                errors[name] += failed[index]
+
+        aggregates = []
+        for name, column in sorted(latencies.items()):
+            values = sorted(column)
+            aggregates.append(
+                EndpointAggregate(
+                    endpoint=name,
+                    probes=len(values),
+                    errors=errors[name],
+                    mean=math.fsum(values) / len(values),
+                    p50=_percentile(values, 0.5),
+                    p99=_percentile(values, 0.99),
+                    max=values[-1],
+                )
+            )
+        return aggregates
+
+    def failures(
+        self,
+        start: float = 0.0,
+        end: float = math.inf,
+        endpoint: Optional[str] = None,
+    ) -> Iterator[StoredResult]:
+        """Iterate over the failed probes stored in a time range
+
+        Args:
+            start (float): The first UNIX time included
+            end (float): The first UNIX time excluded
+            endpoint (Optional[str]): Only return the failures of this one
+
+        Yields:
+            StoredResult: The results with an error status, no response or
+                    a failed content check
+        """
+        for record in self.records(start, end, endpoint):
+            if record.check_failed or is_error(record.status_code):
+                yield record
+
+
+def _endpoint_name(endpoints: list[str], index: int) -> str:
+    return endpoints[index] if index < len(endpoints) else f"#{index}"
+
+
+def _percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile of sorted values"""
+    return values[max(0, math.ceil(q * len(values)) - 1)]
+
+
+def _scan(
+    path: Path,
+    segment_start: int,
+    start: float,
+    end: float,
+    endpoint_id: Optional[int],
+) -> list[tuple[float, int, int, float]]:
+    """Return the records of a segment in the range, from its mapping"""
+    with open(path, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        if size < HEADER.size:
+            return []
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            magic, version, seconds = HEADER.unpack_from(mapped)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path} is not a probe result segment")
+            if segment_start + seconds <= start:
+                return []
+            # A record cut short by a crash is ignored
+            usable = (size - HEADER.size) // RECORD.size * RECORD.size
+            with memoryview(mapped)[HEADER.size : HEADER.size + usable] as view:
+                records = RECORD.iter_unpack(view)
+                if endpoint_id is None:
+                    matched = [
+                        record for record in records if start <= record[0] < end
+                    ]
+                else:
+                    matched = [
+                        record
+                        for record in records
+                        if record[1] == endpoint_id and start <= record[0] < end
+                    ]
+                # The iterator holds the view until it is freed
+                del records
+    return matched
@@ -0,0 +1,137 @@
+"""requests transport plumbing used by the serial monitor."""
+
+import socket
+from time import perf_counter
+from typing import Any, Optional
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NameResolutionError
+
+from app_monitor.dns import DNSCache
+from app_monitor.timing import current_recorder, is_ip_address
+
+
+class _TimedConnectionMixin:
+    """Times DNS, TCP connect and time to first byte of urllib3 connections"""
+
+    _dns_host: str
+    port: int
+    # Set on the subclasses built by TimingHTTPAdapter
+    dns_cache: Optional[DNSCache] = None
+
+    def _new_conn(self) -> socket.socket:
+        recorder = current_recorder()
+        host = self._dns_host
+        started = perf_counter()
+        if self.dns_cache is not None and not is_ip_address(host):
+            try:
+                self._dns_host = self.dns_cache.resolve_sync(host)[0]
+            except OSError as exc:
+                if recorder is not None:
+                    recorder.dns += perf_counter() - started
+                raise NameResolutionError(
+                    host, self, exc  # type: ignore[arg-type]
+                ) from exc
+        elif not is_ip_address(host):
+            try:
+                self._dns_host = str(
+                    socket.getaddrinfo(
+                        host, self.port, type=socket.SOCK_STREAM
+                    )[0][4][0]
+                )
+            except OSError:
+                # Let urllib3 fail the resolution again and raise its own error
+                pass
+        resolved = perf_counter()
+        try:
+            sock = super()._new_conn()  # type: ignore[misc]
+        finally:
+            self._dns_host = host
+        if recorder is not None:
+            recorder.dns += resolved - started
+            recorder.connect += perf_counter() - resolved
+            recorder.new_connection = True
+        return sock
+
+    def request(self, *args: Any, **kwargs: Any) -> None:
+        recorder = current_recorder()
+        if recorder is not None:
+            recorder.request_sent()
+        super().request(*args, **kwargs)  # type: ignore[misc]
+
+    def getresponse(self, *args: Any, **kwargs: Any) -> Any:
+        response = super().getresponse(*args, **kwargs)  # type: ignore[misc]
+        recorder = current_recorder()
+        if recorder is not None:
+            recorder.headers_received()
+        return response
+
+
+class TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    """HTTP connection recording its phases"""
+
+
+class TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    """HTTPS connection recording its phases, TLS handshake included"""
+
+    def connect(self) -> None:
+        recorder = current_recorder()
+        if recorder is None:
+            return super().connect()
+        setup = recorder.setup
+        started = perf_counter()
+        super().connect()
+        # Whatever connect() spent beyond DNS and TCP was the TLS handshake
+        recorder.tls += perf_counter() - started - (recorder.setup - setup)
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+def _with_dns_cache(
+    pool_class: type[HTTPConnectionPool], dns_cache: DNSCache
+) -> type[HTTPConnectionPool]:
+    """Subclass a pool class so that its connections use a DNSCache"""
+    connection_class = type(
+        pool_class.ConnectionCls.__name__,
+        (pool_class.ConnectionCls,),
+        {"dns_cache": dns_cache},
+    )
+    return type(
+        pool_class.__name__, (pool_class,), {"ConnectionCls": connection_class}
+    )
+
+
+class TimingHTTPAdapter(HTTPAdapter):
+    """HTTP adapter whose connections record their phases
+
+    Host names are resolved through the DNSCache when one is given, so that
+    sessions sharing a cache share its resolutions.
+    """
+
+    def __init__(
+        self, *args: Any, dns_cache: Optional[DNSCache] = None, **kwargs: Any
+    ) -> None:
+        # init_poolmanager() runs during HTTPAdapter.__init__()
+        self.dns_cache = dns_cache
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        pool_classes: dict[str, type[HTTPConnectionPool]] = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+        if self.dns_cache is not None:
+            pool_classes = {
+                scheme: _with_dns_cache(pool_class, self.dns_cache)
+                for scheme, pool_class in pool_classes.items()
+            }
+        self.poolmanager.pool_classes_by_scheme = pool_classes
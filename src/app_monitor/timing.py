@@ -0,0 +1,138 @@
+"""Per-phase timing of probes on a monotonic, high resolution clock."""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+import ipaddress
+from time import perf_counter
+from typing import Iterator, Optional
+
+from app_monitor.results import PhaseTimings
+
+_CURRENT: ContextVar[Optional["PhaseRecorder"]] = ContextVar(
+    "app_monitor_phase_recorder", default=None
+)
+
+
+class PhaseRecorder:
+    """Accumulates the time spent in each phase of one probe
+
+    Phases are added up, so a probe that follows redirects or is retried
+    reports the total time spent in each phase.
+    """
+
+    __slots__ = (
+        "started",
+        "dns",
+        "connect",
+        "tls",
+        "ttfb",
+        "body",
+        "new_connection",
+        "_marks",
+        "_setup_at_request",
+    )
+
+    def __init__(self) -> None:
+        self.started = perf_counter()
+        self.dns = 0.0
+        self.connect = 0.0
+        self.tls = 0.0
+        self.ttfb = 0.0
+        self.body = 0.0
+        self.new_connection = False
+        self._marks: dict[str, float] = {}
+        self._setup_at_request = 0.0
+
+    @property
+    def setup(self) -> float:
+        """Time spent setting up connections so far"""
+        return self.dns + self.connect + self.tls
+
+    def mark(self, name: str) -> None:
+        """Remember when something started, for `since`"""
+        self._marks[name] = perf_counter()
+
+    def since(self, name: str) -> float:
+        """Seconds elapsed since `mark(name)`, 0 if it was never marked"""
+        started = self._marks.pop(name, None)
+        return 0.0 if started is None else perf_counter() - started
+
+    def request_sent(self) -> None:
+        """Mark the start of sending a request"""
+        self.mark("request")
+        self._setup_at_request = self.setup
+
+    def headers_received(self) -> None:
+        """Add the time since `request_sent` to the TTFB
+
+        Connection setup done in between, e.g. by clients that connect lazily
+        while sending, is left out.
+        """
+        self.ttfb += self.since("request") - (
+            self.setup - self._setup_at_request
+        )
+
+    def on_trace_event(self, event: str) -> None:
+        """Record an httpcore trace event
+
+        Args:
+            event (str): The event name, e.g. "connection.connect_tcp.started"
+        """
+        phase, _, stage = event.rpartition(".")
+        phase = phase.rpartition(".")[2]
+        if stage == "started":
+            if phase == "connect_tcp":
+                # DNS resolution happens inside connect_tcp and is recorded
+                # separately by the network backend
+                self._marks["dns_before_connect"] = self.dns
+            elif phase == "send_request_headers":
+                self.request_sent()
+            self.mark(phase)
+        elif stage == "complete":
+            if phase == "connect_tcp":
+                dns = self.dns - self._marks.pop("dns_before_connect", 0.0)
+                self.connect += self.since(phase) - dns
+                self.new_connection = True
+            elif phase == "start_tls":
+                self.tls += self.since(phase)
+            elif phase == "receive_response_headers":
+                self.headers_received()
+            elif phase == "receive_response_body":
+                self.body += self.since(phase)
+
+    def timings(self) -> PhaseTimings:
+        """Return the timings recorded so far"""
+        return PhaseTimings(
+            dns=self.dns,
+            connect=self.connect,
+            tls=self.tls,
+            ttfb=self.ttfb,
+            body=self.body,
+            total=perf_counter() - self.started,
+            new_connection=self.new_connection,
+        )
+
+
+@contextmanager
+def record_phases() -> Iterator[PhaseRecorder]:
+    """Record the phases of the requests made in the current context"""
+    recorder = PhaseRecorder()
+    token = _CURRENT.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _CURRENT.reset(token)
+
+
+def current_recorder() -> Optional[PhaseRecorder]:
+    """Return the recorder of the current context, if any"""
+    return _CURRENT.get()
+
+
+def is_ip_address(host: str) -> bool:
+    """Whether a host is an IP literal and needs no DNS resolution"""
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return True
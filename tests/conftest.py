@@ -0,0 +1,59 @@
+"""Fixtures shared by the test modules."""
+
+from http.server import ThreadingHTTPServer
+import ssl
+import threading
+from typing import Optional
+
+import pytest
+
+from app_monitor.app_config import AppConfig
+
+
+@pytest.fixture
+def http_server():
+    """Start local HTTP servers, shut down after the test
+
+    `http_server(handler)` serves a request handler class on a free loopback
+    port, over TLS with an SSL context, and returns the server with its base
+    URL as `url` and a `received` list for the handler to fill.
+    """
+    servers = []
+
+    def start(
+        handler: type, context: Optional[ssl.SSLContext] = None
+    ) -> ThreadingHTTPServer:
+        httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        if context is not None:
+            httpd.socket = context.wrap_socket(httpd.socket, server_side=True)
+        scheme = "http" if context is None else "https"
+        httpd.url = f"{scheme}://127.0.0.1:{httpd.server_address[1]}"
+        httpd.received = []
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        servers.append(httpd)
+        return httpd
+
+    yield start
+    for httpd in servers:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+@pytest.fixture
+def make_app_config():
+    """Build configurations: `make_app_config(endpoints, **kwargs)`
+
+    Endpoints are checked every minute, warned about after 5 seconds and
+    tried once, unless the keyword arguments say otherwise.
+    """
+
+    def make(endpoints: list[str], **kwargs) -> AppConfig:
+        kwargs = {
+            "check_interval": 60,
+            "warn_threshold": 5,
+            "retries": 1,
+            **kwargs,
+        }
+        return AppConfig(endpoints=endpoints, **kwargs)
+
+    return make
@@ -146,6 +146,21 @@ from app_monitor.app_config import AppConfig, ConfigValidationError, load_config
             """,
             ConfigValidationError,
         ),
+        (  # max_concurrency is not a positive integer
+            """
+            {
+                "check_interval": 10,
+                "warn_threshold": 1.0,
+                "retries": 3,
+                "max_concurrency": 0,
+                "endpoints": [
+                    "http://example1.com",
+                    "http://example2.com"
+                ]
+            }
+            """,
+            ConfigValidationError,
+        ),
         (  # retries is not a number
             """
             {
@@ -160,6 +175,20 @@ from app_monitor.app_config import AppConfig, ConfigValidationError, load_config
             """,
             ConfigValidationError,
         ),
+        (  # retries would make no attempt
+            """
+            {
+                "check_interval": 10,
+                "warn_threshold": 1.0,
+                "retries": 0,
+                "endpoints": [
+                    "http://example1.com",
+                    "http://example2.com"
+                ]
+            }
+            """,
+            ConfigValidationError,
+        ),
     ],
 )
 def test_load_config(config, expected):
@@ -1,9 +1,12 @@
+import asyncio
 import re
 import pytest
 from unittest.mock import patch, PropertyMock
 from app_monitor.async_monitor import AsyncAppMonitor
 import httpx
 from app_monitor.app_config import AppConfig
+from app_monitor.notifier import NotificationDispatcher
+from app_monitor.store import StoreReader
 from pytest_httpx import HTTPXMock
 
 
@@ -40,14 +43,8 @@ async def test_supervisor(mocked, app_config, httpx_mock: HTTPXMock, caplog):
         exception=httpx.ConnectTimeout("Connection to server took too long"),
     )
     # One success for example2.com/status with status code 500
-    httpx_mock.add_exception(
-        url="http://example2.com/status",
-        method="GET",
-        exception=httpx.HTTPStatusError(
-            request=httpx.Request("GET", "http://example2.com/status"),
-            response=httpx.Response(status_code=500),
-            message="Internal Server Error",
-        ),
+    httpx_mock.add_response(
+        url="http://example2.com/status", method="GET", status_code=500
     )
     # One success for example3.com/status with status code 200
     httpx_mock.add_response(
@@ -55,9 +52,7 @@ async def test_supervisor(mocked, app_config, httpx_mock: HTTPXMock, caplog):
     )
 
     # Exercise
-    with patch(
-        "app_monitor.async_monitor.send_slack_notification"
-    ) as mocked_slack:
+    with patch.object(NotificationDispatcher, "notify") as mocked_slack:
         await async_monitor.supervisor()
 
     # Assert
@@ -82,3 +77,37 @@ async def test_supervisor(mocked, app_config, httpx_mock: HTTPXMock, caplog):
     ]:
         assert msg.search(caplog.text)
         assert mocked_slack.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_supervisor_shuts_down(tmp_path, httpx_mock: HTTPXMock):
+    # Setup
+    app_config = AppConfig(
+        endpoints=["http://example1.com/status"],
+        check_interval=60,
+        retries=1,
+        metrics_port=0,
+        store_path=str(tmp_path),
+        notification_batch_window=60,
+    )
+    async_monitor = AsyncAppMonitor(app_config)
+    httpx_mock.add_response(url="http://example1.com/status", status_code=503)
+    task = asyncio.create_task(async_monitor.supervisor())
+    while not async_monitor.counters["probes"]:
+        await asyncio.sleep(0.01)
+    port = async_monitor._metrics_server.port
+
+    # Exercise
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    # Assert
+    # The notification queued for the batch window was sent
+    assert async_monitor._notifier.counters["sent"] == 1
+    with pytest.raises(OSError):
+        await asyncio.open_connection("127.0.0.1", port)
+    # The writer thread was joined after writing the last batch
+    assert async_monitor.store._thread is None
+    (failure,) = StoreReader(tmp_path).failures(0)
+    assert failure.status_code == 503
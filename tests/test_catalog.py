@@ -0,0 +1,227 @@
+import json
+from unittest.mock import patch
+
+import pytest
+
+from app_monitor.app_config import ConfigValidationError, load_config
+from app_monitor import catalog
+from app_monitor.catalog import (
+    canonical_url,
+    dedupe_endpoints,
+    group_by_origin,
+    is_valid_url,
+    load_endpoints,
+)
+
+
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        ("HTTP://Example1.com", "http://example1.com/"),
+        ("http://example1.com:80/status#top", "http://example1.com/status"),
+        ("https://example1.com:443/?a=1", "https://example1.com/?a=1"),
+        ("https://example1.com:8443/a", "https://example1.com:8443/a"),
+        ("http://[::1]:8080/a", "http://[::1]:8080/a"),
+        ("TLS://Example1.com:443", "tls://example1.com/"),
+    ],
+)
+def test_canonical_url(url, expected):
+    # Exercise / Assert
+    assert canonical_url(url) == expected
+
+
+def test_dedupe_keeps_the_first_spelling():
+    # Setup
+    endpoints = [
+        "http://Example1.com/status",
+        "http://example2.com",
+        "http://example1.com:80/status",
+        "http://example2.com/",
+    ]
+
+    # Exercise
+    unique = dedupe_endpoints(endpoints)
+
+    # Assert
+    assert unique == ["http://Example1.com/status", "http://example2.com"]
+
+
+def test_is_valid_url_checks_each_origin_once():
+    # Setup
+    catalog._is_valid_origin.cache_clear()
+    urls = [f"http://example{i % 3}.com/item/{i}" for i in range(300)]
+
+    # Exercise
+    with patch.object(
+        catalog.validators, "url", wraps=catalog.validators.url
+    ) as mocked:
+        valid = [is_valid_url(url) for url in urls]
+
+    # Assert
+    assert all(valid)
+    assert mocked.call_count == 3
+    assert not is_valid_url("http://example1.com/a b")
+    assert not is_valid_url("ftp://example1.com/")
+    assert not is_valid_url("http://example1/")
+
+
+@pytest.mark.parametrize(
+    "url, valid",
+    [
+        ("tcp://db.example1.com:5432", True),
+        ("tcp://10.0.0.1:6379", True),
+        ("tcp://db.example1.com", False),
+        ("tls://example1.com", True),
+        ("tls://example1.com:99999", False),
+    ],
+)
+def test_is_valid_url_accepts_socket_probes(url, valid):
+    # Exercise / Assert
+    assert is_valid_url(url) == valid
+
+
+def test_load_endpoints_streams_mixed_lines(tmp_path):
+    # Setup
+    path = tmp_path / "endpoints.ndjson"
+    path.write_text(
+        "# catalog\n"
+        "http://example1.com/status\n"
+        "\n"
+        '"http://example2.com/status"\n'
+        '{"url": "http://EXAMPLE1.com/status"}\n'
+        '{"url": "https://example3.com/health"}\n'
+    )
+
+    # Exercise
+    endpoints = load_endpoints(path, ["http://example0.com/"])
+
+    # Assert
+    assert endpoints == [
+        "http://example0.com/",
+        "http://example1.com/status",
+        "http://example2.com/status",
+        "https://example3.com/health",
+    ]
+    assert group_by_origin(endpoints) == {
+        "http://example0.com": ["http://example0.com/"],
+        "http://example1.com": ["http://example1.com/status"],
+        "http://example2.com": ["http://example2.com/status"],
+        "https://example3.com": ["https://example3.com/health"],
+    }
+
+
+def test_load_config_keys_probe_options_by_the_kept_spelling(tmp_path):
+    # Setup
+    (tmp_path / "endpoints.ndjson").write_text(
+        "http://example1.com/status\n"
+        '{"url": "http://EXAMPLE1.com:80/status", "method": "HEAD"}\n'
+        '{"url": "http://example2.com/", "method": "HEAD"}\n'
+    )
+    (tmp_path / "conflicting.ndjson").write_text(
+        '{"url": "http://example1.com/status", "method": "HEAD"}\n'
+        '{"url": "http://EXAMPLE1.com/status", "method": "STREAM"}\n'
+    )
+    config_path = tmp_path / "config.json"
+    config = {
+        "endpoints": ["http://example2.com"],
+        "endpoints_file": "endpoints.ndjson",
+        "endpoint_probes": {"http://Example2.com/": {"method": "STREAM"}},
+        "check_interval": 10,
+        "warn_threshold": 1.0,
+        "retries": 3,
+    }
+    config_path.write_text(json.dumps(config))
+
+    # Exercise
+    app_config = load_config(config_path)
+    config_path.write_text(
+        json.dumps(dict(config, endpoints_file="conflicting.ndjson"))
+    )
+
+    # Assert
+    assert app_config.endpoints == [
+        "http://example2.com",
+        "http://example1.com/status",
+    ]
+    # The configuration's options win over the catalog's
+    assert {
+        endpoint: options.method
+        for endpoint, options in app_config.endpoint_probes.items()
+    } == {"http://example2.com": "STREAM", "http://example1.com/status": "HEAD"}
+    with pytest.raises(
+        ConfigValidationError, match="conflicting.ndjson:2: .* other probe"
+    ):
+        load_config(config_path)
+    config_path.write_text(
+        json.dumps(
+            {
+                "endpoints": ["http://example2.com"],
+                "endpoint_probes": {
+                    "http://example2.com": {"method": "HEAD"},
+                    "http://EXAMPLE2.com/": {"method": "STREAM"},
+                },
+                "check_interval": 10,
+                "warn_threshold": 1.0,
+                "retries": 3,
+            }
+        )
+    )
+    with pytest.raises(ConfigValidationError, match="other probe options"):
+        load_config(config_path)
+
+
+@pytest.mark.parametrize(
+    "line, message",
+    [
+        ("not a url", "endpoints.txt:2: Invalid URL: not a url"),
+        ('{"url": 1}', "endpoints.txt:2: expected a URL"),
+        ("{oops", "endpoints.txt:2: invalid JSON"),
+    ],
+)
+def test_load_config_reports_bad_catalog_lines(tmp_path, line, message):
+    # Setup
+    (tmp_path / "endpoints.txt").write_text(f"http://example1.com\n{line}\n")
+    config_path = tmp_path / "config.json"
+    config_path.write_text(
+        json.dumps(
+            {
+                "endpoints_file": "endpoints.txt",
+                "check_interval": 10,
+                "warn_threshold": 1.0,
+                "retries": 3,
+            }
+        )
+    )
+
+    # Exercise / Assert
+    with pytest.raises(ConfigValidationError, match=message):
+        load_config(config_path)
+
+
+def test_load_config_merges_the_catalog(tmp_path):
+    # Setup
+    (tmp_path / "endpoints.txt").write_text(
+        "http://example2.com\nhttp://example1.com:80\n"
+    )
+    config_path = tmp_path / "config.json"
+    config_path.write_text(
+        json.dumps(
+            {
+                "endpoints": ["http://example1.com"],
+                "endpoints_file": "endpoints.txt",
+                "check_interval": 10,
+                "warn_threshold": 1.0,
+                "retries": 3,
+            }
+        )
+    )
+
+    # Exercise
+    app_config = load_config(config_path)
+
+    # Assert
+    assert app_config.endpoints == [
+        "http://example1.com",
+        "http://example2.com",
+    ]
+    assert app_config.endpoints_file == "endpoints.txt"
@@ -0,0 +1,140 @@
+import asyncio
+import time
+
+import pytest
+from pytest_httpx import HTTPXMock
+
+from app_monitor.async_monitor import AsyncAppMonitor
+from app_monitor.checkpoint import Checkpointer, read_snapshot, write_snapshot
+from app_monitor.monitor import AppMonitor
+from app_monitor.resilience import HALF_OPEN, OPEN
+
+_ENDPOINTS = [f"http://example{i}.com" for i in range(4)]
+
+
+@pytest.fixture
+def app_config(tmp_path, make_app_config):
+    return make_app_config(
+        _ENDPOINTS, checkpoint_path=str(tmp_path / "checkpoint.gz")
+    )
+
+
+def _age_snapshot(tmp_path, seconds):
+    """Make the snapshot look taken `seconds` earlier"""
+    path = tmp_path / "checkpoint.gz"
+    snapshot = read_snapshot(path)
+    snapshot["saved_at"] -= seconds
+    write_snapshot(path, snapshot)
+
+
+def test_state_survives_a_restart(app_config):
+    # Setup
+    monitor = AsyncAppMonitor(app_config)
+    for i in range(10):
+        monitor.history.record(_ENDPOINTS[0], 200, i / 10, 1000 + i)
+        monitor.slow_responses.check(_ENDPOINTS[0], i / 10, 3)
+    monitor.history.record(_ENDPOINTS[1], 503, 0.5, 1000)
+    monitor.history.record("http://removed.com", 200, 0.1, 1000)
+    for _ in range(5):
+        monitor.breakers.record_failure("example2.com")
+
+    # Exercise
+    monitor.checkpoint.save(monitor)
+    restarted = AsyncAppMonitor(app_config)
+    restored = restarted.checkpoint.restore(restarted)
+
+    # Assert
+    assert restored
+    assert restarted.history.recent(_ENDPOINTS[0]) == monitor.history.recent(
+        _ENDPOINTS[0]
+    )
+    assert restarted.history.rollup(
+        _ENDPOINTS[1], "1h", now=1000
+    ) == monitor.history.rollup(_ENDPOINTS[1], "1h", now=1000)
+    assert "http://removed.com" not in restarted.history
+    assert len(restarted.slow_responses.sketch(_ENDPOINTS[0])) == 10
+    assert restarted.breakers.state("example2.com") == OPEN
+    assert not restarted.breakers.allow("example2.com")
+
+
+def test_downtime_counts_towards_breaker_timeouts(app_config, tmp_path):
+    # Setup
+    monitor = AsyncAppMonitor(app_config._replace(breaker_reset_timeout=30))
+    for _ in range(5):
+        monitor.breakers.record_failure("example2.com")
+    monitor.checkpoint.save(monitor)
+    _age_snapshot(tmp_path, 40)
+
+    # Exercise
+    restarted = AsyncAppMonitor(app_config._replace(breaker_reset_timeout=30))
+    restarted.checkpoint.restore(restarted)
+
+    # Assert
+    assert restarted.breakers.allow("example2.com")
+    assert restarted.breakers.state("example2.com") == HALF_OPEN
+
+
+@pytest.mark.asyncio
+async def test_restart_keeps_phases_without_burst(
+    app_config, tmp_path, httpx_mock: HTTPXMock
+):
+    # Setup
+    httpx_mock.add_response(is_reusable=True, is_optional=True)
+    monitor = AsyncAppMonitor(app_config)
+    now = time.monotonic()
+    for i, endpoint in enumerate(_ENDPOINTS):
+        monitor._scheduler.add(endpoint, 60, now + 15 * i + 5)
+    monitor.checkpoint.save(monitor)
+    _age_snapshot(tmp_path, 70)
+
+    # Exercise
+    restarted = AsyncAppMonitor(app_config)
+    supervisor = asyncio.create_task(restarted.supervisor())
+    await asyncio.sleep(0.2)
+    deadlines = {
+        endpoint: due for endpoint, due, _ in restarted._scheduler.deadlines()
+    }
+    restarted.stop()
+    await supervisor
+
+    # Assert
+    assert restarted.counters["probes"] == 0
+    # Due 65, 50, 35 and 20 seconds before the restart, the endpoints keep
+    # their phase and are next due 55, 10, 25 and 40 seconds after it
+    assert [deadlines[endpoint] - now for endpoint in _ENDPOINTS] == [
+        pytest.approx(offset, abs=1) for offset in (55, 10, 25, 40)
+    ]
+    # The shutdown checkpoint holds the same deadlines
+    saved = read_snapshot(tmp_path / "checkpoint.gz")["state"]["deadlines"]
+    assert sorted(saved) == sorted(_ENDPOINTS)
+
+
+def test_unreadable_checkpoint_is_ignored(app_config, tmp_path, caplog):
+    # Setup
+    (tmp_path / "checkpoint.gz").write_bytes(b"not a checkpoint")
+    monitor = AsyncAppMonitor(app_config)
+
+    # Exercise
+    restored = monitor.checkpoint.restore(monitor)
+    monitor.checkpoint.save(monitor)
+
+    # Assert
+    assert not restored
+    assert "Ignoring the checkpoint" in caplog.text
+    assert read_snapshot(tmp_path / "checkpoint.gz")["version"] == 1
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["checkpoint.gz"]
+
+
+def test_serial_monitor_resumes_its_cycle(app_config, tmp_path):
+    # Setup
+    monitor = AppMonitor(app_config)
+    monitor._cycle_started = time.monotonic() - 20
+    checkpointer = Checkpointer(tmp_path / "checkpoint.gz")
+    checkpointer.save(monitor)
+
+    # Exercise
+    restarted = AppMonitor(app_config)
+    checkpointer.restore(restarted)
+
+    # Assert
+    assert restarted._resume_at - time.monotonic() == pytest.approx(40, abs=1)
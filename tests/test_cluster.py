@@ -0,0 +1,233 @@
+import asyncio
+from http.server import BaseHTTPRequestHandler
+import json
+import os
+from pathlib import Path
+import subprocess
+import sys
+
+import pytest
+
+from app_monitor.app_config import AppConfig
+from app_monitor.cluster import (
+    ClusterWorker,
+    Coordinator,
+    HashRing,
+    parse_address,
+)
+
+_ROOT = Path(__file__).parents[1]
+
+
+class _OkHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200 if self.path != "/down" else 503)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(http_server):
+    return http_server(_OkHandler).url
+
+
+def test_parse_address():
+    # Exercise
+    loopback = parse_address(":7070")
+    everywhere = parse_address("0.0.0.0:7070")
+    ipv6 = parse_address("[::1]:7070")
+
+    # Assert
+    assert loopback == ("127.0.0.1", 7070)
+    assert everywhere == ("0.0.0.0", 7070)
+    assert ipv6 == ("::1", 7070)
+    with pytest.raises(ValueError):
+        parse_address("coordinator")
+
+
+async def _wait_for(condition, timeout=20.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "Timed out"
+        await asyncio.sleep(0.05)
+
+
+def test_hash_ring_moves_few_endpoints():
+    # Setup
+    endpoints = [f"http://example{i}.com/health" for i in range(2000)]
+    ring = HashRing()
+    for node in ("a", "b", "c"):
+        ring.add(node)
+    before = {endpoint: ring.node_for(endpoint) for endpoint in endpoints}
+
+    # Exercise
+    ring.add("d")
+    joined = {endpoint: ring.node_for(endpoint) for endpoint in endpoints}
+    ring.remove("d")
+    left = {endpoint: ring.node_for(endpoint) for endpoint in endpoints}
+
+    # Assert
+    moved = [e for e in endpoints if joined[e] != before[e]]
+    assert {joined[endpoint] for endpoint in moved} == {"d"}
+    assert 0.15 < len(moved) / len(endpoints) < 0.35
+    assert left == before
+    assert sorted(map(len, ring.assign(endpoints).values()))[0] > 400
+
+
+@pytest.mark.asyncio
+async def test_coordinator_rebalances_workers(server):
+    # Setup
+    endpoints = [f"{server}/{i}" for i in range(30)] + [f"{server}/down"]
+    app_config = AppConfig(
+        endpoints=endpoints,
+        check_interval=1,
+        warn_threshold=5,
+        retries=1,
+        cluster_report_interval=0.1,
+        cluster_heartbeat_timeout=1.0,
+    )
+    coordinator = Coordinator(app_config)
+    coordinator_task = asyncio.create_task(coordinator.run())
+    await _wait_for(lambda: coordinator._server is not None)
+    host, port = coordinator.address
+    workers = [
+        ClusterWorker(app_config, host, port, f"worker-{i}") for i in range(3)
+    ]
+    tasks = [asyncio.create_task(worker.run()) for worker in workers]
+
+    try:
+        # Exercise
+        await _wait_for(lambda: len(coordinator.results) == len(endpoints))
+        before = coordinator.assignments()
+        reassigned = coordinator.counters["reassigned"]
+        workers[0].stop()
+        await tasks[0]
+        await _wait_for(lambda: len(coordinator.assignments()) == 2)
+        after = coordinator.assignments()
+        reassigned = coordinator.counters["reassigned"] - reassigned
+        coordinator.results.clear()
+        await _wait_for(lambda: len(coordinator.results) == len(endpoints))
+    finally:
+        for worker in workers[1:]:
+            worker.stop()
+        await asyncio.gather(*tasks[1:])
+        coordinator.stop()
+        await coordinator_task
+
+    # Assert
+    assert sorted(sum(before.values(), [])) == sorted(endpoints)
+    assert all(before.values())
+    assert sorted(sum(after.values(), [])) == sorted(endpoints)
+    for worker_id in ("worker-1", "worker-2"):
+        assert set(before[worker_id]) <= set(after[worker_id])
+    assert coordinator.results[f"{server}/down"].status_code == 503
+    assert coordinator.counters["probes"] >= 2 * len(endpoints)
+    assert reassigned == len(before["worker-0"])
+
+
+@pytest.mark.asyncio
+async def test_silent_worker_is_dropped(server):
+    # Setup
+    app_config = AppConfig(
+        endpoints=[f"{server}/a", f"{server}/b"],
+        check_interval=1,
+        warn_threshold=5,
+        retries=1,
+        cluster_heartbeat_timeout=0.4,
+    )
+    coordinator = Coordinator(app_config)
+    coordinator_task = asyncio.create_task(coordinator.run())
+    await _wait_for(lambda: coordinator._server is not None)
+    reader, writer = await asyncio.open_connection(*coordinator.address)
+
+    # Exercise
+    writer.write(b'{"type": "register", "worker": "silent"}\n')
+    assignment = json.loads(await reader.readline())
+    dropped = await asyncio.wait_for(reader.read(), 5)
+    coordinator.stop()
+    await coordinator_task
+
+    # Assert
+    assert assignment == {"type": "assign", "endpoints": app_config.endpoints}
+    assert dropped == b""
+    assert coordinator.counters["leaves"] == 1
+
+
+@pytest.mark.asyncio
+async def test_worker_processes_join_the_coordinator(server, tmp_path):
+    # Setup
+    endpoints = [f"{server}/{i}" for i in range(10)]
+    app_config = AppConfig(
+        endpoints=endpoints,
+        check_interval=1,
+        warn_threshold=5,
+        retries=1,
+        cluster_report_interval=0.1,
+    )
+    config_path = tmp_path / "config.json"
+    config_path.write_text(
+        json.dumps(
+            {
+                "endpoints": endpoints,
+                "check_interval": 1,
+                "warn_threshold": 5,
+                "retries": 1,
+                "cluster_report_interval": 0.1,
+            }
+        )
+    )
+    coordinator = Coordinator(app_config)
+    coordinator_task = asyncio.create_task(coordinator.run())
+    await _wait_for(lambda: coordinator._server is not None)
+    host, port = coordinator.address
+    environment = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join(
+            [str(_ROOT / "src"), os.environ.get("PYTHONPATH", "")]
+        ),
+    )
+
+    # Exercise
+    processes = [
+        subprocess.Popen(
+            [
+                sys.executable,
+                str(_ROOT / "run_monitor.py"),
+                "--config",
+                str(config_path),
+                "--log",
+                str(tmp_path / f"worker-{i}.log"),
+                "--join",
+                f"{host}:{port}",
+                "--worker-id",
+                f"worker-{i}",
+            ],
+            env=environment,
+        )
+        for i in range(2)
+    ]
+    try:
+        await _wait_for(
+            lambda: len(coordinator.assignments()) == 2
+            and len(coordinator.results) == len(endpoints),
+            timeout=30,
+        )
+        assignments = coordinator.assignments()
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+        coordinator.stop()
+        await coordinator_task
+
+    # Assert
+    assert sorted(assignments) == ["worker-0", "worker-1"]
+    assert sorted(sum(assignments.values(), [])) == sorted(endpoints)
+    assert coordinator.counters["joins"] == 2
+    assert {result.status_code for result in coordinator.results.values()} == {
+        200
+    }
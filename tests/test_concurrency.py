@@ -0,0 +1,54 @@
+import asyncio
+from collections import Counter
+
+import pytest
+
+from app_monitor.concurrency import AdaptiveLimit, ProbeLimiter
+
+
+@pytest.mark.asyncio
+async def test_probe_limiter_caps_global_and_per_host_concurrency():
+    # Setup
+    limiter = ProbeLimiter(max_concurrency=3, max_per_host=2)
+    per_host: Counter = Counter()
+    peaks = {"global": 0, "example1.com": 0, "example2.com": 0}
+
+    async def probe(host):
+        async with limiter.slot(host):
+            per_host[host] += 1
+            peaks[host] = max(peaks[host], per_host[host])
+            peaks["global"] = max(peaks["global"], limiter.in_flight)
+            await asyncio.sleep(0.01)
+            per_host[host] -= 1
+
+    # Exercise
+    await asyncio.gather(*(probe(f"example{i % 2 + 1}.com") for i in range(20)))
+
+    # Assert
+    assert peaks == {"global": 3, "example1.com": 2, "example2.com": 2}
+    assert limiter.in_flight == 0
+
+
+def test_adaptive_limit_shrinks_on_latency_and_errors_and_grows_back():
+    # Setup
+    limit = AdaptiveLimit(max_limit=50, initial_limit=20)
+
+    def window(latency, failed=False):
+        for _ in range(max(limit.limit, 10)):
+            limit.record(latency, failed, in_flight=limit.limit)
+
+    # Exercise / Assert
+    window(0.1)
+    grown = limit.limit
+    assert grown > 20
+
+    window(0.5)
+    assert limit.limit < grown
+
+    shrunk = limit.limit
+    window(0.1, failed=True)
+    assert limit.limit < shrunk
+
+    for _ in range(30):
+        window(0.1)
+    assert limit.limit == 50
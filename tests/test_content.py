@@ -0,0 +1,177 @@
+import gzip
+from http.server import BaseHTTPRequestHandler
+import json
+
+import pytest
+
+from app_monitor.async_monitor import AsyncAppMonitor
+from app_monitor.content import ContentCheck, parse_assertions
+from app_monitor.monitor import AppMonitor
+from app_monitor.probing import parse_probe_options
+
+_DOCUMENT = json.dumps(
+    {
+        "version": "1.2.3",
+        "checks": {"db": {"status": "up"}, "queues": [3, {"lag": 0}]},
+        "notes": [{"text": 'brackets "}]" in a string\\'}],
+        "status": "ok",
+        "padding": "x" * 1000,
+    }
+).encode()
+
+_PAGES = {
+    "/health": _DOCUMENT + b" " * 1_000_000,
+    "/error": b"<html><h1>Internal error</h1></html>",
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = _PAGES[self.path]
+        # The error page is compressed, the health document is not so that
+        # reading it all would be costly
+        gzipped = self.path == "/error" and "gzip" in self.headers.get(
+            "Accept-Encoding", ""
+        )
+        if gzipped:
+            body = gzip.compress(body)
+        self.send_response(200)
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except ConnectionError:
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(http_server):
+    return http_server(_Handler).url
+
+
+def _check(raw, body, chunk_size):
+    check = ContentCheck(parse_assertions(raw))
+    for start in range(0, len(body), chunk_size):
+        if check.feed(body[start : start + chunk_size]):
+            break
+    else:
+        check.finish()
+    return check
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 16384])
+@pytest.mark.parametrize(
+    "raw, failure",
+    [
+        ({"json": {"status": "ok", "checks.db.status": "up"}}, None),
+        ({"json": {"checks.queues.1.lag": 0}}, None),
+        (
+            {"json": {"checks.db.status": "down"}},
+            'body has checks.db.status="up", expected "down"',
+        ),
+        ({"json": {"checks.db.role": "primary"}}, "body has no field "),
+        ({"json": {"checks": True}}, "body has an object or array at "),
+        ({"contains": '"status": "ok"'}, None),
+        ({"contains": ["1.2.3", "missing"]}, "body lacks 'missing'"),
+        ({"matches": r'"version": "1\.[0-9]+'}, None),
+        ({"matches": "^<html>"}, "body does not match '^<html>'"),
+    ],
+)
+def test_content_check(raw, failure, chunk_size):
+    # Exercise
+    check = _check(raw, _DOCUMENT, chunk_size)
+
+    # Assert
+    if failure is None:
+        assert check.failure is None
+    else:
+        assert check.failure.startswith(failure)
+
+
+def test_content_check_stops_once_decided():
+    # Exercise
+    passed = _check({"json": {"version": "1.2.3"}}, _DOCUMENT, 7)
+    failed = _check({"json": {"version": "2.0"}}, _DOCUMENT, 7)
+    budget = _check(
+        {"contains": "padding", "content_max_bytes": 20}, _DOCUMENT, 7
+    )
+
+    # Assert
+    assert passed.failure is None and passed.read < 30
+    assert failed.failure is not None and failed.read < 30
+    assert budget.read == 20
+    assert budget.failure == "body lacks 'padding' in its first 20 bytes"
+
+
+def test_parse_probe_options_with_assertions():
+    # Exercise
+    options = parse_probe_options(
+        {"matches": "ok|up", "json": {"status": "ok"}, "content_max_bytes": 99}
+    )
+
+    # Assert
+    assert options.assertions.patterns[0].pattern == b"ok|up"
+    assert options.assertions.json_fields == ((("status",), "ok"),)
+    assert options.assertions.max_bytes == 99
+    for raw in [
+        {"matches": "("},
+        {"contains": ""},
+        {"json": {"a": [1]}},
+        {"contains": "ok", "method": "HEAD"},
+        {"contains": "ok", "content_max_bytes": 0},
+    ]:
+        with pytest.raises(ValueError):
+            parse_probe_options(raw)
+
+
+_LACKS_STATUS = "body lacks '\"status\"'"
+
+
+@pytest.fixture
+def app_config(server, make_app_config):
+    return make_app_config(
+        [f"{server}/health", f"{server}/error"],
+        endpoint_probes={
+            f"{server}/health": parse_probe_options({"json": {"status": "ok"}}),
+            f"{server}/error": parse_probe_options({"contains": '"status"'}),
+        },
+    )
+
+
+@pytest.mark.asyncio
+async def test_async_monitor_checks_content(server, app_config, caplog):
+    # Setup
+    monitor = AsyncAppMonitor(app_config)
+
+    # Exercise
+    results = await monitor.check_once()
+
+    # Assert
+    assert [result.status_code for result in results] == [200, 200]
+    assert [result.failure for result in results] == [None, _LACKS_STATUS]
+    assert monitor.counters["errors"] == 1
+    assert f"failed its content check: {_LACKS_STATUS}" in caplog.text
+    # The 1 MB body was left unread once the field was found
+    assert monitor.counters["body_bytes"] < 100_000
+    sample = monitor.history.recent(f"{server}/error")[0]
+    assert (sample.status_code, sample.check_failed) == (200, True)
+    assert monitor.history.rollup(f"{server}/error", "1m")[0].errors == 1
+
+
+def test_serial_monitor_checks_content(server, app_config, caplog):
+    # Setup
+    monitor = AppMonitor(app_config)
+
+    # Exercise
+    results = monitor.check_once()
+    monitor.close()
+
+    # Assert
+    assert [result.status_code for result in results] == [200, 200]
+    assert [result.failure for result in results] == [None, _LACKS_STATUS]
+    assert f"failed its content check: {_LACKS_STATUS}" in caplog.text
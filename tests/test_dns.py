@@ -0,0 +1,140 @@
+import asyncio
+from http.server import BaseHTTPRequestHandler
+import socket
+import time
+from unittest.mock import patch
+
+import pytest
+
+from app_monitor.app_config import AppConfig
+from app_monitor.dns import DNSCache
+from app_monitor.monitor import AppMonitor
+
+
+def _infos(*addresses):
+    return [
+        (socket.AF_INET, socket.SOCK_STREAM, 6, "", (address, 0))
+        for address in addresses
+    ]
+
+
+def test_resolutions_are_reused_until_they_expire():
+    # Setup
+    dns_cache = DNSCache(ttl=0.05)
+
+    # Exercise
+    with patch.object(
+        socket, "getaddrinfo", return_value=_infos("10.0.0.1", "10.0.0.1")
+    ) as mocked:
+        first = dns_cache.resolve_sync("Example1.com")
+        second = dns_cache.resolve_sync("example1.com")
+        time.sleep(0.06)
+        third = dns_cache.resolve_sync("example1.com")
+
+    # Assert
+    assert first == second == third == ["10.0.0.1"]
+    assert mocked.call_count == 2
+    stats = dns_cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["saved_seconds"] > 0
+
+
+def test_failed_resolutions_are_cached():
+    # Setup
+    dns_cache = DNSCache(negative_ttl=10)
+    error = socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+
+    # Exercise
+    with patch.object(socket, "getaddrinfo", side_effect=error) as mocked:
+        for _ in range(3):
+            with pytest.raises(socket.gaierror):
+                dns_cache.resolve_sync("example1.invalid")
+
+    # Assert
+    assert mocked.call_count == 1
+    assert dns_cache.stats()["negative_hits"] == 2
+
+
+def test_least_recently_used_names_are_evicted():
+    # Setup
+    dns_cache = DNSCache(max_entries=2)
+
+    # Exercise
+    with patch.object(
+        socket, "getaddrinfo", return_value=_infos("10.0.0.1")
+    ) as mocked:
+        for host in ["example1.com", "example2.com", "example1.com"]:
+            dns_cache.resolve_sync(host)
+        dns_cache.resolve_sync("example3.com")
+        dns_cache.resolve_sync("example1.com")
+        dns_cache.resolve_sync("example2.com")
+
+    # Assert
+    assert mocked.call_count == 4
+    assert len(dns_cache) == 2
+    assert dns_cache.stats()["evictions"] == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_lookups_are_coalesced():
+    # Setup
+    dns_cache = DNSCache()
+    calls = []
+
+    async def getaddrinfo(host, *args, **kwargs):
+        calls.append(host)
+        await asyncio.sleep(0.05)
+        return _infos("10.0.0.1")
+
+    loop = asyncio.get_running_loop()
+
+    # Exercise
+    with patch.object(loop, "getaddrinfo", getaddrinfo):
+        # A caller giving up does not cancel the lookup of the others
+        with pytest.raises(TimeoutError):
+            await asyncio.wait_for(dns_cache.resolve("example1.com"), 0.01)
+        addresses = await asyncio.gather(
+            *(dns_cache.resolve("example1.com") for _ in range(10))
+        )
+
+    # Assert
+    assert calls == ["example1.com"]
+    assert addresses == [["10.0.0.1"]] * 10
+    assert dns_cache.stats()["coalesced"] == 10
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def test_serial_workers_share_the_cache(http_server):
+    # Setup
+    httpd = http_server(_Handler)
+    endpoint = f"http://localhost:{httpd.server_address[1]}/"
+    app_monitor = AppMonitor(
+        AppConfig(
+            endpoints=[endpoint] * 8,
+            check_interval=0,
+            warn_threshold=5,
+            retries=1,
+        ),
+        workers=4,
+    )
+
+    # Exercise
+    app_monitor.probe_endpoint(endpoint)
+    app_monitor.probe_all_endpoints()
+    app_monitor.close()
+
+    # Assert
+    stats = app_monitor.dns_cache.stats()
+    assert stats["misses"] == 1
+    assert stats["hits"] + stats["coalesced"] == 8
@@ -0,0 +1,79 @@
+import gc
+import tracemalloc
+
+from app_monitor.async_monitor import AsyncAppMonitor
+from app_monitor.endpoints import NOT_PROBED, EndpointTable
+from app_monitor.probing import ProbeOptions
+
+# Bytes of runtime state per endpoint, scheduling included, at 100k endpoints
+BYTES_PER_ENDPOINT = 400
+
+
+def test_endpoint_table_keeps_state_across_updates(make_app_config):
+    # Setup
+    table = EndpointTable()
+    head = ProbeOptions("HEAD")
+    endpoints = [
+        "https://Example.com/a",
+        "https://example.com/b",
+        "tcp://db.example.com:5432",
+    ]
+
+    # Exercise
+    added, removed = table.update(make_app_config(endpoints))
+    first, second, tcp = added
+    shared = first.options is second.options
+    first.probes = 3
+    added_again, removed_again = table.update(
+        make_app_config(
+            endpoints[:2] + ["https://example.com/c"],
+            endpoint_probes={endpoints[1]: head},
+        )
+    )
+
+    # Assert
+    assert removed == []
+    assert first.host is second.host
+    assert first.origin is second.origin == "https://example.com"
+    assert shared
+    assert tcp.socket_probe and not first.socket_probe
+    assert first.last_status == NOT_PROBED
+    assert [state.url for state in added_again] == ["https://example.com/c"]
+    assert removed_again == [tcp]
+    assert table[endpoints[0]] is first and first.probes == 3
+    assert second.options == head
+    assert endpoints[2] not in table
+    assert table.state(endpoints[2]).host == "db.example.com"
+
+
+def test_runtime_state_fits_its_budget_at_100k_endpoints(make_app_config):
+    # Setup
+    count = 100_000
+    app_config = make_app_config(
+        [f"https://host{i % 1000}.example.com/health/{i}" for i in range(count)]
+    )
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+
+        # Exercise
+        monitor = AsyncAppMonitor(app_config)
+        monitor._schedule(0.0)
+        scheduled = tracemalloc.get_traced_memory()[0]
+        # Stands in for the probes, which allocate their own task
+        monitor._dispatch = lambda state: None
+        monitor._dispatch_due(60.0)
+        cycle_start = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        monitor._dispatch_due(120.0)
+        cycle_end, cycle_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # Assert
+    assert len(monitor._scheduler) == count
+    assert (scheduled - before) / count < BYTES_PER_ENDPOINT
+    # A cycle dispatching every endpoint allocates nothing per endpoint
+    assert cycle_end - cycle_start < count // 100
+    assert cycle_peak - cycle_start < count // 100
@@ -0,0 +1,101 @@
+import math
+
+import pytest
+
+from app_monitor.history import HistoryStore, RollupStats
+
+
+@pytest.fixture
+def history() -> HistoryStore:
+    return HistoryStore(capacity=4)
+
+
+def test_recent_returns_newest_first_and_wraps(history):
+    # Exercise
+    for i in range(6):
+        history.record(
+            "http://example1.com/status",
+            status_code=200 if i % 2 else 500,
+            response_time=i / 10,
+            timestamp=1000.0 + i,
+        )
+
+    # Assert
+    samples = history.recent("http://example1.com/status")
+    assert [sample.timestamp for sample in samples] == [
+        1005.0,
+        1004.0,
+        1003.0,
+        1002.0,
+    ]
+    assert [sample.status_code for sample in samples] == [200, 500, 200, 500]
+    assert samples[0].response_time == pytest.approx(0.5)
+    assert history.recent("http://example1.com/status", since=1004.0) == (
+        samples[:2]
+    )
+    assert history.recent("http://example1.com/status", limit=1) == (
+        samples[:1]
+    )
+    assert history.recent("http://example2.com/status") == []
+
+
+def test_rollups_are_maintained_per_window(history):
+    # Exercise
+    for timestamp, status_code, response_time in [
+        (59.0, 200, 0.5),
+        (60.0, 200, 0.1),
+        (70.0, 0, 0.3),
+        (119.0, 502, 0.2),
+        (120.0, 200, 0.4),
+    ]:
+        history.record(
+            "http://example1.com/status",
+            status_code,
+            response_time,
+            timestamp=timestamp,
+        )
+
+    # Assert
+    current, previous = history.rollup(
+        "http://example1.com/status", "1m", now=130.0
+    )
+    assert current == RollupStats(
+        start=120.0,
+        probes=1,
+        errors=0,
+        min=pytest.approx(0.4),
+        max=pytest.approx(0.4),
+        mean=pytest.approx(0.4),
+    )
+    assert previous == RollupStats(
+        start=60.0,
+        probes=3,
+        errors=2,
+        min=pytest.approx(0.1),
+        max=pytest.approx(0.3),
+        mean=pytest.approx(0.2),
+    )
+    five_minutes, _ = history.rollup(
+        "http://example1.com/status", "5m", now=130.0
+    )
+    assert (five_minutes.probes, five_minutes.errors) == (5, 2)
+
+    stale, last = history.rollup("http://example1.com/status", "1m", now=1000.0)
+    assert stale.probes == 0 and math.isnan(stale.mean)
+    assert last.probes == 0
+
+
+def test_removed_endpoint_slot_is_reused_empty(history):
+    # Setup
+    history.record("http://example1.com/status", 200, 0.1, timestamp=1.0)
+
+    # Exercise
+    history.remove_endpoint("http://example1.com/status")
+    history.record("http://example2.com/status", 200, 0.2, timestamp=2.0)
+
+    # Assert
+    assert "http://example1.com/status" not in history
+    assert len(history) == 1
+    assert [
+        s.timestamp for s in history.recent("http://example2.com/status")
+    ] == [2.0]
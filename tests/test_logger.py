@@ -1,6 +1,16 @@
+import io
 import logging
 from pathlib import Path
-from app_monitor.logger import set_file_handler, LOGGER
+import queue
+import time
+from app_monitor.logger import (
+    BufferedHandler,
+    DroppingQueueHandler,
+    disable_queue_logging,
+    enable_queue_logging,
+    set_file_handler,
+    LOGGER,
+)
 import tempfile
 
 
@@ -15,3 +25,78 @@ def test_set_file_handler():
     for handler in LOGGER.handlers:
         if isinstance(handler, logging.FileHandler):
             assert handler.baseFilename == tmp_file.name
+
+
+def test_queue_logging_writes_from_listener_thread():
+    # Setup
+    tmp_file = tempfile.NamedTemporaryFile()
+    set_file_handler(log_path=Path(tmp_file.name), buffer_capacity=100)
+    enable_queue_logging()
+
+    # Exercise
+    try:
+        assert all(
+            isinstance(handler, DroppingQueueHandler)
+            for handler in LOGGER.handlers
+        )
+        for i in range(10):
+            LOGGER.warning(f"Endpoint http://example{i}.com is slow")
+    finally:
+        disable_queue_logging()
+
+    # Assert
+    with open(tmp_file.name) as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 10
+    assert "Endpoint http://example9.com is slow" in lines[-1]
+    assert not any(
+        isinstance(handler, DroppingQueueHandler) for handler in LOGGER.handlers
+    )
+
+
+def test_dropping_queue_handler_reports_dropped_records():
+    # Setup
+    record_queue: queue.Queue = queue.Queue(maxsize=2)
+    handler = DroppingQueueHandler(record_queue)
+    logger = logging.getLogger("test_dropping_queue_handler")
+    logger.propagate = False
+    logger.addHandler(handler)
+
+    # Exercise
+    for i in range(5):
+        logger.error(f"record {i}")
+    drained = [record_queue.get_nowait().getMessage() for _ in range(2)]
+    logger.error("record 5")
+
+    # Assert
+    assert handler.dropped == 3
+    assert drained == ["record 0", "record 1"]
+    assert [record_queue.get_nowait().getMessage() for _ in range(2)] == [
+        "Dropped 3 log records: logging queue full",
+        "record 5",
+    ]
+
+
+def test_buffered_handler_writes_a_record_followed_by_silence():
+    # Setup
+    stream = io.StringIO()
+    handler = BufferedHandler(
+        100, target=logging.StreamHandler(stream), flush_interval=0.05
+    )
+    logger = logging.getLogger("test_buffered_handler")
+    logger.propagate = False
+    logger.addHandler(handler)
+
+    # Exercise
+    logger.error("Endpoint http://example1.com is unreachable")
+    buffered = stream.getvalue()
+    deadline = time.monotonic() + 5
+    while not stream.getvalue() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    written = stream.getvalue()
+    logger.removeHandler(handler)
+    handler.close()
+
+    # Assert
+    assert buffered == ""
+    assert written == "Endpoint http://example1.com is unreachable\n"
@@ -0,0 +1,154 @@
+import asyncio
+from typing import NamedTuple
+from unittest.mock import patch, PropertyMock
+
+import httpx
+import pytest
+from pytest_httpx import HTTPXMock
+
+from app_monitor.app_config import AppConfig
+from app_monitor.async_monitor import AsyncAppMonitor
+from app_monitor.metrics import MetricsRegistry, MetricsServer
+from app_monitor.notifier import NotificationDispatcher
+from app_monitor.results import ProbeResult
+
+
+class _Response(NamedTuple):
+    status_code: int
+    headers: dict[str, str]
+    text: str
+
+
+async def _get(port: int, path: str, accept: str = "*/*") -> _Response:
+    # Plain streams, so that pytest-httpx does not intercept the request
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    request = f"GET {path} HTTP/1.1\r\nAccept: {accept}\r\n\r\n"
+    writer.write(request.encode())
+    data = await reader.read()
+    writer.close()
+    head, _, body = data.decode().partition("\r\n\r\n")
+    status_line, *header_lines = head.split("\r\n")
+    headers = {}
+    for line in header_lines:
+        name, _, value = line.partition(":")
+        headers[name.lower()] = value.strip()
+    return _Response(int(status_line.split()[1]), headers, body)
+
+
+async def _scrape(registry: MetricsRegistry, accept: str = "*/*"):
+    server = MetricsServer(registry)
+    await server.start()
+    try:
+        return await _get(server.port, "/metrics", accept)
+    finally:
+        await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_registry_aggregates_and_caches_per_endpoint():
+    # Setup
+    registry = MetricsRegistry()
+    endpoint = "http://example1.com/status"
+
+    # Exercise
+    registry.observe(ProbeResult(endpoint, 200, 0.02))
+    registry.observe(ProbeResult(endpoint, 500, 0.3))
+    registry.record_retry(endpoint)
+    registry.observe(ProbeResult("http://example2.com/status", 200, 0.004))
+    response = await _scrape(registry)
+    cached = registry._endpoints[endpoint].rendered
+
+    # Assert
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    lines = response.text.splitlines()
+    label = 'endpoint="http://example1.com/status"'
+    bucket = "app_monitor_probe_duration_seconds_bucket"
+    for line in [
+        "# TYPE app_monitor_probe_duration_seconds histogram",
+        f'{bucket}{{{label},le="0.01"}} 0',
+        f'{bucket}{{{label},le="0.025"}} 1',
+        f'{bucket}{{{label},le="0.5"}} 2',
+        f'{bucket}{{{label},le="+Inf"}} 2',
+        f"app_monitor_probe_duration_seconds_count{{{label}}} 2",
+        "# TYPE app_monitor_probe_status_total counter",
+        f'app_monitor_probe_status_total{{{label},code="200"}} 1',
+        f'app_monitor_probe_status_total{{{label},code="500"}} 1',
+        f"app_monitor_probe_retries_total{{{label}}} 1",
+        f"app_monitor_endpoint_up{{{label}}} 0",
+        'app_monitor_endpoint_up{endpoint="http://example2.com/status"} 1',
+    ]:
+        assert line in lines
+    # Every family is written once, with the samples of all endpoints
+    assert lines.count("# TYPE app_monitor_endpoint_up gauge") == 1
+    # Unchanged endpoints are not rendered again
+    assert cached is not None
+    await _scrape(registry)
+    assert registry._endpoints[endpoint].rendered is cached
+    registry.observe(ProbeResult(endpoint, 200, 0.02))
+    assert registry._endpoints[endpoint].rendered is None
+
+
+@pytest.mark.asyncio
+async def test_server_negotiates_openmetrics_and_rejects_other_paths():
+    # Setup
+    registry = MetricsRegistry()
+    registry.observe(ProbeResult("http://example1.com/status", 200, 0.02))
+    server = MetricsServer(registry)
+    await server.start()
+
+    # Exercise
+    try:
+        response = await _scrape(
+            registry, accept="application/openmetrics-text; version=1.0.0"
+        )
+        missing = await _get(server.port, "/x")
+    finally:
+        await server.stop()
+
+    # Assert
+    assert response.headers["content-type"].startswith(
+        "application/openmetrics-text"
+    )
+    assert "# TYPE app_monitor_probe_status counter" in response.text
+    assert response.text.endswith("# EOF\n")
+    assert missing.status_code == 404
+
+
+@pytest.mark.asyncio
+@patch.object(AsyncAppMonitor, "RUN", new_callable=PropertyMock)
+async def test_async_monitor_exports_its_metrics(mocked, httpx_mock: HTTPXMock):
+    # Setup
+    app_config = AppConfig(
+        endpoints=["http://example1.com/status", "http://example2.com/status"],
+        check_interval=1,
+        retries=2,
+        metrics_port=0,
+    )
+    async_monitor = AsyncAppMonitor(app_config)
+    mocked.side_effect = [True, False]
+    httpx_mock.add_exception(
+        url="http://example1.com/status",
+        exception=httpx.ConnectError("Connection to server failed"),
+    )
+    httpx_mock.add_response(url="http://example1.com/status")
+    httpx_mock.add_response(url="http://example2.com/status", status_code=200)
+
+    # Exercise
+    with patch.object(NotificationDispatcher, "notify"):
+        await async_monitor.supervisor()
+    response = await _scrape(async_monitor.metrics)
+
+    # Assert
+    text = response.text
+    assert async_monitor.counters["retries"] == 1
+    assert (
+        "app_monitor_probe_retries_total"
+        '{endpoint="http://example1.com/status"} 1' in text
+    )
+    assert (
+        'app_monitor_endpoint_up{endpoint="http://example2.com/status"} 1'
+        in text
+    )
+    assert "app_monitor_dispatch_lag_seconds_count 2" in text
+    assert "app_monitor_scheduled_endpoints 2" in text
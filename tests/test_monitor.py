@@ -94,3 +94,30 @@ def test_app_monitor(mocked, app_config, caplog):
         ),
     ]:
         assert msg.search(caplog.text)
+
+
+@responses.activate
+@patch.object(AppMonitor, "RUN", new_callable=PropertyMock)
+def test_app_monitor_with_workers(mocked, app_config, caplog):
+    # Setup
+    app_monitor = AppMonitor(app_config._replace(check_interval=0), workers=3)
+    mocked.side_effect = [True, True, False]
+    sessions = set()
+    probe_endpoint = app_monitor.probe_endpoint
+
+    def tracking_probe_endpoint(endpoint):
+        sessions.add(id(app_monitor.session))
+        probe_endpoint(endpoint)
+
+    app_monitor.probe_endpoint = tracking_probe_endpoint
+    for endpoint in app_config.endpoints:
+        responses.get(endpoint, status=404)
+
+    # Exercise
+    app_monitor.run()
+
+    # Assert
+    assert len(responses.calls) == 6
+    assert 1 <= len(sessions) <= 3
+    for endpoint in app_config.endpoints:
+        assert f"Endpoint {endpoint} returned status code 404" in caplog.text
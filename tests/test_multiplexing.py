@@ -0,0 +1,76 @@
+import asyncio
+from unittest.mock import patch
+
+import httpx
+import pytest
+from pytest_httpx import HTTPXMock
+
+from app_monitor import async_monitor as async_monitor_module
+from app_monitor.app_config import AppConfig
+from app_monitor.async_monitor import AsyncAppMonitor
+from app_monitor.async_transport import build_transport
+from app_monitor.multiplexing import OriginStreams
+
+
+@pytest.mark.asyncio
+async def test_origin_streams_track_concurrency():
+    # Setup
+    streams = OriginStreams()
+
+    async def request(origin):
+        with streams.track(origin):
+            await asyncio.sleep(0.01)
+
+    # Exercise
+    await asyncio.gather(
+        *(request("https://example1.com") for _ in range(5)),
+        request("https://example2.com"),
+    )
+    streams.record_version("https://example1.com", "HTTP/2")
+    families = streams.collect()
+
+    # Assert
+    assert streams.peak("https://example1.com") == 5
+    assert streams.peak("https://example2.com") == 1
+    assert streams.versions("https://example1.com") == {"HTTP/2": 1}
+    assert families[1].samples == [
+        'app_monitor_origin_streams_peak{origin="https://example1.com"} 5\n',
+        'app_monitor_origin_streams_peak{origin="https://example2.com"} 1\n',
+    ]
+
+
+def test_build_transport_offers_http2():
+    # Setup
+    pytest.importorskip("h2")
+
+    # Exercise
+    transport = build_transport(httpx.Limits(), http2=True)
+
+    # Assert
+    assert transport._pool._http2
+
+
+@pytest.mark.asyncio
+async def test_http2_falls_back_without_h2(httpx_mock: HTTPXMock, caplog):
+    # Setup
+    endpoints = [f"https://example1.com/{i}" for i in range(3)]
+    app_config = AppConfig(endpoints=endpoints, retries=1, http2=True)
+    async_monitor = AsyncAppMonitor(app_config)
+    httpx_mock.add_response(is_reusable=True)
+
+    # Exercise
+    with patch.object(
+        async_monitor_module, "http2_available", return_value=False
+    ):
+        await asyncio.gather(
+            *(
+                async_monitor.check_endpoint_health(endpoint, 1)
+                for endpoint in endpoints
+            )
+        )
+
+    # Assert
+    assert "HTTP/2 needs the h2 package" in caplog.text
+    assert async_monitor.streams.versions("https://example1.com") == {
+        "HTTP/1.1": 3
+    }
@@ -0,0 +1,103 @@
+import asyncio
+from http.server import BaseHTTPRequestHandler
+import json
+import time
+
+import pytest
+
+from app_monitor.notifier import NotificationDispatcher
+
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.received.append((time.monotonic(), json.loads(body)))
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def webhook(http_server):
+    return http_server(_WebhookHandler)
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_batches_dedupes_and_rate_limits(webhook):
+    # Setup
+    dispatcher = NotificationDispatcher(
+        webhook_url=f"{webhook.url}/hook",
+        batch_window=0.05,
+        rate_limit=2,
+    )
+    await dispatcher.start()
+
+    # Exercise
+    dispatcher.notify("Endpoint http://example1.com is unreachable")
+    dispatcher.notify("Endpoint http://example2.com returned status code 500")
+    dispatcher.notify("Endpoint http://example1.com is unreachable")
+    await asyncio.sleep(0.1)
+    dispatcher.notify("Endpoint http://example1.com is unreachable")
+    dispatcher.notify("Endpoint http://example3.com returned status code 502")
+    await dispatcher.stop()
+
+    # Assert
+    texts = [payload["text"] for _, payload in webhook.received]
+    assert texts == [
+        "2 alerts:\n"
+        "- Endpoint http://example1.com is unreachable (x2)\n"
+        "- Endpoint http://example2.com returned status code 500",
+        "Endpoint http://example3.com returned status code 502",
+    ]
+    (first, _), (second, _) = webhook.received
+    assert second - first >= 0.3
+    assert dispatcher.counters["sent"] == 2
+    assert dispatcher.counters["deduplicated"] == 2
+
+
+def test_dispatcher_in_thread_drops_when_queue_is_full(webhook):
+    # Setup
+    dispatcher = NotificationDispatcher(
+        webhook_url=f"{webhook.url}/hook",
+        batch_window=0.2,
+        max_queue=3,
+    )
+    dispatcher.start_in_thread()
+
+    # Exercise
+    for i in range(10):
+        dispatcher.notify(f"Endpoint http://example{i}.com is unreachable")
+    dispatcher.stop_thread()
+
+    # Assert
+    assert dispatcher.counters["dropped"] >= 6
+    delivered = sum(
+        payload["text"].count("is unreachable")
+        for _, payload in webhook.received
+    )
+    assert delivered + dispatcher.counters["dropped"] == 10
+
+
+@pytest.mark.asyncio
+async def test_messages_wait_for_the_dispatcher_with_a_webhook(webhook):
+    # Setup
+    dispatcher = NotificationDispatcher(
+        webhook_url=f"{webhook.url}/hook",
+        batch_window=0.01,
+    )
+
+    # Exercise
+    dispatcher.notify("Endpoint http://example1.com is unreachable")
+    held = dispatcher.counters["sent"]
+    await dispatcher.start()
+    await dispatcher.stop()
+
+    # Assert
+    assert held == 0
+    assert [payload["text"] for _, payload in webhook.received] == [
+        "Endpoint http://example1.com is unreachable"
+    ]
+    assert dispatcher.counters["sent"] == 1
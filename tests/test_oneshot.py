@@ -0,0 +1,263 @@
+from http.server import BaseHTTPRequestHandler
+import json
+import os
+from pathlib import Path
+import socket
+import subprocess
+import sys
+
+import pytest
+
+from app_monitor.app_config import AppConfig
+from app_monitor.oneshot import (
+    FAILED,
+    HEALTHY,
+    UNHEALTHY,
+    check_once,
+    report,
+    run_once,
+)
+from app_monitor.results import ProbeResult
+
+_ROOT = Path(__file__).parents[1]
+
+# Runs run_monitor.py and prints the HTTP clients it imported to stderr
+_IMPORTED_CLIENTS = """
+import runpy, sys
+sys.argv = sys.argv[1:]
+try:
+    runpy.run_path(sys.argv[0], run_name="__main__")
+finally:
+    print(sorted({"httpx", "requests"} & set(sys.modules)), file=sys.stderr)
+"""
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        statuses = {"/down": 503, "/empty": 204}
+        self.send_response(statuses.get(self.path, 200))
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.received.append(json.loads(body)["text"])
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(http_server):
+    return http_server(_Handler)
+
+
+@pytest.fixture
+def stalled_endpoint():
+    # Connections are accepted by the kernel, and never answered
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        sock.listen()
+        yield f"http://127.0.0.1:{sock.getsockname()[1]}/"
+
+
+def _run_once(tmp_path, endpoints, *options):
+    config_path = tmp_path / "config.json"
+    config_path.write_text(
+        json.dumps(
+            {
+                "endpoints": endpoints,
+                "check_interval": 60,
+                "warn_threshold": 5,
+                "retries": 1,
+            }
+        )
+    )
+    environment = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join(
+            [str(_ROOT / "src"), os.environ.get("PYTHONPATH", "")]
+        ),
+    )
+    return subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            _IMPORTED_CLIENTS,
+            str(_ROOT / "run_monitor.py"),
+            "--config",
+            str(config_path),
+            "--once",
+            *options,
+        ],
+        capture_output=True,
+        text=True,
+        env=environment,
+        cwd=tmp_path,
+        timeout=30,
+    )
+
+
+def test_report_flags_unhealthy_and_slow_endpoints():
+    # Setup
+    app_config = AppConfig(
+        endpoints=[
+            "http://a.com",
+            "http://b.com",
+            "http://c.com",
+            "http://d.com",
+        ],
+        check_interval=60,
+        warn_threshold=1,
+    )
+    results = [
+        ProbeResult("http://a.com", 200, 1.5, slow=True),
+        ProbeResult("http://b.com", 503, 0.1),
+        ProbeResult("http://c.com", 200, 0.1, failure="body lacks 'ok'"),
+        None,
+    ]
+
+    # Exercise
+    summary = report(app_config, results)
+
+    # Assert
+    assert not summary["healthy"]
+    assert (summary["checked"], summary["unhealthy"], summary["slow"]) == (
+        4,
+        3,
+        1,
+    )
+    assert summary["results"][0] == {
+        "endpoint": "http://a.com",
+        "status_code": 200,
+        "response_time": 1.5,
+        "healthy": True,
+        "slow": True,
+        "failure": None,
+    }
+    assert summary["results"][2]["status_code"] == 200
+    assert summary["results"][2]["failure"] == "body lacks 'ok'"
+    assert not summary["results"][2]["healthy"]
+    assert summary["results"][3]["response_time"] is None
+
+
+@pytest.mark.parametrize("serial", [False, True])
+@pytest.mark.parametrize("warn_rule, slow", [("fixed", True), ("p95", False)])
+def test_report_follows_the_monitor_rules(
+    server, caplog, serial, warn_rule, slow
+):
+    # Setup
+    app_config = AppConfig(
+        endpoints=[f"{server.url}/a", f"{server.url}/empty"],
+        check_interval=60,
+        warn_threshold=0,
+        warn_rule=warn_rule,
+        retries=1,
+    )
+
+    # Exercise
+    summary = report(app_config, check_once(app_config, serial))
+
+    # Assert
+    first, second = summary["results"]
+    # Both monitors accept a 200 only, as the report does
+    assert (first["healthy"], second["healthy"]) == (True, False)
+    assert second["status_code"] == 204
+    assert f"Endpoint {server.url}/empty returned status code 204" in (
+        caplog.text
+    )
+    # p95 needs more samples than a single check takes
+    assert first["slow"] == slow
+
+
+@pytest.mark.parametrize(
+    "options, client", [((), "httpx"), (("--no-async",), "requests")]
+)
+def test_once_prints_json_and_exits_with_health(
+    server, tmp_path, options, client
+):
+    # Exercise
+    healthy = _run_once(
+        tmp_path, [f"{server.url}/a", f"{server.url}/b"], *options
+    )
+    unhealthy = _run_once(
+        tmp_path, [f"{server.url}/a", f"{server.url}/down"], *options
+    )
+
+    # Assert
+    assert healthy.returncode == HEALTHY
+    assert unhealthy.returncode == UNHEALTHY
+    assert json.loads(healthy.stdout)["checked"] == 2
+    results = json.loads(unhealthy.stdout)["results"]
+    assert [result["status_code"] for result in results] == [200, 503]
+    # Only the chosen backend's client is imported
+    assert healthy.stderr.splitlines()[-1] == repr([client])
+    # Without --log, nothing is written to the working directory
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["config.json"]
+
+
+@pytest.mark.parametrize("serial", [False, True])
+def test_once_fails_when_the_check_cannot_run(
+    tmp_path, capsys, make_app_config, serial
+):
+    # Setup
+    (tmp_path / "file").touch()
+    app_config = make_app_config(
+        ["http://127.0.0.1:1/"], store_path=str(tmp_path / "file" / "store")
+    )
+
+    # Exercise
+    code = run_once(app_config, serial)
+
+    # Assert
+    captured = capsys.readouterr()
+    assert code == FAILED
+    assert captured.out == ""
+    assert captured.err.startswith("Check failed: ")
+
+
+@pytest.mark.parametrize("serial", [False, True])
+def test_check_once_delivers_its_notifications(server, serial):
+    # Setup
+    app_config = AppConfig(
+        endpoints=[f"{server.url}/down"],
+        check_interval=60,
+        warn_threshold=5,
+        retries=1,
+        notification_webhook=f"{server.url}/hook",
+    )
+
+    # Exercise
+    check_once(app_config, serial)
+
+    # Assert
+    assert server.received == [
+        f"Endpoint {server.url}/down returned status code 503"
+    ]
+
+
+@pytest.mark.parametrize("serial", [False, True])
+def test_stalled_endpoint_is_reported_unhealthy(
+    server, stalled_endpoint, make_app_config, monkeypatch, serial
+):
+    # Setup
+    monkeypatch.setattr("app_monitor.async_monitor.PROBE_TIMEOUT", 0.2)
+    monkeypatch.setattr("app_monitor.monitor.PROBE_TIMEOUT", 0.2)
+    app_config = make_app_config(
+        [stalled_endpoint, f"{server.url}/a"],
+        notification_webhook=f"{server.url}/hook",
+    )
+
+    # Exercise
+    summary = report(app_config, check_once(app_config, serial))
+
+    # Assert
+    stalled, healthy = summary["results"]
+    assert (stalled["status_code"], stalled["healthy"]) == (0, False)
+    assert healthy["healthy"]
+    assert server.received[0].startswith(
+        f"Endpoint {stalled_endpoint} did not respond: "
+    )
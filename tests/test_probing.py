@@ -0,0 +1,228 @@
+from http.server import BaseHTTPRequestHandler
+import json
+from unittest.mock import patch
+
+import pytest
+from pytest_httpx import HTTPXMock
+
+from app_monitor.app_config import AppConfig, ConfigValidationError, load_config
+from app_monitor.async_monitor import AsyncAppMonitor
+from app_monitor import monitor
+from app_monitor.monitor import AppMonitor
+from app_monitor.notifier import NotificationDispatcher
+from app_monitor.probing import (
+    CONDITIONAL,
+    HEAD,
+    STREAM,
+    ProbeOptions,
+    ValidatorCache,
+    parse_probe_options,
+    read_body,
+)
+
+_BODY = b"x" * 1_000_000
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path == "/truncated":
+            # The connection drops after a few bytes of the body
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(_BODY)))
+            self.end_headers()
+            self.wfile.write(_BODY[:10])
+            self.close_connection = True
+            return
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.send_header("ETag", '"v1"')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(_BODY)))
+        self.end_headers()
+        try:
+            self.wfile.write(_BODY)
+        except OSError:
+            pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(_BODY)))
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def endpoint(http_server):
+    return f"{http_server(_Handler).url}/page"
+
+
+def test_parse_probe_options():
+    # Setup
+    default = ProbeOptions(STREAM, 512)
+
+    # Exercise / Assert
+    assert parse_probe_options({}, default) == default
+    assert parse_probe_options({"method": "head"}, default) == ProbeOptions(
+        HEAD, 512
+    )
+    for raw in [{"method": "POST"}, {"max_bytes": -1}, {"timeout": 1}]:
+        with pytest.raises(ValueError):
+            parse_probe_options(raw)
+
+
+def test_validator_cache_keeps_the_validators():
+    # Setup
+    validators = ValidatorCache()
+
+    # Exercise
+    validators.update("http://example1.com", 200, {"ETag": '"a"'})
+    validators.update(
+        "http://example1.com", 304, {"Last-Modified": "Mon, 05 Oct 2026"}
+    )
+    validators.update("http://example2.com", 200, {})
+    validators.update("http://example3.com", 500, {"ETag": '"b"'})
+
+    # Assert
+    assert validators.headers("http://example1.com") == {
+        "If-None-Match": '"a"',
+        "If-Modified-Since": "Mon, 05 Oct 2026",
+    }
+    assert len(validators) == 1
+
+
+def test_load_config_reads_probe_options(tmp_path):
+    # Setup
+    (tmp_path / "endpoints.ndjson").write_text(
+        '{"url": "http://example2.com", "method": "stream"}\n'
+        '{"url": "http://example3.com", "max_bytes": 10}\n'
+    )
+    config_path = tmp_path / "config.json"
+    raw_config = {
+        "endpoints": ["http://example1.com"],
+        "endpoints_file": "endpoints.ndjson",
+        "check_interval": 10,
+        "warn_threshold": 1.0,
+        "retries": 3,
+        "probe_method": "head",
+        "probe_max_bytes": 100,
+        "endpoint_probes": {"http://example1.com": {"method": "CONDITIONAL"}},
+    }
+    config_path.write_text(json.dumps(raw_config))
+
+    # Exercise
+    app_config = load_config(config_path)
+
+    # Assert
+    assert app_config.probe_method == HEAD
+    assert app_config.endpoint_probes == {
+        "http://example1.com": ProbeOptions(CONDITIONAL, 100),
+        "http://example2.com": ProbeOptions(STREAM, 100),
+        "http://example3.com": ProbeOptions(HEAD, 10),
+    }
+    raw_config["endpoint_probes"] = {"http://example1.com": {"method": 1}}
+    config_path.write_text(json.dumps(raw_config))
+    with pytest.raises(ConfigValidationError, match="example1.com: 'method'"):
+        load_config(config_path)
+
+
+@pytest.mark.asyncio
+async def test_async_monitor_probe_methods(httpx_mock: HTTPXMock):
+    # Setup
+    endpoints = [
+        "http://example1.com/head",
+        "http://example1.com/stream",
+        "http://example1.com/conditional",
+    ]
+    app_config = AppConfig(
+        endpoints=endpoints,
+        retries=1,
+        endpoint_probes={
+            endpoints[0]: ProbeOptions(HEAD),
+            endpoints[1]: ProbeOptions(STREAM, 100),
+            endpoints[2]: ProbeOptions(CONDITIONAL),
+        },
+    )
+    async_monitor = AsyncAppMonitor(app_config)
+    httpx_mock.add_response(method="HEAD", url=endpoints[0])
+    httpx_mock.add_response(url=endpoints[1], content=_BODY)
+    httpx_mock.add_response(
+        url=endpoints[2], headers={"ETag": '"v1"'}, content=b"page"
+    )
+    httpx_mock.add_response(url=endpoints[2], status_code=304)
+
+    # Exercise
+    with patch.object(NotificationDispatcher, "notify") as mocked_notify:
+        for endpoint in endpoints + endpoints[2:]:
+            await async_monitor.check_endpoint_health(endpoint, 1)
+
+    # Assert
+    requests = httpx_mock.get_requests()
+    assert [request.method for request in requests] == ["HEAD"] + ["GET"] * 3
+    assert "If-None-Match" not in requests[2].headers
+    assert requests[3].headers["If-None-Match"] == '"v1"'
+    assert async_monitor.counters["body_bytes"] < len(_BODY)
+    assert async_monitor.history.recent(endpoints[2])[0].status_code == 304
+    mocked_notify.assert_not_called()
+
+
+def test_serial_monitor_probe_methods(endpoint):
+    # Setup
+    app_monitor = AppMonitor(
+        AppConfig(endpoints=[endpoint], retries=1, probe_method=CONDITIONAL)
+    )
+    bytes_read = []
+
+    def recorded_read_body(response, limit, check=None):
+        bytes_read.append(read_body(response, limit, check))
+        return bytes_read[-1]
+
+    # Exercise
+    with patch.object(
+        NotificationDispatcher, "notify"
+    ) as mocked_notify, patch.object(monitor, "read_body", recorded_read_body):
+        first = app_monitor.probe_endpoint(endpoint)
+        second = app_monitor.probe_endpoint(endpoint)
+        app_monitor._app_config = app_monitor._app_config._replace(
+            endpoint_probes={endpoint: ProbeOptions(STREAM, 1000)}
+        )
+        streamed = app_monitor.probe_endpoint(endpoint)
+    app_monitor.close()
+
+    # Assert
+    assert first.status_code == 200
+    assert second.status_code == 304
+    assert streamed.status_code == 200
+    assert bytes_read == [len(_BODY), 0, 1000]
+    mocked_notify.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "options", [ProbeOptions(), parse_probe_options({"contains": "y"})]
+)
+def test_serial_monitor_reports_a_dropped_body(endpoint, options, caplog):
+    # Setup
+    truncated = endpoint.replace("/page", "/truncated")
+    app_monitor = AppMonitor(
+        AppConfig(
+            endpoints=[truncated, endpoint],
+            retries=1,
+            endpoint_probes={truncated: options},
+        )
+    )
+
+    # Exercise
+    with patch.object(NotificationDispatcher, "notify") as mocked_notify:
+        results = app_monitor.check_once()
+    app_monitor.close()
+
+    # Assert
+    assert [result.status_code for result in results] == [0, 200]
+    assert f"Endpoint {truncated} failed sending its body" in caplog.text
+    mocked_notify.assert_called_once()
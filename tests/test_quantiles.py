@@ -0,0 +1,88 @@
+import math
+import random
+
+import pytest
+
+from app_monitor.quantiles import (
+    LatencySketch,
+    RollingLatencySketch,
+    SlowResponseDetector,
+)
+
+
+def test_sketch_quantiles_are_within_relative_accuracy():
+    # Setup
+    rng = random.Random(42)
+    values = [rng.lognormvariate(-2, 1) for _ in range(10000)]
+    sketch = LatencySketch(relative_accuracy=0.01)
+
+    # Exercise
+    for value in values:
+        sketch.add(value)
+
+    # Assert
+    values.sort()
+    for q in (0.5, 0.95, 0.99):
+        exact = values[int(q * (len(values) - 1))]
+        assert sketch.quantile(q) == pytest.approx(exact, rel=0.011)
+    assert sketch.mean == pytest.approx(sum(values) / len(values))
+
+
+def test_merged_sketches_match_a_single_sketch():
+    # Setup
+    rng = random.Random(7)
+    values = [rng.uniform(0.01, 2.0) for _ in range(2000)]
+    single, first, second = LatencySketch(), LatencySketch(), LatencySketch()
+    for i, value in enumerate(values):
+        single.add(value)
+        (first if i % 2 else second).add(value)
+
+    # Exercise
+    first.merge(second)
+
+    # Assert
+    assert len(first) == len(single)
+    for q in (0.1, 0.5, 0.99):
+        assert first.quantile(q) == single.quantile(q)
+
+
+def test_rolling_sketch_forgets_old_windows():
+    # Setup
+    sketch = RollingLatencySketch(window=60)
+    for i in range(100):
+        sketch.add(5.0, now=i * 0.5)
+
+    # Exercise
+    for i in range(100):
+        sketch.add(0.1, now=70 + i * 0.5)
+
+    # Assert
+    assert sketch.quantile(0.99, now=125) == pytest.approx(0.1, rel=0.02)
+    assert len(sketch) == 100
+    assert math.isnan(sketch.quantile(0.5, now=190))
+
+
+def test_slow_response_detector_rules():
+    # Setup
+    p95 = SlowResponseDetector(rule="p95", min_samples=20)
+    baseline = SlowResponseDetector(rule="baseline", min_samples=20)
+
+    # Exercise
+    p95_reasons = [
+        p95.check("http://example1.com", 2.0 if i % 10 == 0 else 0.2, 1.0, i)
+        for i in range(40)
+    ]
+    baseline_reasons = [
+        baseline.check("http://example1.com", 0.2, 1.0, i) for i in range(20)
+    ]
+    slow = baseline.check("http://example1.com", 0.9, 1.0, 21)
+
+    # Assert
+    assert not any(p95_reasons[:19])
+    assert p95_reasons[-1] is not None
+    assert p95_reasons[-1].startswith("p95 response time is 1.99")
+    assert not any(baseline_reasons)
+    assert slow is not None and "4.5x its median" in slow
+    assert SlowResponseDetector().check("http://example1.com", 3.5, 3) == (
+        "took too long to respond: 3.50 seconds"
+    )
@@ -0,0 +1,124 @@
+import asyncio
+import json
+import os
+import signal
+from unittest.mock import patch
+
+import pytest
+from pytest_httpx import HTTPXMock
+
+from app_monitor.app_config import AppConfig
+from app_monitor.async_monitor import AsyncAppMonitor
+from app_monitor.notifier import NotificationDispatcher
+from app_monitor.reload import ConfigWatcher
+
+
+def _write_config(path, endpoints, check_interval=300):
+    path.write_text(
+        json.dumps(
+            {
+                "endpoints": endpoints,
+                "check_interval": check_interval,
+                "warn_threshold": 10,
+                "retries": 1,
+            }
+        )
+    )
+
+
+@pytest.mark.asyncio
+async def test_apply_config_applies_the_difference(httpx_mock: HTTPXMock):
+    # Setup
+    httpx_mock.add_response(is_reusable=True)
+    async_monitor = AsyncAppMonitor(
+        AppConfig(
+            endpoints=[
+                "http://example1.com/status",
+                "http://example2.com/status",
+            ],
+            check_interval=300,
+            warn_threshold=10,
+        )
+    )
+    with patch.object(NotificationDispatcher, "notify"):
+        supervisor = asyncio.create_task(async_monitor.supervisor())
+        while async_monitor.counters["probes"] < 2:
+            await asyncio.sleep(0.01)
+        session = async_monitor.client
+        next_due = async_monitor._scheduler.next_due()
+
+        # Exercise
+        async_monitor.apply_config(
+            AppConfig(
+                endpoints=[
+                    "http://example2.com/status",
+                    "http://example3.com/status",
+                ],
+                check_interval=300,
+                warn_threshold=5,
+                max_concurrency=1,
+            )
+        )
+        while async_monitor.counters["probes"] < 3:
+            await asyncio.sleep(0.01)
+        async_monitor.stop()
+        await supervisor
+
+    # Assert
+    assert async_monitor.client is session
+    assert "http://example1.com/status" not in async_monitor._scheduler
+    assert "http://example1.com/status" not in async_monitor.history
+    assert "http://example2.com/status" in async_monitor.history
+    assert "http://example3.com/status" in async_monitor.history
+    assert sorted(
+        request.url.host for request in httpx_mock.get_requests()
+    ) == [
+        "example1.com",
+        "example2.com",
+        "example3.com",
+    ]
+    assert async_monitor._scheduler.next_due() == next_due
+    assert async_monitor._app_config.warn_threshold == 5
+    # Needs a restart, so the current value is kept
+    assert async_monitor._app_config.max_concurrency == 100
+
+
+def test_watcher_reloads_changed_file_and_skips_invalid_one(tmp_path, caplog):
+    # Setup
+    config_path = tmp_path / "config.json"
+    _write_config(config_path, ["http://example1.com/status"])
+    applied = []
+    watcher = ConfigWatcher(config_path, applied.append)
+
+    # Exercise
+    unchanged = watcher.check()
+    _write_config(config_path, ["http://example1.com/status"] * 2, 60)
+    changed = watcher.check()
+    config_path.write_text('{"endpoints": ["not a url"]}')
+    invalid = watcher.check()
+
+    # Assert
+    assert (unchanged, changed, invalid) == (False, True, False)
+    assert [app_config.check_interval for app_config in applied] == [60]
+    assert "Keeping the current configuration" in caplog.text
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not hasattr(signal, "SIGHUP"), reason="needs SIGHUP")
+async def test_watcher_reloads_on_sighup(tmp_path):
+    # Setup
+    config_path = tmp_path / "config.json"
+    _write_config(config_path, ["http://example1.com/status"])
+    applied = []
+    watcher = ConfigWatcher(config_path, applied.append, poll_interval=0)
+    watcher.install_signal_handler()
+
+    # Exercise
+    try:
+        os.kill(os.getpid(), signal.SIGHUP)
+        await asyncio.sleep(0.05)
+    finally:
+        watcher.remove_signal_handler()
+
+    # Assert
+    assert len(applied) == 1
@@ -0,0 +1,112 @@
+import asyncio
+import random
+from unittest.mock import patch
+
+import httpx
+import pytest
+from pytest_httpx import HTTPXMock
+
+from app_monitor.app_config import AppConfig
+from app_monitor.async_monitor import AsyncAppMonitor
+from app_monitor.notifier import NotificationDispatcher
+from app_monitor.resilience import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreakers,
+    RetryBudget,
+    backoff_delay,
+)
+
+
+def test_backoff_delay_is_jittered_and_capped():
+    # Setup
+    rng = random.Random(0)
+
+    # Exercise
+    delays = [backoff_delay(attempt, 0.1, 1.0, rng) for attempt in range(8)]
+
+    # Assert
+    for attempt, delay in enumerate(delays):
+        assert 0 <= delay <= min(1.0, 0.1 * 2**attempt)
+    assert len(set(delays)) == len(delays)
+
+
+def test_retry_budget_allows_a_share_of_the_probes():
+    # Setup
+    budget = RetryBudget(ratio=0.5, min_per_second=0, max_tokens=2)
+
+    # Exercise
+    saved_up = [budget.try_spend(now=0) for _ in range(3)]
+    for _ in range(2):
+        budget.record_probe(now=0)
+    earned = [budget.try_spend(now=0) for _ in range(2)]
+
+    # Assert
+    assert saved_up == [True, True, False]
+    assert earned == [True, False]
+
+
+def test_circuit_breaker_opens_and_sends_single_trials():
+    # Setup
+    breakers = CircuitBreakers(
+        failure_threshold=3, reset_timeout=10, max_reset_timeout=15
+    )
+
+    # Exercise / Assert
+    opened = [breakers.record_failure("example1.com", 0) for _ in range(3)]
+    assert opened == [False, False, True]
+    assert breakers.state("example1.com") == OPEN
+    assert not breakers.allow("example1.com", now=5)
+    assert breakers.allow("example2.com", now=5)
+
+    # One trial once the reset timeout elapsed
+    assert breakers.allow("example1.com", now=10)
+    assert breakers.state("example1.com") == HALF_OPEN
+    assert not breakers.allow("example1.com", now=11)
+
+    # A failed trial doubles the wait, up to the maximum
+    assert not breakers.record_failure("example1.com", now=12)
+    assert not breakers.allow("example1.com", now=26)
+    assert breakers.allow("example1.com", now=27)
+
+    # A successful trial closes the breaker
+    assert breakers.record_success("example1.com")
+    assert breakers.state("example1.com") == CLOSED
+    assert breakers.open_hosts() == []
+
+
+@pytest.mark.asyncio
+async def test_dead_host_is_short_circuited(httpx_mock: HTTPXMock):
+    # Setup
+    app_config = AppConfig(
+        endpoints=[f"http://example1.com/{i}" for i in range(10)],
+        retries=3,
+        retry_backoff=0.001,
+        breaker_failure_threshold=2,
+        breaker_reset_timeout=0.05,
+    )
+    async_monitor = AsyncAppMonitor(app_config)
+    httpx_mock.add_exception(
+        httpx.ConnectError("Connection refused"), is_reusable=True
+    )
+
+    # Exercise
+    with patch.object(NotificationDispatcher, "notify") as mocked_notify:
+        for endpoint in app_config.endpoints:
+            await async_monitor.check_endpoint_health(endpoint, 1)
+        failed_requests = len(httpx_mock.get_requests())
+        httpx_mock.reset()
+        httpx_mock.add_response()
+        await asyncio.sleep(0.06)
+        await async_monitor.check_endpoint_health(app_config.endpoints[0], 1)
+
+    # Assert
+    assert failed_requests == 2
+    assert async_monitor.counters["short_circuited"] == 9
+    assert async_monitor.counters["retries"] == 1
+    notified = [call.args[0] for call in mocked_notify.call_args_list]
+    assert "Host example1.com is down, pausing its probes for 0.05 seconds" in (
+        notified
+    )
+    assert async_monitor.breakers.state("example1.com") == CLOSED
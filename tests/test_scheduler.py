@@ -0,0 +1,72 @@
+from app_monitor.scheduler import DeadlineScheduler
+
+
+def test_pop_due_keeps_each_key_on_its_own_cadence():
+    # Setup
+    scheduler = DeadlineScheduler()
+    scheduler.add("http://example1.com/status", interval=10, due=0)
+    scheduler.add("http://example2.com/status", interval=4, due=1)
+
+    # Exercise
+    dispatched = []
+    for now in range(0, 13):
+        dispatched.extend(
+            (now, key) for key, _ in scheduler.pop_due(float(now))
+        )
+
+    # Assert
+    assert dispatched == [
+        (0, "http://example1.com/status"),
+        (1, "http://example2.com/status"),
+        (5, "http://example2.com/status"),
+        (9, "http://example2.com/status"),
+        (10, "http://example1.com/status"),
+    ]
+    assert scheduler.next_due() == 13
+
+
+def test_pop_due_skips_missed_deadlines_without_drifting():
+    # Setup
+    scheduler = DeadlineScheduler()
+    scheduler.add("http://example1.com/status", interval=10, due=0)
+
+    # Exercise
+    first = list(scheduler.pop_due(35.5))
+
+    # Assert
+    assert first == [("http://example1.com/status", 0)]
+    assert scheduler.next_due() == 40
+
+
+def test_remove():
+    # Setup
+    scheduler = DeadlineScheduler()
+    scheduler.add("http://example1.com/status", interval=10, due=0)
+    scheduler.add("http://example2.com/status", interval=10, due=5)
+
+    # Exercise
+    scheduler.remove("http://example1.com/status")
+
+    # Assert
+    assert "http://example1.com/status" not in scheduler
+    assert len(scheduler) == 1
+    assert scheduler.next_due() == 5
+    assert [key for key, _ in scheduler.pop_due(5)] == [
+        "http://example2.com/status"
+    ]
+
+
+def test_set_interval_keeps_the_phase_of_the_last_deadline():
+    # Setup
+    scheduler = DeadlineScheduler()
+    scheduler.add("http://example1.com/status", interval=10, due=0)
+    list(scheduler.pop_due(0))
+
+    # Exercise
+    scheduler.set_interval("http://example1.com/status", 4)
+
+    # Assert
+    assert len(scheduler) == 1
+    assert scheduler.next_due() == 4
+    assert list(scheduler.pop_due(4)) == [("http://example1.com/status", 4)]
+    assert scheduler.next_due() == 8
@@ -0,0 +1,100 @@
+import asyncio
+import time
+
+import pytest
+from pytest_httpx import HTTPXMock
+
+from app_monitor.app_config import AppConfig
+from app_monitor.async_monitor import AsyncAppMonitor
+from app_monitor.shaping import TokenBucket, next_phase, phase_offset
+
+
+def test_phase_offsets_are_stable_and_even():
+    # Setup
+    endpoints = [f"http://example{i}.com/health" for i in range(2000)]
+
+    # Exercise
+    offsets = [phase_offset(endpoint, 60) for endpoint in endpoints]
+    due = next_phase(endpoints[0], 60, now=100.0, wall_now=1_000_000.0)
+
+    # Assert
+    assert offsets == [phase_offset(endpoint, 60) for endpoint in endpoints]
+    buckets = [0] * 10
+    for offset in offsets:
+        buckets[int(offset / 6)] += 1
+    assert min(buckets) > 150 and max(buckets) < 250
+    assert 100 <= due < 160
+    assert (1_000_000.0 + due - 100) % 60 == pytest.approx(offsets[0])
+
+
+def test_token_bucket_paces_reservations():
+    # Setup
+    bucket = TokenBucket(rate=10)
+
+    # Exercise
+    delays = [bucket.reserve(now=5.0) for _ in range(4)]
+    later = bucket.reserve(now=6.0)
+
+    # Assert
+    assert delays == pytest.approx([0, 0.1, 0.2, 0.3])
+    assert later == 0
+
+
+@pytest.mark.asyncio
+async def test_probe_rates_are_shaped(httpx_mock: HTTPXMock):
+    # Setup
+    endpoints = [f"http://example1.com/{i}" for i in range(5)] + [
+        f"http://example2.com/{i}" for i in range(5)
+    ]
+    app_config = AppConfig(
+        endpoints=endpoints,
+        retries=1,
+        probe_rate=100,
+        origin_probe_rates={"http://example1.com": 10},
+    )
+    async_monitor = AsyncAppMonitor(app_config)
+    httpx_mock.add_response(is_reusable=True)
+    finished = {}
+
+    async def check(endpoint):
+        await async_monitor.check_endpoint_health(endpoint, 5)
+        finished[endpoint] = time.monotonic()
+
+    # Exercise
+    started = time.monotonic()
+    await asyncio.gather(*(check(endpoint) for endpoint in endpoints))
+    text = "".join(
+        "".join(family.samples) for family in async_monitor.shaper.collect()
+    )
+
+    # Assert
+    assert finished[endpoints[4]] - started >= 0.39
+    assert max(finished[e] for e in endpoints[5:]) - started < 0.3
+    assert async_monitor.shaper.counters["origin"] == 4
+    assert async_monitor.shaper.counters["sent"] == 10
+    assert 'app_monitor_throttled_probes_total{scope="origin"} 4' in text
+    assert "app_monitor_probe_rate 1" in text
+
+
+@pytest.mark.asyncio
+async def test_spread_checks_start_at_their_phase(httpx_mock: HTTPXMock):
+    # Setup
+    httpx_mock.add_response(is_reusable=True, is_optional=True)
+    endpoints = [f"http://example{i}.com" for i in range(50)]
+    app_config = AppConfig(
+        endpoints=endpoints, check_interval=60, retries=1, spread_checks=True
+    )
+    async_monitor = AsyncAppMonitor(app_config)
+
+    # Exercise
+    start = asyncio.get_running_loop().time()
+    supervisor = asyncio.create_task(async_monitor.supervisor())
+    await asyncio.sleep(0.1)
+    deadlines = [due for _, due, _ in async_monitor._scheduler.deadlines()]
+    async_monitor.stop()
+    await supervisor
+
+    # Assert
+    assert async_monitor.counters["probes"] <= 1
+    assert all(start <= due < start + 60.2 for due in deadlines)
+    assert max(deadlines) - min(deadlines) > 40
@@ -0,0 +1,173 @@
+from http.server import BaseHTTPRequestHandler
+import signal
+import time
+
+import pytest
+
+from app_monitor.app_config import AppConfig
+from app_monitor.sharding import ShardedMonitor, shard_endpoints
+
+
+class _OkHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200 if self.path != "/down" else 503)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(http_server):
+    return http_server(_OkHandler).url
+
+
+def _crash(*args):
+    raise SystemExit(3)
+
+
+def _ignore_sigterm(shard, app_config, reports, *args):
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    reports.put(shard)
+    time.sleep(60)
+
+
+def test_shard_endpoints_keeps_hosts_together_and_balances():
+    # Setup
+    endpoints = [f"http://example{i % 4}.com/{i}" for i in range(16)]
+
+    # Exercise
+    shards = shard_endpoints(endpoints, 2)
+
+    # Assert
+    assert sorted(len(shard) for shard in shards) == [8, 8]
+    assert sorted(sum(shards, [])) == sorted(endpoints)
+    for shard in shards:
+        assert len({endpoint.split("/")[2] for endpoint in shard}) == 2
+    assert shard_endpoints(list(reversed(endpoints)), 2) == shards
+
+
+def test_sharded_monitor_merges_worker_reports(server):
+    # Setup
+    endpoints = [f"{server}/{path}" for path in ("a", "b", "c", "down")]
+    app_config = AppConfig(
+        endpoints=endpoints, check_interval=1, warn_threshold=5, retries=1
+    )
+    sharded_monitor = ShardedMonitor(
+        app_config, processes=2, report_interval=0.2
+    )
+
+    # Exercise
+    sharded_monitor.start()
+    try:
+        deadline = time.monotonic() + 20
+        while (
+            len(sharded_monitor.results) < len(endpoints)
+            and time.monotonic() < deadline
+        ):
+            sharded_monitor.poll(timeout=0.2)
+    finally:
+        sharded_monitor.stop()
+
+    # Assert
+    assert {
+        endpoint: result.status_code
+        for endpoint, result in sharded_monitor.results.items()
+    } == {
+        f"{server}/a": 200,
+        f"{server}/b": 200,
+        f"{server}/c": 200,
+        f"{server}/down": 503,
+    }
+    assert sharded_monitor.counters["probes"] >= 4
+    assert sharded_monitor.counters["errors"] >= 1
+    assert len(sharded_monitor.latency) >= 3
+
+
+def test_sharded_monitor_restarts_crashed_workers():
+    # Setup
+    app_config = AppConfig(
+        endpoints=["http://example1.com", "http://example2.com"],
+        check_interval=1,
+        warn_threshold=5,
+        retries=1,
+    )
+    sharded_monitor = ShardedMonitor(
+        app_config, processes=2, restart_delay=0, target=_crash
+    )
+
+    # Exercise
+    sharded_monitor.start()
+    try:
+        deadline = time.monotonic() + 20
+        while (
+            sharded_monitor.counters["restarts"] < 4
+            and time.monotonic() < deadline
+        ):
+            sharded_monitor.poll(timeout=0.1)
+    finally:
+        sharded_monitor.stop()
+
+    # Assert
+    assert sharded_monitor.counters["restarts"] >= 4
+
+
+def test_sharded_monitor_stops_workers_gracefully(server, tmp_path):
+    # Setup
+    endpoints = [f"{server}/{path}" for path in ("a", "b", "c", "d")]
+    app_config = AppConfig(
+        endpoints=endpoints,
+        check_interval=1,
+        warn_threshold=5,
+        retries=1,
+        checkpoint_path=str(tmp_path / "checkpoint"),
+    )
+    sharded_monitor = ShardedMonitor(
+        app_config, processes=2, report_interval=0.2
+    )
+    sharded_monitor.start()
+    try:
+        deadline = time.monotonic() + 20
+        while (
+            len(sharded_monitor.results) < len(endpoints)
+            and time.monotonic() < deadline
+        ):
+            sharded_monitor.poll(timeout=0.2)
+    finally:
+        # Exercise
+        sharded_monitor.stop()
+
+    # Assert
+    # The checkpoint interval has not elapsed: saved when stopping
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "checkpoint.shard-0",
+        "checkpoint.shard-1",
+    ]
+
+
+def test_sharded_monitor_kills_workers_that_do_not_stop():
+    # Setup
+    app_config = AppConfig(
+        endpoints=["http://example1.com", "http://example2.com"],
+        check_interval=1,
+        warn_threshold=5,
+        retries=1,
+    )
+    sharded_monitor = ShardedMonitor(
+        app_config, processes=2, target=_ignore_sigterm
+    )
+    sharded_monitor.start()
+    # Both workers ignore SIGTERM by now
+    for _ in range(2):
+        sharded_monitor._reports.get(timeout=20)
+
+    # Exercise
+    started = time.monotonic()
+    sharded_monitor.stop(timeout=0.5)
+
+    # Assert
+    assert time.monotonic() - started < 5
+    assert [process.exitcode for process in sharded_monitor._processes] == [
+        -signal.SIGKILL
+    ] * 2
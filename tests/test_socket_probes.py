@@ -0,0 +1,203 @@
+import datetime
+from http.server import BaseHTTPRequestHandler
+import ipaddress
+import socket
+import ssl
+
+import pytest
+
+from app_monitor.async_monitor import AsyncAppMonitor
+from app_monitor.monitor import AppMonitor
+from app_monitor.probing import ProbeOptions
+from app_monitor.socket_probes import SocketTarget, socket_target
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(503 if self.path == "/down" else 200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(http_server):
+    return http_server(_Handler).server_address[1]
+
+
+@pytest.fixture
+def certificate(tmp_path):
+    """A self-signed certificate for 127.0.0.1 expiring in 5 days"""
+    x509 = pytest.importorskip("cryptography.x509")
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name(
+        [x509.NameAttribute(x509.oid.NameOID.COMMON_NAME, "127.0.0.1")]
+    )
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=5))
+        .add_extension(
+            x509.SubjectAlternativeName(
+                [x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]
+            ),
+            critical=False,
+        )
+        .add_extension(
+            x509.BasicConstraints(ca=True, path_length=None), critical=True
+        )
+        .sign(key, hashes.SHA256())
+    )
+    cert_path, key_path = tmp_path / "cert.pem", tmp_path / "key.pem"
+    cert_path.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    key_path.write_bytes(
+        key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+    )
+    return cert_path, key_path, cert.not_valid_after_utc.timestamp()
+
+
+@pytest.fixture
+def tls_server(http_server, certificate):
+    cert_path, key_path, _ = certificate
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert_path, key_path)
+    return http_server(_Handler, context).server_address[1]
+
+
+@pytest.fixture
+def closed_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_socket_target():
+    # Exercise
+    tcp = socket_target("tcp://DB.example.com:5432")
+    tls = socket_target("tls://example.com")
+    status = socket_target("https://[::1]:8443/health?full=1")
+
+    # Assert
+    assert tcp == SocketTarget("db.example.com", 5432, False)
+    assert tls == SocketTarget("example.com", 443, True)
+    assert status[:3] == ("::1", 8443, True)
+    assert status.request.startswith(
+        b"GET /health?full=1 HTTP/1.1\r\nHost: [::1]:8443\r\n"
+    )
+    assert status.request.endswith(b"Connection: close\r\n\r\n")
+
+
+@pytest.mark.asyncio
+async def test_async_monitor_probes_over_sockets(
+    server, tls_server, closed_port, certificate, make_app_config
+):
+    # Setup
+    endpoints = [
+        f"tcp://127.0.0.1:{server}",
+        f"tcp://127.0.0.1:{closed_port}",
+        f"http://127.0.0.1:{server}/health",
+        f"http://127.0.0.1:{server}/down",
+        f"tls://127.0.0.1:{tls_server}",
+        f"https://127.0.0.1:{tls_server}/health",
+    ]
+    status = ProbeOptions("STATUS")
+    monitor = AsyncAppMonitor(
+        make_app_config(
+            endpoints,
+            endpoint_probes={endpoint: status for endpoint in endpoints[2:]},
+        )
+    )
+    monitor._ssl_context = ssl.create_default_context(cafile=certificate[0])
+
+    # Exercise
+    results = await monitor.check_once()
+    [family] = monitor._certificate_metrics()
+
+    # Assert
+    assert [result.status_code for result in results] == [
+        200,
+        0,
+        200,
+        503,
+        200,
+        200,
+    ]
+    assert results[0].timings.connect > 0
+    assert results[4].timings.tls > 0
+    assert results[5].timings.ttfb > 0
+    assert monitor._client is None
+    assert monitor.counters["unreachable"] == 1
+    assert monitor.counters["errors"] == 1
+    assert monitor.counters["cert_expiring"] == 2
+    assert monitor.cert_expiry[endpoints[4]] == certificate[2]
+    assert family.name == "app_monitor_cert_expiry_timestamp_seconds"
+    assert len(family.samples) == 2
+
+
+@pytest.mark.asyncio
+async def test_untrusted_certificate_fails_the_handshake(
+    tls_server, caplog, make_app_config
+):
+    # Setup
+    endpoint = f"tls://127.0.0.1:{tls_server}"
+    monitor = AsyncAppMonitor(make_app_config([endpoint]))
+
+    # Exercise
+    [result] = await monitor.check_once()
+
+    # Assert
+    assert result.status_code == 0
+    assert monitor.counters["errors"] == 1
+    assert "failed the TLS handshake: self-signed certificate" in caplog.text
+    # The host answered, so its circuit stays closed
+    assert monitor.breakers.allow("127.0.0.1")
+
+
+def test_serial_monitor_probes_over_sockets(
+    server, tls_server, closed_port, certificate, caplog, make_app_config
+):
+    # Setup
+    endpoints = [
+        f"tcp://127.0.0.1:{server}",
+        f"tcp://127.0.0.1:{closed_port}",
+        f"http://127.0.0.1:{server}/down",
+        f"tls://127.0.0.1:{tls_server}",
+    ]
+    monitor = AppMonitor(
+        make_app_config(
+            endpoints, endpoint_probes={endpoints[2]: ProbeOptions("STATUS")}
+        ),
+        workers=4,
+    )
+    monitor._ssl_context = ssl.create_default_context(cafile=certificate[0])
+
+    # Exercise
+    results = monitor.check_once()
+    sessions = len(monitor._sessions)
+    monitor.close()
+
+    # Assert
+    assert [result and result.status_code for result in results] == [
+        200,
+        None,
+        503,
+        200,
+    ]
+    assert monitor.cert_expiry == {endpoints[3]: certificate[2]}
+    assert f"Certificate of endpoint {endpoints[3]} expires on" in caplog.text
+    # No HTTP client was needed
+    assert sessions == 0
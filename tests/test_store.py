@@ -0,0 +1,205 @@
+import math
+
+import pytest
+from pytest_httpx import HTTPXMock
+
+from app_monitor.app_config import AppConfig
+from app_monitor.async_monitor import AsyncAppMonitor
+from app_monitor.results import ProbeResult
+from app_monitor.store import (
+    HEADER,
+    RECORD,
+    ResultStore,
+    StoreReader,
+    parse_time,
+)
+
+
+def test_results_are_read_back(tmp_path):
+    # Setup
+    store = ResultStore(tmp_path, segment_seconds=60, retention=math.inf)
+    for second in range(100):
+        store.append(
+            ProbeResult("http://example1.com", 200, second / 100), second
+        )
+        store.append(ProbeResult("http://example2.com", 500, 1.0), second)
+    store.append(ProbeResult("http://example3.com", 0, 5.0), 120)
+
+    # Exercise
+    store.close()
+    reader = StoreReader(tmp_path)
+
+    # Assert
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "0000000000.seg",
+        "0000000060.seg",
+        "0000000120.seg",
+        "endpoints.dict",
+    ]
+    records = list(reader.records(50, 52))
+    assert [(r.timestamp, r.endpoint, r.status_code) for r in records] == [
+        (50, "http://example1.com", 200),
+        (50, "http://example2.com", 500),
+        (51, "http://example1.com", 200),
+        (51, "http://example2.com", 500),
+    ]
+    example1, example2, example3 = reader.aggregates()
+    assert example1.probes == 100
+    assert example1.errors == 0
+    assert example1.p50 == pytest.approx(0.5, rel=0.02)
+    assert example1.max == pytest.approx(0.99)
+    assert example2.errors == 100
+    assert example3.errors == 1
+    failures = list(reader.failures(100, endpoint="http://example3.com"))
+    assert [failure.response_time for failure in failures] == [5.0]
+
+
+def test_failed_content_checks_keep_their_status(tmp_path):
+    # Setup
+    store = ResultStore(tmp_path, retention=math.inf)
+    store.append(ProbeResult("http://example1.com", 200, 0.1), 10)
+    store.append(
+        ProbeResult("http://example1.com", 200, 0.2, failure="body lacks"), 20
+    )
+
+    # Exercise
+    store.close()
+    reader = StoreReader(tmp_path)
+
+    # Assert
+    records = list(reader.records())
+    assert [(r.status_code, r.check_failed) for r in records] == [
+        (200, False),
+        (200, True),
+    ]
+    assert [r.timestamp for r in reader.failures()] == [20]
+    assert reader.aggregates()[0].errors == 1
+
+
+def test_store_survives_reopening_and_torn_writes(tmp_path):
+    # Setup
+    store = ResultStore(tmp_path, retention=math.inf)
+    store.append(ProbeResult("http://example1.com", 200, 0.1), 10)
+    store.close()
+    segment = tmp_path / "0000000000.seg"
+    # A crash in the middle of writes
+    with open(segment, "ab") as file:
+        file.write(RECORD.pack(11, 0, 200, 0.1)[:5])
+    with open(tmp_path / "endpoints.dict", "ab") as file:
+        file.write(b"http://exam")
+
+    # Exercise
+    store = ResultStore(tmp_path, retention=math.inf)
+    store.append(ProbeResult("http://example2.com", 200, 0.2), 20)
+    store.append(ProbeResult("http://example1.com", 200, 0.3), 30)
+    store.close()
+    records = list(StoreReader(tmp_path).records())
+
+    # Assert
+    assert [(r.timestamp, r.endpoint) for r in records] == [
+        (10, "http://example1.com"),
+        (20, "http://example2.com"),
+        (30, "http://example1.com"),
+    ]
+    assert (tmp_path / "endpoints.dict").read_text() == (
+        "http://example1.com\nhttp://example2.com\n"
+    )
+    assert segment.stat().st_size == HEADER.size + 3 * RECORD.size
+
+
+def test_expired_segments_are_deleted(tmp_path):
+    # Setup
+    store = ResultStore(tmp_path, segment_seconds=60, retention=120)
+    for timestamp in (0, 60, 120, 180):
+        store.append(ProbeResult("http://example1.com", 200, 0.1), timestamp)
+
+    # Exercise
+    store.flush(now=250)
+
+    # Assert
+    assert [r.timestamp for r in StoreReader(tmp_path).records()] == [
+        120,
+        180,
+    ]
+    store.close()
+
+
+def test_parse_time():
+    # Exercise / Assert
+    assert parse_time("90s", now=1000) == 910
+    assert parse_time("1.5h", now=10000) == 4600
+    assert parse_time("1700000000") == 1700000000
+    assert parse_time("2026-10-01T00:00:00+00:00") == 1790812800
+    with pytest.raises(ValueError):
+        parse_time("yesterday")
+
+
+@pytest.mark.asyncio
+async def test_async_monitor_stores_results(tmp_path, httpx_mock: HTTPXMock):
+    # Setup
+    app_config = AppConfig(
+        endpoints=["http://example1.com"], retries=1, store_path=str(tmp_path)
+    )
+    async_monitor = AsyncAppMonitor(app_config)
+    httpx_mock.add_response(status_code=503)
+
+    # Exercise
+    await async_monitor.check_endpoint_health("http://example1.com", 1)
+    async_monitor.store.close()
+
+    # Assert
+    (failure,) = StoreReader(tmp_path).failures(parse_time("1m"))
+    assert failure.endpoint == "http://example1.com"
+    assert failure.status_code == 503
+
+
+class _FailingWrites:
+    """A file whose writes fail half-way, as on a full disk"""
+
+    def __init__(self, file):
+        self._file = file
+
+    def write(self, data):
+        self._file.write(data[: len(data) // 2])
+        self._file.flush()
+        raise OSError(28, "No space left on device")
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._file.close()
+
+
+def test_failed_dictionary_write_keeps_ids_aligned(tmp_path, monkeypatch):
+    # Setup
+    store = ResultStore(tmp_path, retention=math.inf)
+    store.append(ProbeResult("http://example1.com", 200, 0.1), 10)
+    store.flush()
+
+    def failing_open(path, mode="r", *args, **kwargs):
+        file = open(path, mode, *args, **kwargs)
+        return _FailingWrites(file) if path.name == "endpoints.dict" else file
+
+    # Exercise
+    monkeypatch.setattr("app_monitor.store.open", failing_open, raising=False)
+    store.append(ProbeResult("http://example2.com", 500, 0.2), 20)
+    with pytest.raises(OSError):
+        store.flush()
+    monkeypatch.undo()
+    store.append(ProbeResult("http://example3.com", 200, 0.3), 30)
+    store.close()
+    records = list(StoreReader(tmp_path).records())
+
+    # Assert
+    assert [(r.timestamp, r.endpoint, r.status_code) for r in records] == [
+        (10, "http://example1.com", 200),
+        (20, "http://example2.com", 500),
+        (30, "http://example3.com", 200),
+    ]
+    assert (tmp_path / "endpoints.dict").read_text() == (
+        "http://example1.com\nhttp://example2.com\nhttp://example3.com\n"
+    )
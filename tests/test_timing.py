@@ -0,0 +1,114 @@
+from http.server import BaseHTTPRequestHandler
+import time
+
+import pytest
+
+from app_monitor.app_config import AppConfig
+from app_monitor.async_monitor import AsyncAppMonitor
+from app_monitor.monitor import AppMonitor
+from app_monitor.timing import PhaseRecorder
+
+
+class _SlowHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        time.sleep(0.1)
+        self.send_response(200)
+        self.send_header("Content-Length", "4")
+        self.end_headers()
+        self.wfile.flush()
+        time.sleep(0.1)
+        self.wfile.write(b"done")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def endpoint(http_server):
+    # By name, so that the DNS phase is recorded
+    port = http_server(_SlowHandler).server_address[1]
+    return f"http://localhost:{port}/status"
+
+
+@pytest.fixture
+def app_config(endpoint) -> AppConfig:
+    return AppConfig(
+        endpoints=[endpoint], check_interval=1, warn_threshold=5, retries=1
+    )
+
+
+def _assert_phases(result, new_connection):
+    timings = result.timings
+    assert timings.new_connection is new_connection
+    assert timings.ttfb == pytest.approx(0.1, abs=0.08)
+    assert timings.body == pytest.approx(0.1, abs=0.08)
+    assert timings.tls == 0
+    if new_connection:
+        assert timings.dns > 0
+        assert timings.connect > 0
+    else:
+        assert timings.dns == timings.connect == 0
+    assert timings.total >= (
+        timings.dns + timings.connect + timings.ttfb + timings.body
+    )
+
+
+@pytest.mark.asyncio
+async def test_async_monitor_records_phase_timings(app_config, endpoint):
+    # Setup
+    async_monitor = AsyncAppMonitor(app_config)
+
+    # Exercise
+    first = await async_monitor.probe_endpoint(endpoint)
+    second = await async_monitor.probe_endpoint(endpoint)
+    await async_monitor.client.aclose()
+
+    # Assert
+    _assert_phases(first, new_connection=True)
+    _assert_phases(second, new_connection=False)
+
+
+def test_serial_monitor_records_phase_timings(app_config, endpoint):
+    # Setup
+    app_monitor = AppMonitor(app_config)
+
+    # Exercise
+    first = app_monitor.probe_endpoint(endpoint)
+    second = app_monitor.probe_endpoint(endpoint)
+    app_monitor.close()
+
+    # Assert
+    _assert_phases(first, new_connection=True)
+    _assert_phases(second, new_connection=False)
+    assert first.response_time == first.timings.total
+
+
+def test_phase_recorder_maps_httpcore_trace_events():
+    # Setup
+    recorder = PhaseRecorder()
+
+    # Exercise
+    for event in [
+        "connection.connect_tcp.started",
+        "connection.connect_tcp.complete",
+        "connection.start_tls.started",
+        "connection.start_tls.complete",
+        "http11.send_request_headers.started",
+        "http11.send_request_headers.complete",
+        "http11.receive_response_headers.started",
+        "http11.receive_response_headers.complete",
+        "http11.receive_response_body.started",
+        "http11.receive_response_body.complete",
+    ]:
+        recorder.on_trace_event(event)
+        time.sleep(0.01)
+
+    # Assert
+    timings = recorder.timings()
+    assert timings.new_connection
+    assert 0.01 <= timings.connect < 0.05
+    assert 0.01 <= timings.tls < 0.05
+    assert 0.03 <= timings.ttfb < 0.1
+    assert 0.01 <= timings.body < 0.05